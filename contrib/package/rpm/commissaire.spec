@@ -96,6 +96,7 @@ install -D contrib/systemd/commissaire.service %{buildroot}%{_unitdir}/commissai
 %doc MAINTAINERS
 %doc build/sphinx/text/*.txt
 %{_bindir}/commissaire
+%{_bindir}/commissaire-store
 %{python2_sitelib}/*
 %{_sysconfdir}/commissaire/commissaire.conf
 %{_unitdir}/commissaire.service
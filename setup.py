@@ -56,6 +56,7 @@ setup(
     entry_points={
         'console_scripts': [
             'commissaire = commissaire.script:main',
+            'commissaire-store = commissaire.script:store_main',
         ],
     }
 )
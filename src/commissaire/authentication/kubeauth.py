@@ -15,7 +15,6 @@
 
 import cherrypy
 import falcon
-import requests
 
 from commissaire.authentication import Authenticator
 
@@ -86,10 +85,12 @@ class KubernetesAuth(Authenticator):
             try:
                 # NOTE: We are assuming that if the user has access to
                 # the resource they should be granted access to commissaire
-                endpoint = self._kubernetes.base_uri + self.resource_check
-                self.logger.debug('Checking against {0}.'.format(endpoint))
-                resp = requests.get(
-                    endpoint, headers={'Authentication': 'Bearer ' + token})
+                self.logger.debug('Checking against {0}.'.format(
+                    self.resource_check))
+                # The token goes in the Authorization header. It used to
+                # be sent as "Authentication" which the apiserver ignores.
+                resp = self._kubernetes._get_with_token(
+                    self.resource_check, token)
                 self.logger.debug('Kubernetes response: {0}'.format(
                     resp.json()))
                 # If we get a 200 then the user is valid. Anything else is
@@ -122,7 +122,7 @@ class InvestigatorPlugin(plugins.SimplePlugin):
         callback arguments are (store_manager, host, exception).  If the
         request is successful, the exception argument will be None.
 
-        :param store_manager: A store manager (will be cloned)
+        :param store_manager: A store manager (sent as a descriptor)
         :type store_manager: commissaire.store.storehandlermanager.
                              StoreHandlerManager
         :param host: A Host model representing the host to investigate.
@@ -137,12 +137,12 @@ class InvestigatorPlugin(plugins.SimplePlugin):
 
         closure = invoke_callback if callback is not None else None
         self.pending_requests[host.address] = closure
-        manager_clone = store_manager.clone()
+        manager_descriptor = store_manager.descriptor()
 
         # Since cluster might be None we need to check for __dict__
         cluster_dict = getattr(cluster, '__dict__', None)
 
-        job_request = (manager_clone, host.__dict__, cluster_dict)
+        job_request = (manager_descriptor, host.__dict__, cluster_dict)
         self.request_queue.put(job_request)
 
     def is_alive(self):
@@ -0,0 +1,124 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Leader plugin which elects one commissaire process to run singleton
+workers and announces changes in leadership via the wsbus.
+"""
+
+import os
+import socket
+
+from cherrypy.process import plugins
+
+from commissaire.handlers.models import Hosts
+
+
+class LeaderPlugin(plugins.Monitor):
+
+    def __init__(self, bus, store_manager, ttl=30, lease_name='leader'):
+        """
+        Creates a new instance of the LeaderPlugin.
+
+        :param bus: The CherryPy bus.
+        :type bus: cherrypy.process.wspbus.Bus
+        :param store_manager: Proxy object for remtote stores
+        :type store_manager: commissaire.store.StoreHandlerManager
+        :param ttl: Seconds the leader lease is held for unless renewed.
+        :type ttl: int
+        :param lease_name: Name of the lease in the store.
+        :type lease_name: str
+        """
+        # The lease is renewed three times per ttl so a single slow
+        # renewal does not cost the leadership.
+        plugins.Monitor.__init__(
+            self, bus, self.renew, frequency=max(1, ttl // 3),
+            name='LeaderPlugin')
+        self.store_manager = store_manager
+        self.ttl = ttl
+        self.lease_name = lease_name
+        self.holder = '{0}:{1}'.format(socket.gethostname(), os.getpid())
+        self.leader = False
+
+    def start(self):
+        """
+        Starts the plugin and tries to take the lease right away.
+        """
+        self.bus.log('Starting up Leader plugin as {0}'.format(self.holder))
+        self.bus.subscribe('leader-is-elected', self.is_elected)
+        self.renew()
+        plugins.Monitor.start(self)
+    # Start after the plugins which listen for leadership changes.
+    start.priority = 75
+
+    def stop(self):
+        """
+        Stops the plugin and gives up the lease if it is held.
+        """
+        self.bus.log('Stopping down Leader plugin')
+        self.bus.unsubscribe('leader-is-elected', self.is_elected)
+        plugins.Monitor.stop(self)
+        if self.leader:
+            try:
+                self.store_manager.release_lease(
+                    Hosts.new(), self.lease_name, self.holder)
+            except Exception as error:
+                self.bus.log('Unable to release the {0} lease: {1}'.format(
+                    self.lease_name, error))
+            self._set_leader(False)
+
+    def renew(self):
+        """
+        Acquires or renews the lease and publishes leader-elected or
+        leader-lost when the leadership of this process changes. Store
+        errors count as a lost lease.
+        """
+        try:
+            leader = self.store_manager.acquire_lease(
+                Hosts.new(), self.lease_name, self.holder, self.ttl)
+        except Exception as error:
+            self.bus.log('Unable to renew the {0} lease: {1}'.format(
+                self.lease_name, error))
+            leader = False
+        self._set_leader(leader)
+
+    def _set_leader(self, leader):
+        """
+        Records the leadership of this process and publishes changes.
+
+        :param leader: Whether this process holds the lease.
+        :type leader: bool
+        """
+        if leader == self.leader:
+            return
+        self.leader = leader
+        if leader:
+            self.bus.log('{0} was elected leader'.format(self.holder))
+            self.bus.publish('leader-elected')
+        else:
+            self.bus.log('{0} is no longer leader'.format(self.holder))
+            self.bus.publish('leader-lost')
+
+    def is_elected(self):
+        """
+        Returns whether this process holds the leader lease.
+
+        :returns: Whether this process is the leader
+        :rtype: bool
+        """
+        return self.leader
+
+
+#: Generic name for the plugin
+Plugin = LeaderPlugin
@@ -20,14 +20,17 @@ import os
 
 from cherrypy.process import plugins
 
-from multiprocessing import Process
+from multiprocessing import Event, Process
 from commissaire.queues import WATCHER_QUEUE
 from commissaire.jobs.watcher import watcher
 
 
 class WatcherPlugin(plugins.SimplePlugin):
 
-    def __init__(self, bus, store_manager):
+    #: Seconds the watcher is given to stop before it is terminated
+    STOP_TIMEOUT = 30
+
+    def __init__(self, bus, store_manager, elected=False, mode='ssh'):
         """
         Creates a new instance of the WatcherPlugin.
 
@@ -35,6 +38,12 @@ class WatcherPlugin(plugins.SimplePlugin):
         :type bus: cherrypy.process.wspbus.Bus
         :param store_manager: Proxy object for remtote stores
         :type store_manager: commissaire.store.StoreHandlerManager
+        :param elected: Only run the watcher while this process is the
+                        elected leader.
+        :type elected: bool
+        :param mode: How the watcher checks hosts. See
+                     commissaire.jobs.watcher.watcher.
+        :type mode: str
         """
         plugins.SimplePlugin.__init__(self, bus)
         # multiprocessing.Process() uses fork() to execute the target
@@ -47,18 +56,39 @@ class WatcherPlugin(plugins.SimplePlugin):
         # distinguish whether we're the parent or child process and
         # avoid interacting with an invalid Process object.
         self.main_pid = os.getpid()
-        self.process = Process(
-            target=watcher,
-            args=(WATCHER_QUEUE, store_manager.clone()))
+        self.descriptor = store_manager.descriptor()
+        self.elected = elected
+        self.mode = mode
+        self.stop_event = None
+        self.process = self._new_process()
         # TODO: Move to start()
         self.bus.subscribe('watcher-is-alive', self.is_alive)
+        if self.elected:
+            # Subscribed up front so no election is missed at startup.
+            self.bus.subscribe('leader-elected', self.start_watcher)
+            self.bus.subscribe('leader-lost', self.stop_watcher)
+
+    def _new_process(self):
+        """
+        Returns a new, unstarted watcher process. self.stop_event is
+        replaced by the event which stops it.
+
+        :returns: The watcher process
+        :rtype: multiprocessing.Process
+        """
+        self.stop_event = Event()
+        return Process(
+            target=watcher, args=(WATCHER_QUEUE, self.descriptor),
+            kwargs={'mode': self.mode, 'stop_event': self.stop_event})
 
     def start(self):
         """
-        Starts the plugin and the watchergator process.
+        Starts the plugin and, unless it waits to be elected, the watcher
+        process.
         """
         self.bus.log('Starting up Watcher plugin')
-        self.process.start()
+        if not self.elected:
+            self.start_watcher()
 
     def stop(self):
         """
@@ -66,9 +96,39 @@ class WatcherPlugin(plugins.SimplePlugin):
         """
         self.bus.log('Stopping down Watcher plugin')
         self.bus.unsubscribe('watcher-is-alive', self.is_alive)
-        if os.getpid() == self.main_pid:
-            self.process.terminate()
-            self.process.join()
+        if self.elected:
+            self.bus.unsubscribe('leader-elected', self.start_watcher)
+            self.bus.unsubscribe('leader-lost', self.stop_watcher)
+        self.stop_watcher()
+
+    def start_watcher(self):
+        """
+        Starts the watcher process if it is not running.
+        """
+        if os.getpid() != self.main_pid or self.process.is_alive():
+            return
+        if self.process.pid is not None:
+            # A process can only be started once.
+            self.process = self._new_process()
+        self.bus.log('Starting the watcher process')
+        self.process.start()
+
+    def stop_watcher(self):
+        """
+        Stops the watcher process if it is running.
+
+        The watcher is asked to stop between hosts so it never leaves the
+        WATCHER_QUEUE half written. It is only terminated when it does
+        not stop within STOP_TIMEOUT seconds.
+        """
+        if os.getpid() == self.main_pid and self.process.is_alive():
+            self.bus.log('Stopping the watcher process')
+            self.stop_event.set()
+            self.process.join(self.STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.bus.log('Terminating the watcher process')
+                self.process.terminate()
+                self.process.join()
 
     def is_alive(self):
         """
@@ -36,6 +36,9 @@ DEFAULT_CLUSTER_NETWORK_JSON = {
     'type': NETWORK_TYPE_DEFAULT
 }
 
+#: Seconds a Kubernetes node status listed in bulk is served for
+DEFAULT_STATUS_MAX_AGE = 5
+
 # Default etcd configuration
 # (server URL provided by store handler)
 DEFAULT_ETCD_STORE_HANDLER = {
@@ -17,6 +17,8 @@ The container manager package.
 """
 
 import logging
+import threading
+import time
 
 from commissaire import constants as C
 
@@ -27,6 +29,8 @@ class ContainerManagerBase(object):  # pragma: no cover
     """
 
     cluster_type = C.CLUSTER_TYPE_HOST
+    #: Seconds between checks for the nodes being waited for
+    node_poll_interval = 1
 
     def __init__(self, config):
         """
@@ -36,6 +40,10 @@ class ContainerManagerBase(object):  # pragma: no cover
         :type config: dict
         """
         self.logger = logging.getLogger('containermgr')
+        # (name, deadline, callback) of every node being waited for
+        self._node_waiters = []
+        self._node_waiters_lock = threading.Lock()
+        self._node_poller = None
 
     def node_registered(self, name):
         """
@@ -48,3 +56,81 @@ class ContainerManagerBase(object):  # pragma: no cover
         """
         raise NotImplementedError(
             'ContainerManagerBase().node_registered() must be overridden.')
+
+    def node_ready_states(self):
+        """
+        Returns whether each node is ready to run containers as far as the
+        container manager knows. Container managers which track node
+        health override this.
+
+        :returns: Node name -> True, False or None if it is unknown
+        :rtype: dict
+        """
+        return {}
+
+    def registered_nodes(self, names):
+        """
+        Returns which of the named nodes are registered. Container managers
+        which can list their nodes at once override this to check every
+        name with one request.
+
+        :param names: Names of the nodes.
+        :type names: set
+        :returns: The names of the registered nodes
+        :rtype: set
+        """
+        return set(x for x in names if self.node_registered(x))
+
+    def wait_for_node(self, name, timeout, callback):
+        """
+        Waits for a node to be registered without blocking the caller.
+        callback(registered) is called from a shared poller thread as soon
+        as the node is registered or once timeout seconds have passed.
+
+        :param name: The name of the node.
+        :type name: str
+        :param timeout: Seconds to wait for the node.
+        :type timeout: int
+        :param callback: Called with whether the node was registered.
+        :type callback: callable
+        """
+        with self._node_waiters_lock:
+            self._node_waiters.append((name, time.time() + timeout, callback))
+            if self._node_poller is None:
+                self._node_poller = threading.Thread(target=self._poll_nodes)
+                self._node_poller.daemon = True
+                self._node_poller.start()
+
+    def _poll_nodes(self):
+        """
+        Checks every node being waited for at once each node_poll_interval
+        until nothing is waited for.
+        """
+        while True:
+            with self._node_waiters_lock:
+                waiters = list(self._node_waiters)
+                if not waiters:
+                    self._node_poller = None
+                    return
+            try:
+                registered = self.registered_nodes(
+                    set(x[0] for x in waiters))
+            except Exception as error:
+                self.logger.warn('Unable to check for nodes: {0}: {1}'.format(
+                    type(error), error))
+                registered = set()
+
+            now = time.time()
+            done = [x for x in waiters if x[0] in registered or now >= x[1]]
+            with self._node_waiters_lock:
+                for waiter in done:
+                    self._node_waiters.remove(waiter)
+            for name, _, callback in done:
+                try:
+                    callback(name in registered)
+                except Exception as error:
+                    self.logger.warn(
+                        'Node callback for {0} failed: {1}: {2}'.format(
+                            name, type(error), error))
+            if len(done) < len(waiters):
+                time.sleep(self.node_poll_interval)
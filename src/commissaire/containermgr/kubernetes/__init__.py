@@ -16,11 +16,13 @@
 The kubernetes container manager package.
 """
 
-import requests
+import threading
+import time
 
 from commissaire import constants as C
 from commissaire.compat.urlparser import urljoin
 from commissaire.containermgr import ContainerManagerBase
+from commissaire.containermgr.kubernetes.session import new_session
 
 
 class ContainerManager(ContainerManagerBase):
@@ -29,6 +31,8 @@ class ContainerManager(ContainerManagerBase):
     """
 
     cluster_type = C.CLUSTER_TYPE_KUBERNETES
+    #: Seconds a node status listed in bulk is served for
+    DEFAULT_STATUS_MAX_AGE = C.DEFAULT_STATUS_MAX_AGE
 
     def __init__(self, config):
         """
@@ -38,25 +42,29 @@ class ContainerManager(ContainerManagerBase):
         :type config: dict
         """
         ContainerManagerBase.__init__(self, config)
-        self.con = requests.Session()
+        self.con = new_session(config)
+        # Requests made with another party's token must not carry ours
+        self.token_con = new_session(config, credentials=False)
         token = config.get('token', None)
         if token:
-            self.con.headers["Authorization"] = "Bearer {0}".format(token)
             self.logger.info('Using bearer token')
             self.logger.debug('Bearer token: {0}'.format(token))
 
         certificate_path = config.get('certificate_path')
         certificate_key_path = config.get('certificate_key_path')
         if certificate_path and certificate_key_path:
-            self.con.cert = (certificate_path, certificate_key_path)
             self.logger.info(
                 'Using client side certificate. Certificate path: {0} '
                 'Certificate Key Path: {1}'.format(
                     certificate_path, certificate_key_path))
 
-        # TODO: Verify TLS!!!
-        self.con.verify = False
         self.base_uri = urljoin(config['server_url'], '/api/v1')
+        self.status_max_age = config.get(
+            'status-max-age', self.DEFAULT_STATUS_MAX_AGE)
+        # Node name -> node, as of the last bulk list
+        self._nodes = {}
+        self._nodes_listed = None
+        self._nodes_lock = threading.Lock()
         self.logger.info('Kubernetes Container Manager created: {0}'.format(
             self.base_uri))
         self.logger.debug(
@@ -87,6 +95,22 @@ class ContainerManager(ContainerManagerBase):
             part, resp.status_code))
         return resp
 
+    def _get_with_token(self, part, token):
+        """
+        Get information from the Kubernetes apiserver as the holder of a
+        bearer token rather than as commissaire.
+
+        :param part: The URI part. EG: /serviceaccounts
+        :type part: str
+        :param token: The bearer token to authenticate with.
+        :type token: str
+        :returns: requests.Response
+        """
+        self.logger.debug('Executing GET for {0} with a token'.format(part))
+        return self.token_con.get(
+            '{0}{1}'.format(self.base_uri, part),
+            headers={'Authorization': 'Bearer ' + token})
+
     def node_registered(self, name):
         """
         Checks is a node was registered.
@@ -103,9 +127,64 @@ class ContainerManager(ContainerManagerBase):
             return True
         return False
 
+    def registered_nodes(self, names):
+        """
+        Returns which of the named nodes are registered with one list of
+        every node.
+
+        :param names: Names of the nodes.
+        :type names: set
+        :returns: The names of the registered nodes
+        :rtype: set
+        """
+        resp = self._get('/nodes')
+        if resp.status_code != 200:
+            return set()
+        return set(names) & set(
+            x['metadata']['name'] for x in resp.json().get('items') or [])
+
+    def _list_nodes(self):
+        """
+        Returns the last bulk list of nodes, listing every node again once
+        the list is older than status_max_age.
+
+        :returns: Node name -> node
+        :rtype: dict
+        """
+        with self._nodes_lock:
+            now = time.time()
+            if (self._nodes_listed is None or
+                    now - self._nodes_listed >= self.status_max_age):
+                resp = self._get('/nodes')
+                self._nodes = {}
+                if resp.status_code == 200:
+                    for node in resp.json().get('items') or []:
+                        self._nodes[node['metadata']['name']] = node
+                # A failed list is not retried until it is stale either.
+                self._nodes_listed = now
+            return self._nodes
+
+    def node_ready_states(self):
+        """
+        Returns the Ready condition of every node from a bulk list of nodes
+        at most status_max_age seconds old.
+
+        :returns: Node name -> True, False or None if it is unknown
+        :rtype: dict
+        """
+        states = {}
+        for name, node in self._list_nodes().items():
+            states[name] = None
+            for condition in node.get('status', {}).get('conditions') or []:
+                if condition.get('type') == 'Ready':
+                    states[name] = {'True': True, 'False': False}.get(
+                        condition.get('status'))
+        return states
+
     def get_host_status(self, address, raw=False):
         """
-        Returns the node status.
+        Returns the node status. Unless raw is requested the node is served
+        from a bulk list of nodes at most status_max_age seconds old.
 
         :param address: The address of the host to check.
         :type address: str
@@ -114,6 +193,11 @@ class ContainerManager(ContainerManagerBase):
         :returns: The response back from kubernetes.
         :rtype: requests.Response
         """
+        if not raw and self.status_max_age:
+            node = self._list_nodes().get(address)
+            if node is not None:
+                return (200, node)
+
         part = '/nodes/{0}'.format(address)
         resp = self._get(part)
         data = resp.json()
@@ -0,0 +1,104 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+HTTP transport shared by everything which talks to the Kubernetes
+apiserver.
+"""
+
+import os
+import threading
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+#: Connections kept per apiserver. Matches the server thread pool.
+DEFAULT_POOL_SIZE = 10
+#: Seconds to wait for a connection to the apiserver
+DEFAULT_CONNECT_TIMEOUT = 5
+#: Seconds to wait for the apiserver to send data
+DEFAULT_READ_TIMEOUT = 30
+
+#: (process id, server_url, certificate, pool size) -> HTTPAdapter.
+#: Keyed by process so forked children never share the parent's sockets.
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+class KubeSession(requests.Session):
+    """
+    A requests session which applies default timeouts to every request.
+    """
+
+    #: (connect, read) timeout used when a request does not give one
+    timeout = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+
+    def request(self, method, url, **kwargs):
+        """
+        Sends a request, timing out by default.
+
+        :returns: The response
+        :rtype: requests.Response
+        """
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return requests.Session.request(self, method, url, **kwargs)
+
+
+def new_session(config, credentials=True):
+    """
+    Creates a session for the apiserver in config. Sessions for the same
+    apiserver and client certificate in the same process share one pool
+    of keep-alive connections.
+
+    :param config: Configuration details
+    :type config: dict
+    :param credentials: Whether to authenticate with the configured token
+                        and client certificate
+    :type credentials: bool
+    :returns: The session
+    :rtype: KubeSession
+    """
+    session = KubeSession()
+    session.timeout = (
+        config.get('connect-timeout', DEFAULT_CONNECT_TIMEOUT),
+        config.get('read-timeout', DEFAULT_READ_TIMEOUT))
+    # Lists of nodes compress well
+    session.headers['Accept-Encoding'] = 'gzip'
+    # TODO: Verify TLS!!!
+    session.verify = False
+
+    cert = None
+    if credentials:
+        token = config.get('token', None)
+        if token:
+            session.headers['Authorization'] = 'Bearer {0}'.format(token)
+        certificate_path = config.get('certificate_path')
+        certificate_key_path = config.get('certificate_key_path')
+        if certificate_path and certificate_key_path:
+            cert = (certificate_path, certificate_key_path)
+            session.cert = cert
+
+    pool_size = config.get('pool-size', DEFAULT_POOL_SIZE)
+    key = (os.getpid(), config.get('server_url'), cert, pool_size)
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=pool_size)
+            _adapters[key] = adapter
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
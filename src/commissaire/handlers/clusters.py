@@ -27,9 +27,10 @@ from multiprocessing import Process
 from commissaire import constants as C
 from commissaire.resource import Resource
 from commissaire.jobs.clusterexec import clusterexec
+from commissaire.store.hostcounters import HostCounters
 from commissaire.handlers.models import (
     Cluster, Clusters, ClusterDeploy, ClusterRestart,
-    ClusterUpgrade, Hosts, Network)
+    ClusterUpgrade, Network)
 
 import commissaire.handlers.util as util
 
@@ -49,9 +50,16 @@ class ClustersResource(Resource):
         :type resp: falcon.Response
         """
         req.context['model'] = None
+        since = req.get_param_as_int('since')
         try:
-            store_manager = cherrypy.engine.publish('get-store-manager')[0]
-            clusters = store_manager.list(Clusters.new())
+            revision, clusters, deleted = util.list_changes(
+                resp, Clusters.new(), since)
+            if since is not None:
+                resp.status = falcon.HTTP_200
+                resp.body = json.dumps(util.format_changes(
+                    revision, [cluster.name for cluster in clusters.clusters],
+                    deleted))
+                return
             if clusters.clusters == []:
                 self.logger.debug('Store returned an empty cluster list.')
                 resp.status = falcon.HTTP_200
@@ -64,6 +72,9 @@ class ClustersResource(Resource):
 
         # HACK: Should use model instead
         resp.status = falcon.HTTP_200
+        etag = util.listing_etag(clusters, revision)
+        if etag is not None and util.not_modified(req, resp, etag):
+            return
         resp.body = json.dumps([cluster.name for cluster in clusters.clusters])
 
 
@@ -72,39 +83,30 @@ class ClusterResource(Resource):
     Resource for working with a single Cluster.
     """
 
+    def __init__(self, **kwargs):
+        """
+        Creates a new ClusterResource instance.
+
+        :param kwargs: All other keyword arguemtns.
+        :type kwargs: dict
+        """
+        Resource.__init__(self, **kwargs)
+        self.host_counters = HostCounters()
+
     def _calculate_hosts(self, cluster):
         """
         Calculates the hosts metadata for the cluster.
 
-        :param cluster: The name of the cluster.
-        :type cluster: str
+        :param cluster: The cluster.
+        :type cluster: commissaire.handlers.models.Cluster
         """
-        # XXX: Not sure which wil be more efficient: fetch all
-        #      the host data in one etcd call and sort through
-        #      them, or fetch the ones we need individually.
-        #      For the MVP phase, fetch all is better.
         try:
             store_manager = cherrypy.engine.publish('get-store-manager')[0]
-            hosts = store_manager.list(Hosts(hosts=[]))
+            self.host_counters.count(store_manager, cluster)
         except:
             self.logger.warn(
                 'Store does not have any hosts. '
                 'Cannot determine cluster stats.')
-            return
-
-        available = unavailable = total = 0
-
-        for host in hosts.hosts:
-            if host.address in cluster.hostset:
-                total += 1
-                if host.status == 'active':
-                    available += 1
-                else:
-                    unavailable += 1
-
-        cluster.hosts['total'] = total
-        cluster.hosts['available'] = available
-        cluster.hosts['unavailable'] = unavailable
 
     def on_get(self, req, resp, name):
         """
@@ -202,6 +204,7 @@ class ClusterResource(Resource):
         try:
             store_manager = cherrypy.engine.publish('get-store-manager')[0]
             store_manager.delete(Cluster.new(name=name))
+            self.host_counters.forget(name)
             resp.status = falcon.HTTP_200
             self.logger.info(
                 'Deleted cluster {0} per request.'.format(name))
@@ -280,13 +283,16 @@ class ClusterHostsResource(Resource):
         #        - Does the host exist at /commissaire/hosts/{IP}?
         #        - Does the host already belong to another cluster?
 
-        # FIXME: Should guard against races here, since we're fetching
-        #        the cluster record and writing it back with some parts
-        #        unmodified.  Use either locking or a conditional write
-        #        with the etcd 'modifiedIndex'.  Deferring for now.
-
-        cluster.hostset = list(new_hosts)
-        store_manager.save(cluster)
+        # Only the difference is written so members changed by others
+        # since the cluster was read are kept.
+        try:
+            for address in sorted(new_hosts - old_hosts):
+                store_manager.hostset_add(cluster, address)
+            for address in sorted(old_hosts - new_hosts):
+                store_manager.hostset_remove(cluster, address)
+        except KeyError:
+            resp.status = falcon.HTTP_404
+            return
         resp.status = falcon.HTTP_200
 
 
@@ -311,15 +317,11 @@ class ClusterSingleHostResource(ClusterHostsResource):
         :type address: str
         """
         try:
-            store_manager = cherrypy.engine.publish('get-store-manager')[0]
-            cluster = store_manager.get(Cluster.new(name=name))
-        except:
-            resp.status = falcon.HTTP_404
-            return
-
-        if address in cluster.hostset:
-            resp.status = falcon.HTTP_200
-        else:
+            if util.etcd_cluster_has_host(name, address):
+                resp.status = falcon.HTTP_200
+            else:
+                resp.status = falcon.HTTP_404
+        except KeyError:
             resp.status = falcon.HTTP_404
 
     def on_put(self, req, resp, name, address):
@@ -460,7 +462,8 @@ class ClusterDeployResource(Resource):
         except:
             pass
 
-        args = (store_manager.clone(), name, 'deploy', {'version': version})
+        args = (
+            store_manager.descriptor(), name, 'deploy', {'version': version})
         p = Process(target=clusterexec, args=args)
         p.start()
         self.logger.debug(
@@ -553,7 +556,7 @@ class ClusterRestartResource(Resource):
 
         # TODO: Move to a poll?
         store_manager = cherrypy.engine.publish('get-store-manager')[0]
-        args = (store_manager.clone(), name, 'restart')
+        args = (store_manager.descriptor(), name, 'restart')
         p = Process(target=clusterexec, args=args)
         p.start()
 
@@ -650,7 +653,7 @@ class ClusterUpgradeResource(Resource):
 
         # TODO: Move to a poll?
         store_manager = cherrypy.engine.publish('get-store-manager')[0]
-        args = (store_manager.clone(), name, 'upgrade')
+        args = (store_manager.descriptor(), name, 'upgrade')
         p = Process(target=clusterexec, args=args)
         p.start()
 
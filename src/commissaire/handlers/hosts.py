@@ -25,10 +25,19 @@ import commissaire.handlers.util as util
 
 from commissaire import constants as C
 from commissaire.resource import Resource
-from commissaire.handlers.models import Host, HostStatus, Hosts, Clusters
+from commissaire.handlers.models import (
+    Cluster, Clusters, Host, HostStatus, Hosts)
 from commissaire.queues import WATCHER_QUEUE
 
 
+#: Host attributes a listing may be filtered on
+_host_filters = ('status', 'os')
+
+#: Host attributes a listing may be projected to
+_host_fields = frozenset(
+    x for x in Host._attribute_map if x not in Host._hidden_attributes)
+
+
 class HostsResource(Resource):
     """
     Resource for working with Hosts.
@@ -43,13 +52,52 @@ class HostsResource(Resource):
         :param resp: Response instance that will be passed through.
         :type resp: falcon.Response
         """
+        since = req.get_param_as_int('since')
+        filters = {}
+        for name in _host_filters:
+            values = req.get_param_as_list(name)
+            if values:
+                filters[name] = values
+        cluster_name = req.get_param('cluster')
+        fields = req.get_param_as_list('fields')
+        limit = req.get_param_as_int('limit', min=1)
+        cursor = req.get_param('cursor')
+        query = (filters or cluster_name or fields is not None or
+                 limit is not None or cursor is not None)
+
+        if query:
+            if since is not None or (
+                    fields is not None and not set(fields) <= _host_fields):
+                self.logger.info(
+                    'Bad client GET request for hosts: {0}'.format(
+                        req.query_string))
+                resp.status = falcon.HTTP_400
+                return
+            try:
+                resp.status = falcon.HTTP_200
+                resp.body = json.dumps(self._query(
+                    resp, filters, cluster_name, fields, limit, cursor))
+            except KeyError:
+                self.logger.info(
+                    'Cluster {0} does not exist.'.format(cluster_name))
+                resp.status = falcon.HTTP_404
+            return
 
         try:
-            store_manager = cherrypy.engine.publish('get-store-manager')[0]
-            hosts = store_manager.list(Hosts(hosts=[]))
+            revision, hosts, deleted = util.list_changes(
+                resp, Hosts(hosts=[]), since)
+            if since is not None:
+                resp.status = falcon.HTTP_200
+                resp.body = json.dumps(util.format_changes(
+                    revision, [x._struct_for_json() for x in hosts.hosts],
+                    deleted))
+                return
             if len(hosts.hosts) == 0:
                 raise Exception()
             resp.status = falcon.HTTP_200
+            etag = util.listing_etag(hosts, revision)
+            if etag is not None and util.not_modified(req, resp, etag):
+                return
             req.context['model'] = hosts
         except Exception:
             # This was originally a "no content" but I think a 404 makes
@@ -60,6 +108,48 @@ class HostsResource(Resource):
             req.context['model'] = None
             return
 
+    def _query(self, resp, filters, cluster_name, fields, limit, cursor):
+        """
+        Lists one page of the hosts matching a query, ordered by address.
+        When more hosts follow the page the store's cursor for the next
+        page is set in the next cursor header.
+
+        :param resp: Response instance that will be passed through.
+        :type resp: falcon.Response
+        :param filters: Host attribute name -> accepted values.
+        :type filters: dict
+        :param cluster_name: Only list members of this cluster, or None.
+        :type cluster_name: str or None
+        :param fields: Host attributes to return, or None for all of them.
+        :type fields: list or None
+        :param limit: Most hosts to return, or None for every host.
+        :type limit: int or None
+        :param cursor: The cursor of the previous page, or None.
+        :type cursor: str or None
+        :returns: The host records.
+        :rtype: list
+        :raises: KeyError if the cluster does not exist
+        """
+        store_manager = cherrypy.engine.publish('get-store-manager')[0]
+        filters = dict(filters)
+        if cluster_name:
+            filters['address'] = store_manager.get(
+                Cluster.new(name=cluster_name)).hostset
+
+        attributes = None
+        if fields is not None:
+            attributes = tuple(set(fields) | set(['address']))
+        hosts, next_cursor = store_manager.list_page(
+            Hosts.new(), attributes=attributes, filters=filters,
+            limit=limit, cursor=cursor)
+        if next_cursor is not None:
+            resp.set_header(util.CURSOR_HEADER, next_cursor)
+
+        records = [x._struct_for_json() for x in hosts.hosts]
+        if fields is not None:
+            records = [dict((k, x[k]) for k in fields) for x in records]
+        return records
+
 
 class HostCredsResource(Resource):
     """
@@ -296,8 +386,7 @@ class HostResource(Resource):
                     self.logger.info(
                         'Removing {0} from cluster {1}'.format(
                             address, cluster.name))
-                    cluster.hostset.remove(address)
-                    store_manager.save(cluster)
+                    store_manager.hostset_remove(cluster, address)
                     self.logger.info(
                         '{0} has been removed from cluster {1}'.format(
                             address, cluster.name))
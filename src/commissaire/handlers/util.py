@@ -15,12 +15,140 @@
 """
 Resource utilities.
 """
+import hashlib
+
 import cherrypy
 import falcon
 
 from commissaire.handlers.models import Cluster, Clusters, Host
 
 
+#: Response header carrying the store revision of a listing
+REVISION_HEADER = 'Commissaire-Revision'
+
+#: Response header carrying the cursor of the next page of a listing
+CURSOR_HEADER = 'Commissaire-Next-Cursor'
+
+
+def list_changes(resp, model_instance, since):
+    """
+    Lists models through the store manager and sets the revision header.
+
+    :param resp: Response instance that will be passed through.
+    :type resp: falcon.Response
+    :param model_instance: List model instance to fill.
+    :type model_instance: commissaire.model.Model
+    :param since: Store revision from the request, or None.
+    :type since: int or None
+    :returns: A (revision, model_instance, deleted) tuple.
+    :rtype: tuple
+    """
+    store_manager = cherrypy.engine.publish('get-store-manager')[0]
+    revision, model_instance, deleted = store_manager.list_changes(
+        model_instance, since)
+    if revision is not None:
+        resp.set_header(REVISION_HEADER, str(revision))
+    return (revision, model_instance, deleted)
+
+
+def format_changes(revision, updated, deleted):
+    """
+    Returns the body of a response to a ?since= listing.
+
+    :param revision: Store revision the changes run up to.
+    :type revision: int or str or None
+    :param updated: Created or updated items.
+    :type updated: list
+    :param deleted: Primary keys of deleted items, or None if updated
+                    holds every item and replaces the client's copy.
+    :type deleted: list or None
+    :returns: The response body
+    :rtype: dict
+    """
+    return {
+        'revision': revision,
+        'reset': deleted is None,
+        'updated': updated,
+        'deleted': deleted or [],
+    }
+
+
+def revision_etag(revision):
+    """
+    Returns the entity tag of a listing read at a store revision.
+
+    :param revision: Store revision of the listing.
+    :type revision: int or str
+    :returns: A quoted entity tag
+    :rtype: str
+    """
+    return '"r{0}"'.format(revision)
+
+
+def listing_etag(model_instance, revision):
+    """
+    Returns the entity tag of a listing read at a store revision, or None
+    when the store's revision may not match what was listed. Listings
+    without one are tagged from their content by the JSONify middleware.
+
+    :param model_instance: List model instance which was listed.
+    :type model_instance: commissaire.model.Model
+    :param revision: Store revision of the listing, or None.
+    :type revision: int or str or None
+    :returns: A quoted entity tag or None
+    :rtype: str or None
+    """
+    store_manager = cherrypy.engine.publish('get-store-manager')[0]
+    # Only stores which list changes on their own read the revision
+    # together with the listing.
+    if revision is None or not store_manager.can_list_changes(
+            model_instance):
+        return None
+    return revision_etag(revision)
+
+
+def content_etag(body):
+    """
+    Returns the entity tag of a response body.
+
+    :param body: The response body.
+    :type body: str
+    :returns: A quoted entity tag
+    :rtype: str
+    """
+    if not isinstance(body, bytes):
+        body = body.encode('utf-8')
+    return '"{0}"'.format(hashlib.sha1(body).hexdigest())
+
+
+def not_modified(req, resp, etag):
+    """
+    Sets the entity tag of a response and answers 304 Not Modified when
+    the client's If-None-Match already names it.
+
+    :param req: Request instance that will be passed through.
+    :type req: falcon.Request
+    :param resp: Response instance that will be passed through.
+    :type resp: falcon.Response
+    :param etag: A quoted entity tag.
+    :type etag: str
+    :returns: True if the response is now 304 Not Modified
+    :rtype: bool
+    """
+    resp.etag = etag
+    header = req.get_header('If-None-Match')
+    if req.method not in ('GET', 'HEAD') or not header:
+        return False
+    # If-None-Match uses the weak comparison
+    tags = [x.strip() for x in header.split(',')]
+    tags = [x[2:] if x.startswith('W/') else x for x in tags]
+    if '*' in tags or etag in tags:
+        resp.status = falcon.HTTP_304
+        resp.body = ''
+        return True
+    return False
+
+
 def etcd_host_key(address):
     """
     Returns the etcd key for the given host address.
@@ -86,13 +214,8 @@ def etcd_cluster_has_host(name, address):
     :param address: Host address
     :type address: str
     """
-    try:
-        store_manager = cherrypy.engine.publish('get-store-manager')[0]
-        cluster = store_manager.get(Cluster.new(name=name))
-    except:
-        raise KeyError
-
-    return address in cluster.hostset
+    store_manager = cherrypy.engine.publish('get-store-manager')[0]
+    return store_manager.hostset_contains(Cluster.new(name=name), address)
 
 
 def etcd_cluster_add_host(name, address):
@@ -108,24 +231,12 @@ def etcd_cluster_add_host(name, address):
     :param address: Host address to add
     :type address: str
     """
-    try:
-        store_manager = cherrypy.engine.publish('get-store-manager')[0]
-        cluster = store_manager.get(Cluster.new(name=name))
-    except:
-        raise KeyError
-
     # FIXME: Need input validation.
     #        - Does the host exist at /commissaire/hosts/{IP}?
     #        - Does the host already belong to another cluster?
 
-    # FIXME: Should guard against races here, since we're fetching
-    #        the cluster record and writing it back with some parts
-    #        unmodified.  Use either locking or a conditional write
-    #        with the etcd 'modifiedIndex'.  Deferring for now.
-
-    if address not in cluster.hostset:
-        cluster.hostset.append(address)
-        cluster = store_manager.save(cluster)
+    store_manager = cherrypy.engine.publish('get-store-manager')[0]
+    store_manager.hostset_add(Cluster.new(name=name), address)
 
 
 def etcd_cluster_remove_host(name, address):
@@ -142,19 +253,8 @@ def etcd_cluster_remove_host(name, address):
     :param address: Host address to remove
     :type address: str
     """
-    cluster = get_cluster_model(name)
-    if not cluster:
-        raise KeyError
-
-    # FIXME: Should guard against races here, since we're fetching
-    #        the cluster record and writing it back with some parts
-    #        unmodified.  Use either locking or a conditional write
-    #        with the etcd 'modifiedIndex'.  Deferring for now.
-
-    if address in cluster.hostset:
-        cluster.hostset.remove(address)
-        store_manager = cherrypy.engine.publish('get-store-manager')[0]
-        store_manager.save(cluster)
+    store_manager = cherrypy.engine.publish('get-store-manager')[0]
+    store_manager.hostset_remove(Cluster.new(name=name), address)
 
 
 def get_cluster_model(name):
@@ -239,7 +339,8 @@ def etcd_host_create(address, ssh_priv_key, remote_user, cluster_name=None):
 
             # Add host to the requested cluster.
             if cluster_name:
-                etcd_cluster_add_host(cluster_name, host.address)
+                store_manager.hostset_add(
+                    Cluster.new(name=cluster_name), host.address)
 
     cherrypy.engine.publish(
         'investigator-submit', store_manager, host, cluster, callback)
@@ -23,6 +23,7 @@ from commissaire.handlers.models import (
     ClusterDeploy, ClusterUpgrade, ClusterRestart, Cluster, Hosts)
 from commissaire.transport import ansibleapi
 from commissaire.oscmd import get_oscmd
+from commissaire.store.storehandlermanager import resolve_store_manager
 from commissaire.util.ssh import TemporarySSHKey
 
 
@@ -30,7 +31,7 @@ def clusterexec(store_manager, cluster_name, command, kwargs={}):
     """
     Remote executes a shell commands across a cluster.
 
-    :param store_manager: Proxy object for remtote stores
+    :param store_manager: Proxy object for remtote stores or its descriptor
     :type store_manager: commissaire.store.StoreHandlerManager
     :param cluster_name: Name of the cluster to act on
     :type cluster_name: str
@@ -40,6 +41,7 @@ def clusterexec(store_manager, cluster_name, command, kwargs={}):
     :type kwargs: dict
     """
     logger = logging.getLogger('clusterexec')
+    store_manager = resolve_store_manager(store_manager)
 
     # TODO: This is a hack and should really be done elsewhere
     command_args = ()
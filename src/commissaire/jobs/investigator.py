@@ -18,16 +18,85 @@ The investigator job.
 import json
 import datetime
 import logging
-import sys
-
-from time import sleep
+import threading
 
 from commissaire.handlers.models import Host
 from commissaire.oscmd import get_oscmd
 from commissaire.queues import WATCHER_QUEUE
+from commissaire.store.storehandlermanager import resolve_store_manager
 from commissaire.transport import ansibleapi
 from commissaire.util.ssh import TemporarySSHKey
 
+#: Seconds a bootstrapped host has to register with a container manager
+NODE_REGISTRATION_TIMEOUT = 15
+
+
+def _wait_for_registration(host, con_mgrs, response_queue, logger):
+    """
+    Waits for a bootstrapped host to register with every container manager
+    and then hands it to the watcher and responds with it. The waits run
+    on the container managers' pollers so the caller is not blocked.
+
+    :param host: The bootstrapped host.
+    :type host: commissaire.handlers.models.Host
+    :param con_mgrs: Container managers the host should register with.
+    :type con_mgrs: list
+    :param response_queue: Queue to respond on.
+    :type response_queue: Queue.Queue
+    :param logger: The investigator logger.
+    :type logger: logging.Logger
+    :returns: An event set once the host has been responded with.
+    :rtype: threading.Event
+    """
+    con_mgrs = list(con_mgrs)
+    results = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def finish():
+        host.status = 'inactive'
+        if con_mgrs and all(results):
+            host.status = 'active'
+        logger.info(
+            'Finished bootstrapping for {0}'.format(host.address))
+        logger.debug('Finished bootstrapping for {0}: {1}'.format(
+            host.address, host.to_json()))
+        WATCHER_QUEUE.put_nowait((host, datetime.datetime.utcnow()))
+        response_queue.put((host, None))
+        done.set()
+
+    def registered(con_mgr):
+        def callback(is_registered):
+            if is_registered:
+                logger.info(
+                    '{0} has been registered with the {1}.'.format(
+                        host.address, con_mgr.__class__.__name__))
+            else:
+                logger.warn(
+                    'Unable to finish bootstrap for {0} while associating '
+                    'with the {1}'.format(
+                        host.address, con_mgr.__class__.__name__))
+            with lock:
+                results.append(is_registered)
+                if len(results) < len(con_mgrs):
+                    return
+            finish()
+        return callback
+
+    if not con_mgrs:
+        finish()
+    for con_mgr in con_mgrs:
+        logger.debug('Waiting for {0} to register with {1}...'.format(
+            host.address, con_mgr.__class__.__name__))
+        try:
+            con_mgr.wait_for_node(
+                host.address, NODE_REGISTRATION_TIMEOUT, registered(con_mgr))
+        except Exception as error:
+            logger.warn('Unable to wait for {0}: {1}: {2}'.format(
+                host.address, type(error), error))
+            registered(con_mgr)(False)
+    return done
+
 
 def investigator(request_queue, response_queue, run_once=False):
     """
@@ -43,6 +112,8 @@ def investigator(request_queue, response_queue, run_once=False):
         # Statuses follow:
         # http://commissaire.readthedocs.org/en/latest/enums.html#host-statuses
         store_manager, to_investigate, cluster_data = request_queue.get()
+        # Descriptors resolve to the same long lived manager every time
+        store_manager = resolve_store_manager(store_manager)
         if cluster_data is None:
             cluster_data = {}
         address = to_investigate['address']
@@ -115,49 +186,17 @@ def investigator(request_queue, response_queue, run_once=False):
                 break
             continue
 
-        # Verify association with relevant container managers
+        # Verify association with relevant container managers without
+        # holding up the next host
         logger.debug('Attempting to register with relevant container '
                      'managers: cluster_data={0}'.format(cluster_data))
-        for con_mgr in store_manager.list_container_managers(
-                cluster_data.get('type', '')):
-            try:
-                logger.debug('Trying to register with {0}...'.format(
-                    con_mgr.__class__.__name__))
-                # Try 3 times waiting 5 seconds each time before giving up
-                for cnt in range(0, 3):
-                    if con_mgr.node_registered(address):
-                        logger.info(
-                            '{0} has been registered with the '
-                            'container manager.'.format(address))
-                        host.status = 'active'
-                        break
-                    if cnt == 3:
-                        msg = 'Could not register with the container manager'
-                        logger.warn(msg)
-                        raise Exception(msg)
-                    logger.debug(
-                        '{0} has not been registered with the container '
-                        ' manager. Checking again in 5 seconds...'.format(
-                            address))
-                    sleep(5)
-            except:
-                _, exc_msg, _ = sys.exc_info()
-                logger.warn(
-                    'Unable to finish bootstrap for {0} while associating '
-                    'with the {1}: {2}'.format(
-                        address, con_mgr.__class__.__name__, exc_msg))
-                host.status = 'inactive'
-
-        logger.info(
-            'Finished bootstrapping for {0}'.format(address))
-        logging.debug('Finished bootstrapping for {0}: {1}'.format(
-            address, host.to_json()))
-
-        WATCHER_QUEUE.put_nowait((host, datetime.datetime.utcnow()))
-
-        response_queue.put((host, None))
+        done = _wait_for_registration(
+            host, store_manager.list_container_managers(
+                cluster_data.get('type', '')),
+            response_queue, logger)
         key.remove()
         if run_once:
+            done.wait()
             logger.info('Exiting due to run_once request.')
             break
 
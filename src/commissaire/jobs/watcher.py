@@ -20,51 +20,266 @@ import logging
 import time
 
 from commissaire import constants as C
-from commissaire.handlers.models import Hosts
+from commissaire.handlers.models import Clusters, Hosts
 from commissaire.handlers import util
 from commissaire.transport import ansibleapi
 from commissaire.util.ssh import TemporarySSHKey
 from commissaire.queues import Empty
+from commissaire.store.storehandlermanager import resolve_store_manager
 
 
-def watcher(queue, store_manager, run_once=False):
+def _resync(queue, store_manager, logger):
+    """
+    Merges the hosts in the store into the queue. Queued hosts keep their
+    place and last check, so hosts saved by other commissaire processes are
+    picked up without any host being queued twice.
+
+    :param queue: Queue to populate.
+    :type queue: Queue.Queue
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    """
+    queued = []
+    while True:
+        try:
+            queued.append(queue.get_nowait())
+        except Empty:
+            break
+    addresses = set()
+    for host, last_check in queued:
+        if host.address not in addresses:
+            addresses.add(host.address)
+            queue.put_nowait((host, last_check))
+
+    try:
+        hosts = store_manager.list(Hosts(hosts=[]))
+        for host in hosts.hosts:
+            if host.address in addresses:
+                continue
+            last_check = datetime.datetime.strptime(
+                host.last_check, "%Y-%m-%dT%H:%M:%S.%f")
+            queue.put_nowait((host, last_check))
+            logger.debug('Inserted {0} into WATCHER_QUEUE'.format(
+                host.address))
+    except:
+        logger.info('No hosts found in the store.')
+
+
+def _cluster_type(host, store_manager, logger):
+    """
+    Returns the type of the cluster a host is in.
+
+    :param host: The host.
+    :type host: commissaire.handlers.models.Host
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    :returns: The cluster type, CLUSTER_TYPE_HOST if it is in none
+    :rtype: str
+    """
+    try:
+        return util.cluster_for_host(host.address, store_manager).type
+    except Exception:
+        logger.debug('{0} has no cluster type. Assuming {1}'.format(
+            host.address, C.CLUSTER_TYPE_HOST))
+        return C.CLUSTER_TYPE_HOST
+
+
+def _ready_states(cluster_type, store_manager, logger):
+    """
+    Returns whether the container managers of a cluster type report each
+    of their nodes as ready. The first container manager to know a node
+    decides.
+
+    :param cluster_type: The type of the cluster.
+    :type cluster_type: str
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    :returns: Node name -> True or False. Unknown nodes are left out.
+    :rtype: dict
+    """
+    states = {}
+    for con_mgr in reversed(
+            store_manager.list_container_managers(cluster_type)):
+        try:
+            ready = con_mgr.node_ready_states()
+        except Exception as error:
+            logger.debug('Unable to read nodes from {0}: {1}: {2}'.format(
+                con_mgr.__class__.__name__, type(error), error))
+            continue
+        states.update((k, v) for k, v in ready.items() if v is not None)
+    return states
+
+
+def _cluster_types(store_manager, logger):
+    """
+    Returns the type of the cluster each clustered host is in.
+
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    :returns: Host address -> cluster type
+    :rtype: dict
+    """
+    try:
+        clusters = store_manager.list(Clusters.new()).clusters
+    except Exception:
+        logger.debug('No clusters found in the store.')
+        return {}
+    return dict(
+        (address, cluster.type)
+        for cluster in clusters for address in cluster.hostset)
+
+
+def _set_status(host, available, cluster_type, store_manager, logger):
+    """
+    Updates the status of a host from the result of a check.
+
+    :param host: The host.
+    :type host: commissaire.handlers.models.Host
+    :param available: Whether the host is available.
+    :type available: bool
+    :param cluster_type: The type of the cluster the host is in, or None
+                         to look it up when needed.
+    :type cluster_type: str or None
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    """
+    if available:
+        # Only flip the bit on failed only
+        if host.status == 'failed':
+            if cluster_type is None:
+                cluster_type = _cluster_type(host, store_manager, logger)
+            # If the type is CLUSTER_TYPE_HOST then it should be
+            if cluster_type == C.CLUSTER_TYPE_HOST:
+                host.status = 'disassociated'
+            else:
+                host.status = 'active'
+    else:
+        # If we can not access the host at all throw it to failed
+        host.status = 'failed'
+
+
+def _check_ready_hosts(queue, store_manager, logger, due, stop_event=None):
+    """
+    Checks every queued host which is due with the node ready states of
+    container managers. The states are taken once for the whole pass.
+    Hosts whose state is unknown stay queued as they were so they are
+    checked over SSH.
+
+    :param queue: Queue to check hosts from.
+    :type queue: Queue.Queue
+    :param store_manager: Proxy object for remtote stores
+    :type store_manager: commissaire.store.StoreHandlerManager
+    :param logger: The watcher logger.
+    :type logger: logging.Logger
+    :param due: Hosts last checked before this time are checked.
+    :type due: datetime.datetime
+    :param stop_event: When set, the remaining hosts are requeued unchecked.
+    :type stop_event: multiprocessing.Event or None
+    """
+    queued = []
+    while True:
+        try:
+            queued.append(queue.get_nowait())
+        except Empty:
+            break
+
+    cluster_types = None
+    states = {}
+    for host, last_run in queued:
+        available = None
+        stopping = stop_event is not None and stop_event.is_set()
+        if last_run <= due and not stopping:
+            if cluster_types is None:
+                cluster_types = _cluster_types(store_manager, logger)
+            cluster_type = cluster_types.get(
+                host.address, C.CLUSTER_TYPE_HOST)
+            if cluster_type != C.CLUSTER_TYPE_HOST:
+                if cluster_type not in states:
+                    states[cluster_type] = _ready_states(
+                        cluster_type, store_manager, logger)
+                available = states[cluster_type].get(host.address)
+        if available is None:
+            queue.put_nowait((host, last_run))
+            continue
+        logger.info('{0} is {1}available according to its node'.format(
+            host.address, '' if available else 'not '))
+        now = datetime.datetime.utcnow()
+        _set_status(host, available, cluster_type, store_manager, logger)
+        host.last_check = now.isoformat()
+        host = store_manager.save(host)
+        queue.put_nowait((host, now))
+
+
+def watcher(queue, store_manager, run_once=False, mode='ssh',
+            stop_event=None):
     """
     Attempts to connect and check hosts for status.
 
     :param queue: Queue to pull work from.
     :type queue: Queue.Queue
-    :param store_manager: Proxy object for remtote stores
+    :param store_manager: Proxy object for remtote stores or its descriptor
     :type store_manager: commissaire.store.StoreHandlerManager
     :param run_once: If only one run should occur.
     :type run_once: bool
+    :param mode: "ssh" to check every host over SSH, or
+                 "container-manager" to trust the node conditions of
+                 container managers, read once per pass for every due
+                 host, and check over SSH only when they are unknown.
+    :type mode: str
+    :param stop_event: Stops the watcher between hosts once it is set.
+    :type stop_event: multiprocessing.Event or None
     """
     logger = logging.getLogger('watcher')
     logger.info('Watcher started')
+    store_manager = resolve_store_manager(store_manager)
     # TODO: should be configurable
     delta = datetime.timedelta(seconds=20)
     # TODO: should be configurable
     throttle = 60  # 1 minute
+    # TODO: should be configurable
+    resync = datetime.timedelta(minutes=5)
 
-    # If the queue is empty attempt to populated it with known hosts
-    if queue.qsize() == 0:
-        logger.info('The WATCHER_QUEUE is empty. '
-                    'Attempting to populate it from the store.')
-        try:
-            hosts = store_manager.list(Hosts(hosts=[]))
-            for host in hosts.hosts:
-                last_check = datetime.datetime.strptime(
-                    host.last_check, "%Y-%m-%dT%H:%M:%S.%f")
-                queue.put_nowait((host, last_check))
-                logger.debug('Inserted {0} into WATCHER_QUEUE'.format(
-                    host.address))
-        except:
-            logger.info('No hosts found in the store.')
+    # Hosts may have been added through other commissaire processes, so
+    # the store is read on startup and periodically after that.
+    logger.info('Populating the WATCHER_QUEUE from the store.')
+    _resync(queue, store_manager, logger)
+    last_resync = datetime.datetime.utcnow()
+
+    def stopped(seconds=0):
+        # Sleeps for seconds unless the watcher is stopped meanwhile
+        if stop_event is None:
+            time.sleep(seconds)
+            return False
+        stop_event.wait(seconds)
+        return stop_event.is_set()
+
+    while not stopped():
+        if datetime.datetime.utcnow() - last_resync >= resync:
+            _resync(queue, store_manager, logger)
+            last_resync = datetime.datetime.utcnow()
+
+        if mode == 'container-manager':
+            _check_ready_hosts(
+                queue, store_manager, logger,
+                datetime.datetime.utcnow() - delta, stop_event)
+            if stopped():
+                break
 
-    while True:
         try:
             host, last_run = queue.get_nowait()
         except Empty:
-            time.sleep(throttle)
+            if stopped(throttle):
+                break
             continue
 
         logger.debug('Retrieved {0} from queue. Last check was {1}'.format(
@@ -80,39 +295,23 @@ def watcher(queue, store_manager, run_once=False):
                 host.address))
             transport = ansibleapi.Transport(host.remote_user)
             with TemporarySSHKey(host, logger) as key:
-                results = transport.check_host_availability(host, key.path)
-                host.last_check = now.isoformat()
-                if results[0] == 0:  # This means the host is available
-                    # Only flip the bit on failed only
-                    if host.status == 'failed':
-                        try:
-                            cluster_type = util.cluster_for_host(
-                                host.address, store_manager).type
-                        except Exception:
-                            logger.debug(
-                                '{0} has no cluster type. Assuming {1}'.format(
-                                    host.address, C.CLUSTER_TYPE_HOST))
-                            cluster_type = C.CLUSTER_TYPE_HOST
-                        # If the type is CLUSTER_TYPE_HOST then it should be
-                        if cluster_type == C.CLUSTER_TYPE_HOST:
-                            host.status = 'disassociated'
-                        else:
-                            host.status = 'active'
-                else:
-                    # If we can not access the host at all throw it to failed
-                    host.status = 'failed'
-                host.last_check = now.isoformat()
-                host = store_manager.save(host)
-                # Requeue the host
-                queue.put_nowait((host, now))
-                logger.debug('{0} has been requeued for next check run'.format(
-                    host.address))
+                results = transport.check_host_availability(
+                    host, key.path)
+            # This means the host is available
+            _set_status(host, results[0] == 0, None, store_manager, logger)
+            host.last_check = now.isoformat()
+            host = store_manager.save(host)
+            # Requeue the host
+            queue.put_nowait((host, now))
+            logger.debug('{0} has been requeued for next check run'.format(
+                host.address))
 
         if run_once:
             logger.info('Exiting watcher due to run_once request.')
             break
 
         logger.debug('Sleeping for {0} seconds.'.format(throttle))
-        time.sleep(throttle)
+        if stopped(throttle):
+            break
 
     logger.info('Watcher stopping')
@@ -16,6 +16,10 @@
 Middleware classes for commissaire.
 """
 
+import falcon
+
+from commissaire.handlers.util import content_etag, not_modified
+
 
 class JSONify:
     """
@@ -26,7 +30,9 @@ class JSONify:
 
     def process_response(self, req, resp, resource):
         """
-        Intercepts a response and attempts to turn it into JSON.
+        Intercepts a response and attempts to turn it into JSON. Successful
+        reads are tagged with a fingerprint of the body unless the resource
+        tagged them already.
 
         :param req: Request instance that will be passed through.
         :type req: falcon.Request
@@ -35,6 +41,10 @@ class JSONify:
         :param resource: The Resource which has been intercepted.
         :type resource: commissaire.resource.Resource
         """
+        # A resource answered If-None-Match from the store revision.
+        if resp.status == falcon.HTTP_304:
+            return
+
         if 'model' in req.context.keys() and resp.body is None:
             try:
                 resp.body = req.context['model'].to_json()
@@ -45,3 +55,7 @@ class JSONify:
         # Never send 'None'
         if resp.body is None:
             resp.body = '{}'
+
+        if (req.method in ('GET', 'HEAD') and
+                resp.status == falcon.HTTP_200 and resp.etag is None):
+            not_modified(req, resp, content_etag(resp.body))
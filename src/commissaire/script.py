@@ -25,6 +25,8 @@ import logging.config
 import os
 import sys
 
+from threading import Thread
+
 import falcon
 
 from commissaire import constants as C
@@ -43,6 +45,7 @@ from commissaire.handlers.status import StatusResource
 from commissaire.middleware import JSONify
 from commissaire.ssl_adapter import ClientCertBuiltinSSLAdapter
 from commissaire.store import ConfigurationError
+from commissaire.store.migration import StoreMigration
 
 
 def create_app(
@@ -180,6 +183,14 @@ def _read_config_file(path=None):
     if type(handler_list) is dict:
         json_object[handler_key] = [handler_list]
 
+    # Special case:
+    #
+    # In the configuration file, the "migrate_store" member is a
+    # JSON object, so serialize it as given on the command-line.
+    migrate_key = 'migrate_store'
+    if type(json_object.get(migrate_key)) is dict:
+        json_object[migrate_key] = json.dumps(json_object[migrate_key])
+
     return argparse.Namespace(**json_object)
 
 
@@ -236,6 +247,22 @@ def parse_args(parser):
         action='append', metavar='JSON_OBJECT',
         help='Store Handler configuration in JSON format, '
              'can be specified multiple times')
+    parser.add_argument(
+        '--migrate-store', type=str, default=None,
+        metavar='JSON_OBJECT',
+        help='Store Handler configuration in JSON format to migrate '
+             'its models to while the server is running')
+    parser.add_argument(
+        '--leader-lease-ttl', type=int, default=0,
+        metavar='SECONDS',
+        help='Elect a leader to run the watcher through a lease held for '
+             'this many seconds. By default every server runs the watcher')
+    parser.add_argument(
+        '--watcher-mode', type=str, default='ssh',
+        choices=('ssh', 'container-manager'),
+        help='How the watcher checks hosts. "container-manager" uses the '
+             'node conditions of container managers and only falls back '
+             'to SSH when they are unknown')
 
     # We have to parse the command-line arguments twice.  Once to extract
     # the --config-file option, and again with the config file content as
@@ -262,6 +289,92 @@ def register_store_handler(parser, store_manager, config):
     :param config: A configuration dictionary
     :type config: dict
     """
+    module_name, handler_type, model_types = _import_store_handler(
+        parser, config)
+
+    try:
+        store_manager.register_store_handler(
+            handler_type, config, *model_types)
+    except ConfigurationError as error:
+        parser.error(
+            'Configuration error for store handler "{0}": '
+            '{1}'.format(module_name, error.message))
+
+
+def register_store_handlers(parser, store_manager, configs):
+    """
+    Registers every configured store handler with a StoreHandlerManager,
+    falling back to the default store handlers if none are configured.
+
+    :param parser: An argument parser
+    :type parser: argparse.ArgumentParser
+    :param store_manager: A store manager
+    :type store_manager: commissaire.store.storehandlermanager.
+                         StoreHandlerManager
+    :param configs: JSON strings or configuration dictionaries
+    :type configs: list
+    """
+    if len(configs) == 0:
+        # Order is significant; Kubernetes must be first.
+        configs = [
+            C.DEFAULT_KUBERNETES_STORE_HANDLER,
+            C.DEFAULT_ETCD_STORE_HANDLER
+        ]
+    for config in configs:
+        if type(config) is str:
+            config = json.loads(config)
+        if type(config) is dict:
+            register_store_handler(parser, store_manager, config)
+        else:
+            parser.error(
+                'Store handler format must be a JSON object, got a '
+                '{} instead: {}'.format(type(config).__name__, config))
+
+
+def register_store_migration(parser, store_manager, config):
+    """
+    Starts a migration of models to a new store handler type. Writes are
+    dual-written from this point on. The caller is responsible for calling
+    run() on the returned migration.
+
+    :param parser: An argument parser
+    :type parser: argparse.ArgumentParser
+    :param store_manager: A store manager
+    :type store_manager: commissaire.store.storehandlermanager.
+                         StoreHandlerManager
+    :param config: A configuration dictionary
+    :type config: dict
+    :returns: The started migration
+    :rtype: commissaire.store.migration.StoreMigration
+    """
+    module_name, handler_type, model_types = _import_store_handler(
+        parser, config)
+
+    migration = StoreMigration(
+        store_manager, handler_type, config, model_types,
+        batch_size=config.pop('batch_size', 100))
+    try:
+        migration.start()
+    except ConfigurationError as error:
+        parser.error(
+            'Configuration error for store migration "{0}": '
+            '{1}'.format(module_name, error.message))
+    return migration
+
+
+def _import_store_handler(parser, config):
+    """
+    Extracts and imports the store handler class and model classes from a
+    store handler configuration dictionary. The "name" and "models" keys
+    are removed from the dictionary.
+
+    :param parser: An argument parser
+    :type parser: argparse.ArgumentParser
+    :param config: A configuration dictionary
+    :type config: dict
+    :returns: (module_name, handler_type, model_types)
+    :rtype: tuple
+    """
     # Import the handler class.
     try:
         module_name = config.pop('name')
@@ -287,13 +400,7 @@ def register_store_handler(parser, store_manager, config):
             parser.error('No match for model: {}'.format(pattern))
         model_types.update([available[name] for name in matches])
 
-    try:
-        store_manager.register_store_handler(
-            handler_type, config, *model_types)
-    except ConfigurationError as error:
-        parser.error(
-            'Configuration error for store handler "{0}": '
-            '{1}'.format(module_name, error.message))
+    return (module_name, handler_type, model_types)
 
 
 def main():  # pragma: no cover
@@ -302,6 +409,7 @@ def main():  # pragma: no cover
     """
     from commissaire.cherrypy_plugins.store import StorePlugin
     from commissaire.cherrypy_plugins.investigator import InvestigatorPlugin
+    from commissaire.cherrypy_plugins.leader import LeaderPlugin
     from commissaire.cherrypy_plugins.watcher import WatcherPlugin
 
     epilog = ('Example: ./commissaire -e http://127.0.0.1:2379'
@@ -383,25 +491,27 @@ def main():  # pragma: no cover
     #       comma-separated key-value pairs so we punted and switched to
     #       JSON format. The authentication CLI options need reworked to
     #       keep the input formats consistent.
-    if len(args.register_store_handler) == 0:
-        # Order is significant; Kubernetes must be first.
-        args.register_store_handler = [
-            C.DEFAULT_KUBERNETES_STORE_HANDLER,
-            C.DEFAULT_ETCD_STORE_HANDLER
-        ]
-    for config in args.register_store_handler:
-        if type(config) is str:
-            config = json.loads(config)
-        if type(config) is dict:
-            register_store_handler(parser, store_manager, config)
-        else:
-            parser.error(
-                'Store handler format must be a JSON object, got a '
-                '{} instead: {}'.format(type(config).__name__, config))
+    register_store_handlers(
+        parser, store_manager, args.register_store_handler)
+
+    # Dual-writing must begin before worker processes get the store manager.
+    migration = None
+    if args.migrate_store:
+        try:
+            config = json.loads(args.migrate_store)
+        except ValueError as error:
+            parser.error('Invalid store migration: {0}'.format(error))
+        migration = register_store_migration(parser, store_manager, config)
 
     # Add our plugins
     InvestigatorPlugin(cherrypy.engine).subscribe()
-    WatcherPlugin(cherrypy.engine, store_manager.clone()).subscribe()
+    WatcherPlugin(
+        cherrypy.engine, store_manager,
+        elected=bool(args.leader_lease_ttl),
+        mode=args.watcher_mode).subscribe()
+    if args.leader_lease_ttl:
+        LeaderPlugin(
+            cherrypy.engine, store_manager, args.leader_lease_ttl).subscribe()
 
     store_plugin.subscribe()
 
@@ -409,6 +519,18 @@ def main():  # pragma: no cover
     # the engine is started
     cherrypy.engine.start()
 
+    if migration is not None:
+        def run_migration():
+            try:
+                migration.run()
+            except Exception as error:
+                logging.error('Store migration failed: {0}: {1}'.format(
+                    type(error), error))
+
+        migration_thread = Thread(target=run_migration)
+        migration_thread.daemon = True
+        migration_thread.start()
+
     try:
         # Make and mount the app
         authentication_kwargs = {}
@@ -434,5 +556,93 @@ def main():  # pragma: no cover
         cherrypy.engine.stop()
 
 
+def store_main():  # pragma: no cover
+    """
+    Store export/import script entry point.
+    """
+    from commissaire.store.bulk import ModelImporter, export_models
+    from commissaire.store.storehandlermanager import StoreHandlerManager
+
+    parser = argparse.ArgumentParser(
+        description='Exports or imports all commissaire models as '
+                    'newline-delimited JSON.')
+    parser.add_argument(
+        '--config-file', '-c', type=str,
+        help='Full path to a JSON configuration file '
+             '(command-line arguments override)')
+    parser.add_argument(
+        '--no-config-file', action='store_true',
+        help='Disregard default configuration file, if it exists')
+    parser.add_argument(
+        '--register-store-handler', type=str, default=[],
+        action='append', metavar='JSON_OBJECT',
+        help='Store Handler configuration in JSON format, '
+             'can be specified multiple times')
+    subparsers = parser.add_subparsers(dest='command')
+    export_parser = subparsers.add_parser(
+        'export', help='Write every model to a file')
+    export_parser.add_argument(
+        '--output', '-o', type=str, default='-',
+        help='File to write to (default: standard output)')
+    import_parser = subparsers.add_parser(
+        'import', help='Save every model from a file')
+    import_parser.add_argument(
+        'input', type=str, help='File to read from')
+    import_parser.add_argument(
+        '--workers', type=int, default=4,
+        help='Maximum number of concurrent writes')
+    import_parser.add_argument(
+        '--batch-size', type=int, default=500,
+        help='Number of models imported between progress checkpoints')
+    import_parser.add_argument(
+        '--resume', action='store_true',
+        help='Continue an interrupted import of the same file')
+
+    args = parser.parse_args()
+    if not args.no_config_file:
+        try:
+            namespace = _read_config_file(args.config_file)
+        except Exception:
+            _, ex, _ = exception.raise_if_not(Exception)
+            parser.error(ex)
+        args = parser.parse_args(namespace=namespace)
+
+    logging.basicConfig(level=logging.INFO)
+
+    store_manager = StoreHandlerManager()
+    register_store_handlers(
+        parser, store_manager, args.register_store_handler)
+
+    if args.command == 'export':
+        # A failed export must not leave a partial file behind.
+        output = None
+        if args.output != '-':
+            output = args.output + '.partial'
+        try:
+            if output is None:
+                export_models(store_manager, sys.stdout)
+            else:
+                with open(output, 'w') as fp:
+                    export_models(store_manager, fp)
+                os.rename(output, args.output)
+        except Exception as error:
+            logging.fatal('Export failed: {0}: {1}'.format(
+                type(error).__name__, error))
+            if output is not None and os.path.exists(output):
+                os.remove(output)
+            sys.exit(1)
+    else:
+        importer = ModelImporter(
+            store_manager, workers=args.workers,
+            batch_size=args.batch_size,
+            progress_path=args.input + '.progress')
+        with open(args.input, 'r') as fp:
+            _, errors = importer.run(fp, resume=args.resume)
+        for line_number, error in errors:
+            logging.error('Line {0}: {1}'.format(line_number, error))
+        if errors:
+            sys.exit(1)
+
+
 if __name__ == '__main__':  # pragma: no cover
     main()
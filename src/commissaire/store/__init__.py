@@ -16,6 +16,9 @@
 Store implementations.
 """
 
+import hashlib
+import json
+
 
 class ConfigurationError(Exception):
     """
@@ -24,6 +27,37 @@ class ConfigurationError(Exception):
     pass
 
 
+def model_fingerprint(model_instance):
+    """
+    Returns a stable fingerprint of a model's full (secure) content.
+
+    :param model_instance: The model to fingerprint
+    :type model_instance: commissaire.model.Model
+    :returns: A hex digest
+    :rtype: str
+    """
+    return hashlib.sha1(json.dumps(
+        model_instance._struct_for_json(secure=True),
+        sort_keys=True)).hexdigest()
+
+
+def model_matches(model_instance, filters):
+    """
+    Returns whether a model's attributes match every filter.
+
+    :param model_instance: The model to check
+    :type model_instance: commissaire.model.Model
+    :param filters: Attribute name -> accepted values
+    :type filters: dict
+    :returns: True if the model matches
+    :rtype: bool
+    """
+    for name, values in filters.items():
+        if getattr(model_instance, name, None) not in values:
+            return False
+    return True
+
+
 class StoreHandlerBase:
     """
     Base class for all StoreHandler classes.
@@ -36,6 +70,10 @@ class StoreHandlerBase:
     # Subclasses override this, if applicable.
     container_manager_class = None
 
+    #: Exceptions raised when a model or list is not stored. Subclasses
+    #: add the errors of their client library.
+    NOT_FOUND_ERRORS = (KeyError,)
+
     @classmethod
     def check_config(cls, config):
         """
@@ -79,6 +117,42 @@ class StoreHandlerBase:
         """
         raise NotImplementedError('_save must be overriden.')
 
+    def _save_if_changed(self, model_instance):
+        """
+        Saves data to a store unless the store already holds the same
+        content. Handlers which can not tell so atomically always save.
+
+        :param model_instance: Model instance to save.
+        :type model_instance: commissaire.model.Model
+        :returns: The saved model instance and whether it was written.
+        :rtype: tuple
+        """
+        return (self._save(model_instance), True)
+
+    def _save_all(self, model_instances):
+        """
+        Saves several models and returns back the saved models. Handlers
+        which support transactions override this to save atomically.
+
+        :param model_instances: Model instances to save.
+        :type model_instances: list
+        :returns: The saved model instances.
+        :rtype: list
+        """
+        return [self._save(x) for x in model_instances]
+
+    def _save_all_if_changed(self, model_instances):
+        """
+        Saves several models unless the store already holds the same
+        content. Handlers which can not tell so atomically always save.
+
+        :param model_instances: Model instances to save.
+        :type model_instances: list
+        :returns: The saved model instances and how many were written.
+        :rtype: tuple
+        """
+        return (self._save_all(model_instances), len(model_instances))
+
     def _get(self, model_instance):
         """
         Returns data from a store and returns back a model.
@@ -99,6 +173,255 @@ class StoreHandlerBase:
         """
         raise NotImplementedError('_delete must be overriden.')
 
+    def _list_attributes(self, model_instance, attributes):
+        """
+        Lists models with at least the given attributes populated. Handlers
+        which store attributes apart override this to read less.
+
+        :param model_instance: Model instance to search for and list.
+        :type model_instance: commissaire.model.Model
+        :param attributes: Names of the attributes needed.
+        :type attributes: tuple
+        :returns: A list of models.
+        :rtype: list
+        """
+        return self._list(model_instance)
+
+    def _list_filtered(self, model_instance, filters, attributes=None):
+        """
+        Lists models whose attributes match every filter. Handlers which
+        can select models without reading all of them override this.
+
+        :param model_instance: List model instance to fill.
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values.
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models.
+        :type attributes: tuple or None
+        :returns: A list of models.
+        :rtype: list
+        """
+        if attributes is None:
+            model_instance = self._list(model_instance)
+        else:
+            model_instance = self._list_attributes(
+                model_instance, tuple(set(attributes) | set(filters)))
+        setattr(model_instance, model_instance._list_attr, [
+            x for x in getattr(model_instance, model_instance._list_attr)
+            if model_matches(x, filters)])
+        return model_instance
+
+    def _list_page(self, model_instance, filters, attributes=None,
+                   limit=None, cursor=None):
+        """
+        Lists the models matching every filter in primary key order,
+        starting after a cursor. Filters on the primary key read only the
+        selected models. Handlers which can read a range of models
+        override this so a page does not read every model.
+
+        :param model_instance: List model instance to fill.
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values.
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models.
+        :type attributes: tuple or None
+        :param limit: Most models to list, or None for every model.
+        :type limit: int or None
+        :param cursor: A cursor returned for the previous page, or None.
+        :type cursor: str or None
+        :returns: A (model_instance, cursor) pair where cursor continues
+                  after this page or is None on the last page.
+        :rtype: tuple
+        """
+        model_cls = model_instance._list_class
+        primary_key = model_cls._primary_key
+        if primary_key in filters:
+            models = []
+            for name in sorted(set(filters[primary_key])):
+                if cursor is not None and name <= cursor:
+                    continue
+                try:
+                    model = self._get(model_cls.new(**{primary_key: name}))
+                except self.NOT_FOUND_ERRORS:
+                    continue
+                if model_matches(model, filters):
+                    models.append(model)
+                    if limit is not None and len(models) > limit:
+                        break
+        else:
+            if filters:
+                model_instance = self._list_filtered(
+                    model_instance, filters, attributes)
+            elif attributes is None:
+                model_instance = self._list(model_instance)
+            else:
+                model_instance = self._list_attributes(
+                    model_instance, attributes)
+            models = sorted(
+                getattr(model_instance, model_instance._list_attr),
+                key=lambda x: getattr(x, primary_key))
+            if cursor is not None:
+                models = [
+                    x for x in models if getattr(x, primary_key) > cursor]
+
+        next_cursor = None
+        if limit is not None and len(models) > limit:
+            models = models[:limit]
+            next_cursor = getattr(models[-1], primary_key)
+        setattr(model_instance, model_instance._list_attr, models)
+        return (model_instance, next_cursor)
+
+    def _hostset_add(self, model_instance, address):
+        """
+        Adds a host address to a Cluster's hostset. Raises KeyError if the
+        cluster does not exist. Handlers which store each member under its
+        own key override this to avoid rewriting the whole hostset.
+
+        :param model_instance: Cluster instance to add to.
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to add.
+        :type address: str
+        """
+        cluster = self._get(model_instance)
+        if address not in cluster.hostset:
+            cluster.hostset.append(address)
+            self._save(cluster)
+
+    def _hostset_remove(self, model_instance, address):
+        """
+        Removes a host address from a Cluster's hostset. Raises KeyError if
+        the cluster does not exist.
+
+        :param model_instance: Cluster instance to remove from.
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to remove.
+        :type address: str
+        """
+        cluster = self._get(model_instance)
+        if address in cluster.hostset:
+            cluster.hostset.remove(address)
+            self._save(cluster)
+
+    def _hostset_contains(self, model_instance, address):
+        """
+        Checks if a host address is in a Cluster's hostset. Raises KeyError
+        if the cluster does not exist.
+
+        :param model_instance: Cluster instance to check.
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to look for.
+        :type address: str
+        :returns: True if the address is a member.
+        :rtype: bool
+        """
+        return address in self._get(model_instance).hostset
+
+    def _replace_hostset(self, model_instance):
+        """
+        Makes the stored hostset of a Cluster match the model's. Saving a
+        stored Cluster may leave its members alone, so tools which copy
+        whole models call this after saving. Other models are ignored.
+
+        :param model_instance: Model instance which was saved.
+        :type model_instance: commissaire.model.Model
+        """
+        if 'hostset' not in model_instance._attribute_map:
+            return
+        stored = set(self._get(model_instance).hostset)
+        wanted = set(model_instance.hostset)
+        for address in sorted(wanted - stored):
+            self._hostset_add(model_instance, address)
+        for address in sorted(stored - wanted):
+            self._hostset_remove(model_instance, address)
+
+    def _revision(self, model_instance):
+        """
+        Returns the current store revision for a model, or None if the
+        store has no revisions.
+
+        :param model_instance: Model instance.
+        :type model_instance: commissaire.model.Model
+        :returns: The store revision.
+        :rtype: int or str or None
+        """
+        return None
+
+    def _can_list_changes(self, model_instance):
+        """
+        Returns whether _list_changes returns only the models which
+        changed rather than every model.
+
+        :param model_instance: Model instance.
+        :type model_instance: commissaire.model.Model
+        :returns: True if changes are listed on their own.
+        :rtype: bool
+        """
+        return False
+
+    def _list_changes(self, model_instance, since):
+        """
+        Lists the models which were created, updated or deleted after a
+        store revision. Handlers which can not tell what changed return
+        every model with deleted set to None, meaning the listing replaces
+        whatever the caller had.
+
+        :param model_instance: List model instance to fill.
+        :type model_instance: commissaire.model.Model
+        :param since: Store revision, or None for every model.
+        :type since: int or str or None
+        :returns: A (revision, model_instance, deleted) tuple where deleted
+                  is a list of primary keys or None.
+        :rtype: tuple
+        """
+        revision = self._revision(model_instance)
+        return (revision, self._list(model_instance), None)
+
+    def _acquire_lease(self, name, holder, ttl):
+        """
+        Acquires or renews a named lease for a holder. The lease expires
+        ttl seconds after it was last acquired unless it is renewed.
+        Handlers which can not share a lease between processes always
+        grant it.
+
+        :param name: Name of the lease.
+        :type name: str
+        :param holder: Identity of the process asking for the lease.
+        :type holder: str
+        :param ttl: Seconds the lease is held for.
+        :type ttl: int
+        :returns: True if the holder now holds the lease.
+        :rtype: bool
+        """
+        return True
+
+    def _release_lease(self, name, holder):
+        """
+        Releases a named lease if it is held by the holder.
+
+        :param name: Name of the lease.
+        :type name: str
+        :param holder: Identity of the process releasing the lease.
+        :type holder: str
+        """
+        pass
+
+    def _iter_list(self, model_instance):
+        """
+        Yields the models of a list model one at a time. Handlers which can
+        decode a listing while it is read override this so a full listing
+        is never held in memory at once.
+
+        :param model_instance: List model instance to read.
+        :type model_instance: commissaire.model.Model
+        :returns: Generator of model instances.
+        :rtype: generator
+        """
+        for item in getattr(
+                self._list(model_instance), model_instance._list_attr):
+            yield item
+
     def _list(self, model_instance):
         """
         Lists data at a location in a store and returns back model instances.
@@ -0,0 +1,194 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Bulk export and import of stored models as newline-delimited JSON.
+
+Each line is a JSON object with a ``model`` member naming the model class
+and a ``data`` member holding the model's full (secure) attributes.
+"""
+
+import json
+import logging
+import os
+
+from multiprocessing.pool import ThreadPool
+
+from commissaire.handlers.models import (
+    Cluster, ClusterDeploy, ClusterRestart, ClusterUpgrade, Host, Network)
+from commissaire.store.migration import iter_stored_models
+
+#: Model types included in exports and accepted by imports.
+#: Clusters come before operation records which are keyed by cluster name.
+EXPORTED_MODELS = (
+    Host, Network, Cluster, ClusterDeploy, ClusterRestart, ClusterUpgrade)
+
+
+def export_models(store_manager, fp, model_types=EXPORTED_MODELS):
+    """
+    Streams every stored model to a file like object, one JSON document
+    per line.
+
+    :param store_manager: The store manager to read through
+    :type store_manager: commissaire.store.storehandlermanager.
+                         StoreHandlerManager
+    :param fp: File like object to write to
+    :type fp: file
+    :param model_types: Model types to export
+    :type model_types: tuple
+    :returns: The number of models exported
+    :rtype: int
+    :raises: Any error reading the store, the export is then incomplete
+    """
+    logger = logging.getLogger('store')
+    exported = 0
+    registered = [x for x in model_types if x in store_manager._registry]
+    for model in iter_stored_models(store_manager, registered):
+        fp.write(json.dumps({
+            'model': model.__class__.__name__,
+            'data': model._struct_for_json(secure=True),
+        }, sort_keys=True))
+        fp.write('\n')
+        exported += 1
+    logger.info('Exported {0} models'.format(exported))
+    return exported
+
+
+class ModelImporter(object):
+    """
+    Saves newline-delimited JSON models through a store manager with
+    bounded parallelism. Progress is checkpointed after every batch so an
+    interrupted import can be resumed. The checkpoint never passes the
+    first line which failed, resuming retries it and every line after.
+    """
+
+    def __init__(self, store_manager, workers=4, batch_size=500,
+                 progress_path=None, model_types=EXPORTED_MODELS):
+        """
+        Creates a new ModelImporter instance.
+
+        :param store_manager: The store manager to write through
+        :type store_manager: commissaire.store.storehandlermanager.
+                             StoreHandlerManager
+        :param workers: Maximum number of concurrent writes
+        :type workers: int
+        :param batch_size: Number of lines between checkpoints
+        :type batch_size: int
+        :param progress_path: File to checkpoint progress to, or None
+        :type progress_path: str or None
+        :param model_types: Model types which may be imported
+        :type model_types: tuple
+        """
+        self.store_manager = store_manager
+        self.workers = workers
+        self.batch_size = batch_size
+        self.progress_path = progress_path
+        self.model_classes = {x.__name__: x for x in model_types}
+        self.logger = logging.getLogger('store')
+
+    def _read_checkpoint(self):
+        """
+        Returns the number of lines already imported.
+
+        :returns: Number of lines to skip
+        :rtype: int
+        """
+        if self.progress_path and os.path.isfile(self.progress_path):
+            with open(self.progress_path, 'r') as progress:
+                return int(progress.read().strip() or 0)
+        return 0
+
+    def _write_checkpoint(self, lines):
+        """
+        Records the number of lines imported so far.
+
+        :param lines: Number of lines imported
+        :type lines: int
+        """
+        if self.progress_path:
+            with open(self.progress_path, 'w') as progress:
+                progress.write(str(lines))
+
+    def _import_line(self, line):
+        """
+        Saves the model from one line.
+
+        :param line: A JSON document
+        :type line: str
+        :returns: An error message or None on success
+        :rtype: str or None
+        """
+        try:
+            document = json.loads(line)
+            model_cls = self.model_classes[document['model']]
+            model = model_cls.new(**document['data'])
+            self.store_manager.save(model)
+            self.store_manager.replace_hostset(model)
+        except Exception as error:
+            return '{0}: {1}'.format(type(error).__name__, error)
+        return None
+
+    def run(self, fp, resume=False):
+        """
+        Imports every line from a file like object.
+
+        :param fp: File like object to read from
+        :type fp: file
+        :param resume: Skip lines recorded by a previous checkpoint
+        :type resume: bool
+        :returns: A (imported, errors) tuple where errors is a list of
+                  (line_number, message) pairs
+        :rtype: tuple
+        """
+        skip = self._read_checkpoint() if resume else 0
+        if skip:
+            self.logger.info('Resuming import after line {0}'.format(skip))
+
+        pool = ThreadPool(self.workers)
+        imported = 0
+        errors = []
+        line_number = 0
+        batch = []
+
+        def flush():
+            results = pool.map(self._import_line, [x[1] for x in batch])
+            for (number, _), error in zip(batch, results):
+                if error:
+                    errors.append((number, error))
+            if errors:
+                self._write_checkpoint(errors[0][0] - 1)
+            else:
+                self._write_checkpoint(batch[-1][0])
+            del batch[:]
+            return len(results)
+
+        try:
+            for line in fp:
+                line_number += 1
+                if line_number <= skip or not line.strip():
+                    continue
+                batch.append((line_number, line))
+                if len(batch) >= self.batch_size:
+                    imported += flush()
+                    self.logger.info('Imported {0} models'.format(imported))
+            if batch:
+                imported += flush()
+        finally:
+            pool.close()
+            pool.join()
+
+        imported -= len(errors)
+        self.logger.info('Imported {0} models with {1} errors'.format(
+            imported, len(errors)))
+        return (imported, errors)
@@ -0,0 +1,1072 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Etcd v3 based StoreHandler using the etcd JSON gateway.
+"""
+
+import json
+
+import requests
+
+from commissaire.compat.b64 import base64
+from commissaire.compat.urlparser import urlparse
+from commissaire.store import (
+    ConfigurationError, StoreHandlerBase, model_matches)
+from commissaire.store.etcdstorehandler import (
+    _etcd_lease_key, _etcd_mapper, _etcd_member_mapper,
+    _etcd_volatile_mapper)
+
+
+def _encode(data):
+    """
+    Encodes a key or value for the JSON gateway.
+
+    :param data: The key or value
+    :type data: str
+    :returns: The base64 encoded data
+    :rtype: str
+    """
+    return base64.b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def _decode(data):
+    """
+    Decodes a key or value from the JSON gateway.
+
+    :param data: The base64 encoded data
+    :type data: str
+    :returns: The key or value
+    :rtype: str
+    """
+    return base64.b64decode(data).decode('utf-8')
+
+
+def _prefix_range_end(prefix):
+    """
+    Returns the range end which selects every key starting with prefix.
+
+    :param prefix: The key prefix
+    :type prefix: str
+    :returns: The first key after all keys with the prefix
+    :rtype: str
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class Etcd3StoreHandler(StoreHandlerBase):
+    """
+    Handler for data storage on etcd using the v3 API.
+    """
+
+    DEFAULT_SERVER_URL = 'http://127.0.0.1:2379'
+    #: Path of the JSON gateway. etcd 3.2 uses /v3alpha and 3.3 /v3beta.
+    DEFAULT_API_PREFIX = '/v3'
+    #: Number of keys returned by each ranged read while listing
+    DEFAULT_PAGE_SIZE = 500
+    #: Keys read per transaction, below etcd's default --max-txn-ops
+    TXN_READ_SIZE = 128
+
+    @classmethod
+    def check_config(cls, config):
+        """
+        Examines the configuration parameters for an Etcd3StoreHandler
+        and throws a ConfigurationError if any parameters are invalid.
+        """
+        url = urlparse(config.get('server_url', cls.DEFAULT_SERVER_URL))
+        if (bool(config.get('certificate-path')) ^
+                bool(config.get('certificate-key-path'))):
+            raise ConfigurationError(
+                'Both "certificate_path" and "certificate_key_path" '
+                'must be provided to use a client side certificate')
+        if config.get('certificate-path'):
+            if url.scheme != 'https':
+                raise ConfigurationError(
+                    'Server URL scheme must be "https" when using client '
+                    'side certificates (got "{0}")'.format(url.scheme))
+
+        page_size = config.get('page-size', cls.DEFAULT_PAGE_SIZE)
+        if not isinstance(page_size, int) or page_size < 1:
+            raise ConfigurationError(
+                '"page-size" must be a positive integer')
+
+    def __init__(self, config):
+        """
+        Creates a new instance of Etcd3StoreHandler.
+
+        :param config: Configuration details
+        :type config: dict
+        """
+        self._store = requests.Session()
+        if config.get('certificate-path'):
+            self._store.cert = (
+                config['certificate-path'],
+                config['certificate-key-path'])
+        self._endpoint = config.get(
+            'server_url', self.DEFAULT_SERVER_URL).rstrip('/') + config.get(
+                'api-prefix', self.DEFAULT_API_PREFIX)
+        self._page_size = config.get('page-size', self.DEFAULT_PAGE_SIZE)
+        self._etcd_namespace = '/commissaire'
+        # Lease name -> ID of the etcd lease attached to the lease key
+        self._leases = {}
+
+    def _get_connection(self):
+        """
+        Returns the HTTP session used to reach the gateway.
+
+        :returns: The session
+        :rtype: requests.Session
+        """
+        return self._store
+
+    def _call(self, method, body):
+        """
+        Calls a JSON gateway method.
+
+        :param method: The method path, such as kv/range
+        :type method: str
+        :param body: The request body
+        :type body: dict
+        :returns: The decoded response
+        :rtype: dict
+        :raises: requests.exceptions.RequestException
+        """
+        response = self._store.post(
+            self._endpoint + '/' + method, data=json.dumps(body))
+        response.raise_for_status()
+        return response.json()
+
+    def _format_key(self, model_instance):
+        """
+        Takes a model instance and figures out its key.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :returns: The etcd key
+        :rtype: str
+        """
+        subkey = _etcd_mapper[model_instance.__class__.__name__]
+        if model_instance._primary_key:
+            subkey = subkey.format(
+                getattr(model_instance, model_instance._primary_key))
+        return self._etcd_namespace + subkey
+
+    def _format_volatile_key(self, model_instance):
+        """
+        Returns the key and attributes of a model's frequently changing
+        state if it is stored apart from the rest of the model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: A (key, attributes) pair or None
+        :rtype: tuple or None
+        """
+        entry = _etcd_volatile_mapper.get(model_instance.__class__.__name__)
+        if entry is None:
+            return None
+        subkey, attributes = entry
+        if model_instance._primary_key:
+            subkey = subkey.format(
+                getattr(model_instance, model_instance._primary_key))
+        return (self._etcd_namespace + subkey, attributes)
+
+    def _format_member_key(self, model_instance):
+        """
+        Returns the prefix and attribute of a model's member set if each
+        member is stored under its own key.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: A (prefix, attribute) pair or None
+        :rtype: tuple or None
+        """
+        entry = _etcd_member_mapper.get(model_instance.__class__.__name__)
+        if entry is None:
+            return None
+        subkey, attribute = entry
+        if model_instance._primary_key:
+            subkey = subkey.format(
+                getattr(model_instance, model_instance._primary_key))
+        return (self._etcd_namespace + subkey + '/', attribute)
+
+    def _format_lease_key(self, name):
+        """
+        Returns the key of a named lease.
+
+        :param name: Name of the lease
+        :type name: str
+        :returns: The etcd key
+        :rtype: str
+        """
+        return self._etcd_namespace + _etcd_lease_key.format(name)
+
+    def _request_puts(self, model_instance):
+        """
+        Returns the put requests which save a model instance. Member sets
+        are left out, see _request_member_ops.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :returns: A list of PutRequest bodies
+        :rtype: list
+        """
+        volatile = self._format_volatile_key(model_instance)
+        member = self._format_member_key(model_instance)
+        data = model_instance._struct_for_json(secure=True)
+        parts = [(self._format_key(model_instance), data)]
+        if volatile is not None:
+            volatile_key, attributes = volatile
+            parts.append(
+                (volatile_key, dict((x, data.pop(x)) for x in attributes)))
+        if member is not None:
+            data.pop(member[1])
+        # Sorted keys keep unchanged content byte for byte the same, so
+        # unchanged saves can be skipped, see _write_models.
+        parts = [(x, json.dumps(
+            y, sort_keys=True,
+            default=lambda o: o._struct_for_json(secure=True)))
+            for x, y in parts]
+        return [{'key': _encode(x), 'value': _encode(y)} for x, y in parts]
+
+    def _range(self, key, range_end=None, limit=0, revision=0, **kwargs):
+        """
+        Performs a ranged read.
+
+        :param key: The first key to read
+        :type key: str
+        :param range_end: The key after the last key to read, or None to
+                          read a single key
+        :type range_end: str or None
+        :param limit: Maximum number of keys to return, 0 is unlimited
+        :type limit: int
+        :param revision: The store revision to read at, 0 is latest
+        :type revision: int
+        :param kwargs: Other RangeRequest members such as keys_only
+        :type kwargs: dict
+        :returns: The decoded RangeResponse
+        :rtype: dict
+        """
+        return self._call('kv/range', self._request_range(
+            key, range_end, limit, revision, **kwargs))
+
+    def _request_range(self, key, range_end=None, limit=0, revision=0,
+                       **kwargs):
+        """
+        Returns a range request.
+
+        :param key: The first key to read
+        :type key: str
+        :param range_end: The key after the last key to read, or None to
+                          read a single key
+        :type range_end: str or None
+        :param limit: Maximum number of keys to return, 0 is unlimited
+        :type limit: int
+        :param revision: The store revision to read at, 0 is latest
+        :type revision: int
+        :param kwargs: Other RangeRequest members such as keys_only
+        :type kwargs: dict
+        :returns: A RangeRequest body
+        :rtype: dict
+        """
+        body = {'key': _encode(key)}
+        if range_end is not None:
+            body.update({
+                'range_end': _encode(range_end),
+                'sort_order': 'ASCEND',
+                'sort_target': 'KEY',
+            })
+        if limit:
+            body['limit'] = limit
+        if revision:
+            body['revision'] = revision
+        body.update(kwargs)
+        return body
+
+    def _request_member_ops(self, model_instance, stored):
+        """
+        Returns the comparisons and requests which write the member keys
+        of a model. Member keys are only written when the model is created
+        or when a record stored before members were split out is
+        converted. Members of other stored models are left alone, they
+        change through _hostset_add and _hostset_remove only. The
+        comparisons make the transaction fail if the record changed since
+        it was read.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :param stored: The stored KeyValue of the model or None
+        :type stored: dict or None
+        :returns: A (compares, ops) pair of Compare and RequestOp bodies
+        :rtype: tuple
+        """
+        prefix, attribute = self._format_member_key(model_instance)
+        key = _encode(self._format_key(model_instance))
+        if stored is None:
+            compare = {'key': key, 'target': 'CREATE', 'create_revision': 0}
+            members = getattr(model_instance, attribute) or []
+        else:
+            members = json.loads(_decode(stored['value'])).get(attribute)
+            if members is None:
+                return ([], [])
+            compare = {'key': key, 'target': 'MOD',
+                       'mod_revision': stored['mod_revision']}
+        compare['result'] = 'EQUAL'
+        return ([compare], [{'request_put': {
+            'key': _encode(prefix + x), 'value': _encode(x)}}
+            for x in sorted(set(members))])
+
+    def _read_keys(self, keys):
+        """
+        Reads several single keys in one transaction.
+
+        :param keys: The keys to read
+        :type keys: list
+        :returns: The KeyValue of each key, None for missing keys
+        :rtype: list
+        """
+        if not keys:
+            return []
+        if len(keys) == 1:
+            responses = [self._range(keys[0])]
+        else:
+            responses = [x.get('response_range', {}) for x in self._call(
+                'kv/txn', {'success': [
+                    {'request_range': self._request_range(x)}
+                    for x in keys]}).get('responses', [])]
+        return [(x.get('kvs') or [None])[0] for x in responses]
+
+    def _write_models(self, model_instances):
+        """
+        Writes several models in a single transaction. Models with member
+        sets are read first and the transaction is retried if any of them
+        changed in between. When no member set is written the transaction
+        compares every value first and writes nothing if all of them are
+        already stored.
+
+        :param model_instances: Model instances to save
+        :type model_instances: list
+        :returns: False if nothing was written as nothing changed
+        :rtype: bool
+        """
+        puts = []
+        for model_instance in model_instances:
+            puts.extend(self._request_puts(model_instance))
+        members = [x for x in model_instances
+                   if self._format_member_key(x) is not None]
+        while True:
+            compares = []
+            ops = [{'request_put': x} for x in puts]
+            stored = self._read_keys([self._format_key(x) for x in members])
+            for model_instance, kv in zip(members, stored):
+                compare, member_ops = self._request_member_ops(
+                    model_instance, kv)
+                compares.extend(compare)
+                ops.extend(member_ops)
+            if not compares:
+                result = self._call('kv/txn', {
+                    'compare': [
+                        {'key': x['key'], 'target': 'VALUE',
+                         'value': x['value']} for x in puts],
+                    'failure': ops})
+                return not result.get('succeeded')
+            result = self._call('kv/txn', {
+                'compare': compares, 'success': ops})
+            if result.get('succeeded'):
+                return True
+
+    def _save(self, model_instance):
+        """
+        Saves data to etcd and returns back a saved model.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :returns: The saved model instance
+        :rtype: commissaire.model.Model
+        """
+        return self._save_if_changed(model_instance)[0]
+
+    def _save_if_changed(self, model_instance):
+        """
+        Saves data to etcd unless etcd already holds the same content.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :returns: The saved model instance and whether it was written
+        :rtype: tuple
+        """
+        return (model_instance, self._write_models([model_instance]))
+
+    def _save_all(self, model_instances):
+        """
+        Saves several models in a single transaction.
+
+        :param model_instances: Model instances to save
+        :type model_instances: list
+        :returns: The saved model instances
+        :rtype: list
+        """
+        return self._save_all_if_changed(model_instances)[0]
+
+    def _save_all_if_changed(self, model_instances):
+        """
+        Saves several models in a single transaction unless etcd already
+        holds the same content for all of them.
+
+        :param model_instances: Model instances to save
+        :type model_instances: list
+        :returns: The saved model instances and how many were written
+        :rtype: tuple
+        """
+        model_instances = list(model_instances)
+        if model_instances and self._write_models(model_instances):
+            return (model_instances, len(model_instances))
+        return (model_instances, 0)
+
+    def _get(self, model_instance):
+        """
+        Returns data from a store and returns back a model. Separately
+        stored parts are read in the same transaction.
+
+        :param model_instance: Model instance to search and return
+        :type model_instance: commissaire.model.Model
+        :returns: The model instance
+        :rtype: commissaire.model.Model
+        :raises: KeyError
+        """
+        keys = [self._format_key(model_instance)]
+        ranges = [self._request_range(keys[0])]
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is not None:
+            keys.append(volatile[0])
+            ranges.append(self._request_range(volatile[0]))
+        member = self._format_member_key(model_instance)
+        if member is not None:
+            ranges.append(self._request_range(
+                member[0], _prefix_range_end(member[0])))
+        if len(ranges) == 1:
+            responses = [self._call('kv/range', ranges[0])]
+        else:
+            responses = [x.get('response_range', {}) for x in self._call(
+                'kv/txn', {'success': [
+                    {'request_range': x} for x in ranges]}).get(
+                        'responses', [])]
+
+        data = {}
+        for key, response in zip(keys, responses):
+            kvs = response.get('kvs', [])
+            if not kvs:
+                if key == keys[0]:
+                    raise KeyError('No data for {0}'.format(key))
+                # Stored before volatile state was split out.
+                continue
+            data.update(json.loads(_decode(kvs[0]['value'])))
+        if member is not None:
+            kvs = responses[-1].get('kvs', [])
+            # Records stored before members were split out keep theirs.
+            if kvs:
+                data[member[1]] = sorted(
+                    _decode(x['key'])[len(member[0]):] for x in kvs)
+            data.setdefault(member[1], [])
+        return model_instance.__class__(**data)
+
+    def _delete(self, model_instance):
+        """
+        Deletes data from a store.
+
+        :param model_instance: Model instance to delete
+        :type model_instance: commissaire.model.Model
+        """
+        keys = [self._format_key(model_instance)]
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is not None:
+            keys.append(volatile[0])
+        deletes = [{'key': _encode(x)} for x in keys]
+        member = self._format_member_key(model_instance)
+        if member is not None:
+            deletes.append({
+                'key': _encode(member[0]),
+                'range_end': _encode(_prefix_range_end(member[0]))})
+        if len(deletes) == 1:
+            self._call('kv/deleterange', deletes[0])
+        else:
+            self._call('kv/txn', {'success': [
+                {'request_delete_range': x} for x in deletes]})
+
+    def _member_txn(self, model_instance, address, op):
+        """
+        Runs a request on a single member key if the model exists. The
+        model itself is read in the same transaction.
+
+        :param model_instance: Model instance which owns the member set
+        :type model_instance: commissaire.model.Model
+        :param address: The member
+        :type address: str
+        :param op: Returns the RequestOp body for a member key
+        :type op: callable
+        :returns: A (response, legacy) pair where response is the
+                  ResponseOp of the member request and legacy is the member
+                  set still stored inside the model, if any
+        :rtype: tuple
+        :raises: KeyError
+        """
+        key = self._format_key(model_instance)
+        prefix, attribute = self._format_member_key(model_instance)
+        result = self._call('kv/txn', {
+            'compare': [{
+                'key': _encode(key),
+                'target': 'CREATE',
+                'result': 'GREATER',
+                'create_revision': 0,
+            }],
+            'success': [
+                op(prefix + address),
+                {'request_range': self._request_range(key)},
+            ],
+        })
+        if not result.get('succeeded'):
+            raise KeyError('No data for {0}'.format(key))
+        responses = result.get('responses', [])
+        data = json.loads(_decode(
+            responses[1]['response_range']['kvs'][0]['value']))
+        return (responses[0], data.get(attribute))
+
+    def _convert_members(self, model_instance):
+        """
+        Moves the member set of a record stored before members were split
+        out to their own keys.
+
+        :param model_instance: Model instance which owns the member set
+        :type model_instance: commissaire.model.Model
+        """
+        self._save(self._get(model_instance))
+
+    def _hostset_add(self, model_instance, address):
+        """
+        Adds a host address to a Cluster's hostset by writing one key.
+
+        :param model_instance: Cluster instance to add to
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to add
+        :type address: str
+        """
+        _, legacy = self._member_txn(
+            model_instance, address, lambda x: {'request_put': {
+                'key': _encode(x), 'value': _encode(address)}})
+        if legacy is not None:
+            # The stored members are added next to the new one.
+            self._convert_members(model_instance)
+
+    def _hostset_remove(self, model_instance, address):
+        """
+        Removes a host address from a Cluster's hostset by deleting one key.
+
+        :param model_instance: Cluster instance to remove from
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to remove
+        :type address: str
+        """
+        def op(key):
+            return {'request_delete_range': {'key': _encode(key)}}
+
+        _, legacy = self._member_txn(model_instance, address, op)
+        if legacy is not None:
+            # Converting writes the stored members, this one included.
+            self._convert_members(model_instance)
+            self._member_txn(model_instance, address, op)
+
+    def _hostset_contains(self, model_instance, address):
+        """
+        Checks if a host address is in a Cluster's hostset by reading one
+        key.
+
+        :param model_instance: Cluster instance to check
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to look for
+        :type address: str
+        :returns: True if the address is a member
+        :rtype: bool
+        """
+        response, legacy = self._member_txn(
+            model_instance, address, lambda x: {
+                'request_range': self._request_range(x)})
+        if response.get('response_range', {}).get('kvs'):
+            return True
+        return legacy is not None and address in legacy
+
+    def _range_prefix(self, prefix, revision=0, **kwargs):
+        """
+        Reads every key below a prefix, one page at a time. Every page
+        is read at the same revision so the result is a consistent
+        snapshot.
+
+        :param prefix: The key prefix
+        :type prefix: str
+        :param revision: The store revision to read at, 0 is latest
+        :type revision: int
+        :param kwargs: Other RangeRequest members such as keys_only
+        :type kwargs: dict
+        :returns: A (items, revision) pair where items is a list of
+                  (key, value) pairs
+        :rtype: tuple
+        """
+        range_end = _prefix_range_end(prefix)
+        key = prefix
+        items = []
+        while True:
+            response = self._range(
+                key, range_end, limit=self._page_size, revision=revision,
+                **kwargs)
+            kvs = response.get('kvs', [])
+            for kv in kvs:
+                items.append(
+                    (_decode(kv['key']), _decode(kv.get('value', ''))))
+            if not revision and 'header' in response:
+                revision = int(response['header']['revision'])
+            if not response.get('more') or not kvs:
+                return (items, revision)
+            key = items[-1][0] + '\0'
+
+    def _list_volatile(self, model_instance, revision=0):
+        """
+        Returns the separately stored state of every listed model.
+
+        :param model_instance: List model instance
+        :type model_instance: commissaire.model.Model
+        :param revision: The store revision to read at, 0 is latest
+        :type revision: int
+        :returns: Primary key -> state
+        :rtype: dict
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None:
+            return {}
+        items, _ = self._range_prefix(volatile[0].rstrip('/') + '/', revision)
+        states = {}
+        for key, value in items:
+            states[key.rsplit('/', 1)[-1]] = json.loads(value)
+        return states
+
+    def _list_members(self, model_instance, revision=0):
+        """
+        Returns the member sets of every listed model.
+
+        :param model_instance: List model instance
+        :type model_instance: commissaire.model.Model
+        :param revision: The store revision to read at, 0 is latest
+        :type revision: int
+        :returns: Primary key -> members, only for models with members
+        :rtype: dict
+        """
+        prefix = self._format_member_key(model_instance)[0]
+        items, _ = self._range_prefix(prefix, revision)
+        members = {}
+        for key, _ in items:
+            primary_key, member = key[len(prefix):].split('/', 1)
+            members.setdefault(primary_key, []).append(member)
+        return members
+
+    def _list(self, model_instance):
+        """
+        Lists data at a location in a store and returns back model instances.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :returns: A list of models
+        :rtype: list
+        """
+        return self._list_at(model_instance)[1]
+
+    def _list_at(self, model_instance):
+        """
+        Lists data at a location in a store along with the store revision
+        every part of the listing was read at.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :returns: A (revision, model_instance) pair
+        :rtype: tuple
+        """
+        prefix = self._format_key(model_instance).rstrip('/') + '/'
+        # The default class used is the same as the model_instance
+        model_cls = model_instance.__class__
+        # If this is a list then snag the configured class for use
+        if model_instance._json_type is list:
+            model_cls = model_instance._list_class
+
+        items, revision = self._range_prefix(prefix)
+        states = self._list_volatile(model_instance, revision)
+        member = self._format_member_key(model_instance)
+        members = {}
+        if member is not None:
+            members = self._list_members(model_instance, revision)
+        results = []
+        for key, value in items:
+            primary_key = key.rsplit('/', 1)[-1]
+            data = json.loads(value)
+            data.update(states.get(primary_key, {}))
+            if member is not None:
+                if primary_key in members:
+                    data[member[1]] = sorted(members[primary_key])
+                data.setdefault(member[1], [])
+            results.append(model_cls(**data))
+
+        # If this is a list then fill the list container with the results
+        # and return the model
+        if model_instance._json_type is list:
+            setattr(
+                model_instance,
+                model_instance._list_attr,
+                results)
+        return (revision, model_instance)
+
+    def _revision(self, model_instance):
+        """
+        Returns the current store revision.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The store revision
+        :rtype: int
+        """
+        prefix = self._etcd_namespace + '/'
+        response = self._range(
+            prefix, _prefix_range_end(prefix), count_only=True)
+        return int(response['header']['revision'])
+
+    def _can_list_changes(self, model_instance):
+        """
+        Returns whether changes are listed on their own. etcd keeps the
+        modification revision of every key, so list models can.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: True for list models
+        :rtype: bool
+        """
+        return model_instance._json_type is list
+
+    def _list_changes(self, model_instance, since):
+        """
+        Lists the models which were created, updated or deleted after a
+        store revision. Keys changed since the revision are found with a
+        modification revision filter and deletions by comparing the keys
+        stored at the revision with the keys stored now. Once the revision
+        has been compacted every model is listed, at the revision returned.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param since: The store revision, or None for every model
+        :type since: int or None
+        :returns: A (revision, model_instance, deleted) tuple
+        :rtype: tuple
+        """
+        if model_instance._json_type is not list:
+            return StoreHandlerBase._list_changes(self, model_instance, since)
+        if since is None:
+            revision, model_instance = self._list_at(model_instance)
+            return (revision, model_instance, None)
+
+        def primary_keys(prefix, items):
+            return set(x[len(prefix):].split('/', 1)[0] for x, _ in items)
+
+        prefix = self._format_key(model_instance).rstrip('/') + '/'
+        items, revision = self._range_prefix(prefix, keys_only=True)
+        current = primary_keys(prefix, items)
+        try:
+            items, _ = self._range_prefix(
+                prefix, revision=int(since), keys_only=True)
+        except requests.exceptions.HTTPError:
+            # The revision is compacted or in the future.
+            return self._list_changes(model_instance, None)
+        deleted = primary_keys(prefix, items) - current
+
+        prefixes = [prefix]
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is not None:
+            prefixes.append(volatile[0].rstrip('/') + '/')
+        member = self._format_member_key(model_instance)
+        if member is not None:
+            prefixes.append(member[0])
+        changed = set()
+        for changed_prefix in prefixes:
+            items, _ = self._range_prefix(
+                changed_prefix, revision=revision, keys_only=True,
+                min_mod_revision=int(since) + 1)
+            changed.update(primary_keys(changed_prefix, items))
+
+        model_cls = model_instance._list_class
+        results = []
+        for primary_key in sorted(changed & current):
+            try:
+                results.append(self._get(
+                    model_cls.new(**{model_cls._primary_key: primary_key})))
+            except KeyError:
+                deleted.add(primary_key)
+        setattr(model_instance, model_instance._list_attr, results)
+        return (revision, model_instance, sorted(deleted))
+
+    def _list_attributes(self, model_instance, attributes):
+        """
+        Lists models with at least the given attributes populated. When
+        only separately stored state is requested the rest of each model,
+        including credentials, is not read.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :param attributes: Names of the attributes needed
+        :type attributes: tuple
+        :returns: A list of models
+        :rtype: list
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None or model_instance._json_type is not list:
+            return self._list(model_instance)
+        return self._list_page(model_instance, {}, attributes)[0]
+
+    def _list_filtered(self, model_instance, filters, attributes=None):
+        """
+        Lists models whose attributes match every filter.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models
+        :type attributes: tuple or None
+        :returns: A list of models
+        :rtype: list
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None or model_instance._json_type is not list:
+            return StoreHandlerBase._list_filtered(
+                self, model_instance, filters, attributes)
+        return self._list_page(model_instance, filters, attributes)[0]
+
+    def _iter_split(self, prefix, state_prefix, cursor, keys_only):
+        """
+        Yields the models stored below a prefix after a cursor in key
+        order, a page at a time at one revision. The separately stored
+        state of each page is read with one ranged read.
+
+        :param prefix: The key prefix of the models
+        :type prefix: str
+        :param state_prefix: The key prefix of their state
+        :type state_prefix: str
+        :param cursor: Primary key to start after, or None
+        :type cursor: str or None
+        :param keys_only: Whether to skip reading the models themselves
+        :type keys_only: bool
+        :returns: Generator of (primary key, value, state) tuples where
+                  value is None when keys_only is set and state is None
+                  for models without separate state
+        :rtype: generator
+        """
+        range_end = _prefix_range_end(prefix)
+        key = prefix
+        if cursor is not None:
+            key = prefix + cursor + '\0'
+        revision = 0
+        while True:
+            response = self._range(
+                key, range_end, limit=self._page_size, revision=revision,
+                keys_only=keys_only)
+            if not revision and 'header' in response:
+                revision = int(response['header']['revision'])
+            kvs = response.get('kvs', [])
+            if not kvs:
+                return
+            names = [_decode(x['key'])[len(prefix):] for x in kvs]
+            states = dict(
+                (_decode(x['key'])[len(state_prefix):],
+                 json.loads(_decode(x['value'])))
+                for x in self._range(
+                    state_prefix + names[0], state_prefix + names[-1] + '\0',
+                    revision=revision).get('kvs', []))
+            for name, kv in zip(names, kvs):
+                value = None
+                if not keys_only:
+                    value = _decode(kv['value'])
+                yield (name, value, states.get(name))
+            if not response.get('more'):
+                return
+            key = prefix + names[-1] + '\0'
+
+    def _iter_selected(self, prefix, state_prefix, names):
+        """
+        Yields the stored models among the given primary keys, reading
+        them and their separately stored state in transactions.
+
+        :param prefix: The key prefix of the models
+        :type prefix: str
+        :param state_prefix: The key prefix of their state
+        :type state_prefix: str
+        :param names: Sorted primary keys
+        :type names: list
+        :returns: Generator of (primary key, value, state) tuples where
+                  state is None for models without separate state
+        :rtype: generator
+        """
+        size = self.TXN_READ_SIZE // 2
+        for start in range(0, len(names), size):
+            chunk = names[start:start + size]
+            kvs = self._read_keys(
+                [prefix + x for x in chunk] +
+                [state_prefix + x for x in chunk])
+            for name, kv, state in zip(chunk, kvs, kvs[len(chunk):]):
+                if kv is None:
+                    continue
+                if state is not None:
+                    state = json.loads(_decode(state['value']))
+                yield (name, _decode(kv['value']), state)
+
+    def _list_page(self, model_instance, filters, attributes=None,
+                   limit=None, cursor=None):
+        """
+        Lists the models matching every filter in primary key order,
+        starting after a cursor. Models are read a page of keys at a time
+        until enough of them matched, or only the selected ones for
+        filters on the primary key. When only separately stored state is
+        needed the rest of a model is only read if it was stored before
+        state was split out.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models
+        :type attributes: tuple or None
+        :param limit: Most models to list, or None for every model
+        :type limit: int or None
+        :param cursor: A cursor returned for the previous page, or None
+        :type cursor: str or None
+        :returns: A (model_instance, cursor) pair where cursor continues
+                  after this page or is None on the last page
+        :rtype: tuple
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None or model_instance._json_type is not list:
+            return StoreHandlerBase._list_page(
+                self, model_instance, filters, attributes, limit, cursor)
+        model_cls = model_instance._list_class
+        primary_key = model_cls._primary_key
+        partial = attributes is not None and (
+            set(attributes) | set(filters) <=
+            set(volatile[1]) | set([primary_key]))
+        prefix = self._format_key(model_instance).rstrip('/') + '/'
+        state_prefix = volatile[0].rstrip('/') + '/'
+        if primary_key in filters:
+            items = self._iter_selected(prefix, state_prefix, sorted(
+                x for x in set(filters[primary_key])
+                if cursor is None or x > cursor))
+        else:
+            items = self._iter_split(prefix, state_prefix, cursor, partial)
+
+        results = []
+        next_cursor = None
+        for name, value, state in items:
+            if value is None and state is None:
+                # Stored before state was split out.
+                kv = self._read_keys([prefix + name])[0]
+                if kv is None:
+                    continue
+                value = _decode(kv['value'])
+            if value is None:
+                state[primary_key] = name
+                model = model_cls.new(**state)
+            else:
+                data = json.loads(value)
+                data.update(state or {})
+                model = model_cls(**data)
+            if not model_matches(model, filters):
+                continue
+            if limit is not None and len(results) == limit:
+                next_cursor = getattr(results[-1], primary_key)
+                break
+            results.append(model)
+        setattr(model_instance, model_instance._list_attr, results)
+        return (model_instance, next_cursor)
+
+    def _acquire_lease(self, name, holder, ttl):
+        """
+        Acquires or renews a lease stored as a key attached to an etcd
+        lease. The holder keeps renewing the same etcd lease and only
+        grants a new one when taking the key or once its lease expired.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process asking for the lease
+        :type holder: str
+        :param ttl: Seconds the lease is held for
+        :type ttl: int
+        :returns: True if the holder now holds the lease
+        :rtype: bool
+        """
+        key = self._format_lease_key(name)
+        stored = self._read_keys([key])[0]
+        if stored is not None and _decode(stored['value']) != holder:
+            return False
+        lease = self._leases.pop(name, None)
+        if stored is not None and lease is not None and (
+                str(stored.get('lease')) == str(lease)):
+            result = self._call('lease/keepalive', {'ID': lease})
+            if int(result.get('result', {}).get('TTL', 0)) > 0:
+                self._leases[name] = lease
+                return True
+
+        lease = self._call('lease/grant', {'TTL': ttl})['ID']
+        compare = {'key': _encode(key), 'result': 'EQUAL'}
+        if stored is None:
+            compare.update({'target': 'CREATE', 'create_revision': 0})
+        else:
+            compare.update({
+                'target': 'MOD', 'mod_revision': stored['mod_revision']})
+        result = self._call('kv/txn', {
+            'compare': [compare],
+            'success': [{'request_put': {
+                'key': _encode(key), 'value': _encode(holder),
+                'lease': lease}}],
+        })
+        if result.get('succeeded'):
+            self._leases[name] = lease
+            return True
+        self._call('lease/revoke', {'ID': lease})
+        return False
+
+    def _release_lease(self, name, holder):
+        """
+        Releases a lease if it is held by the holder.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process releasing the lease
+        :type holder: str
+        """
+        key = _encode(self._format_lease_key(name))
+        self._call('kv/txn', {
+            'compare': [{
+                'key': key,
+                'target': 'VALUE',
+                'result': 'EQUAL',
+                'value': _encode(holder),
+            }],
+            'success': [{'request_delete_range': {'key': key}}],
+        })
+        lease = self._leases.pop(name, None)
+        if lease is not None:
+            self._call('lease/revoke', {'ID': lease})
+
+
+StoreHandler = Etcd3StoreHandler
@@ -16,12 +16,21 @@
 Etcd based StoreHandler.
 """
 
+import bisect
+import codecs
+import collections
+import itertools
 import json
+import logging
+import re
+import threading
+import time
 
 import etcd
 
 from commissaire.compat.urlparser import urlparse
-from commissaire.store import ConfigurationError, StoreHandlerBase
+from commissaire.store import (
+    ConfigurationError, StoreHandlerBase, model_matches)
 
 #: Maps ModelClassName to a key pattern
 _etcd_mapper = {
@@ -37,6 +46,392 @@ _etcd_mapper = {
     'Status': '/status',
 }
 
+#: Maps ModelClassName to the key pattern and attributes of frequently
+#: changing state which is stored apart from the rest of the model
+_etcd_volatile_mapper = {
+    'Host': ('/host-status/{0}', ('status', 'last_check')),
+    'Hosts': ('/host-status', ('status', 'last_check')),
+}
+
+#: Maps ModelClassName to the directory and attribute of a member set
+#: which is stored as one key per member
+_etcd_member_mapper = {
+    'Cluster': ('/cluster-hosts/{0}', 'hostset'),
+    'Clusters': ('/cluster-hosts', 'hostset'),
+}
+
+#: Key pattern of a named lease. Leases live beside the namespace so
+#: renewing them does not wake watches on it.
+_etcd_lease_key = '-leases/{0}'
+
+#: Reads are served through the raft leader and always see the latest write
+READ_LINEARIZABLE = 'linearizable'
+#: Reads may be served by any member and may briefly lag behind the leader
+READ_SERIALIZABLE = 'serializable'
+
+#: Maps ModelClassName to its default read consistency.
+#: Models which are not listed use READ_LINEARIZABLE.
+_read_consistency_mapper = {
+    'Host': READ_SERIALIZABLE,
+    'Hosts': READ_SERIALIZABLE,
+    'Status': READ_SERIALIZABLE,
+}
+
+
+#: Actions in watch events which remove a key
+_removal_actions = ('delete', 'expire', 'compareAndDelete')
+
+#: Start of the children of the directory in a read response
+_nodes_marker = re.compile(r'"nodes"\s*:\s*\[')
+#: Separators between the children of a directory in a read response
+_separators = re.compile(r'[\s,]*')
+
+
+def _iter_leaves(node):
+    """
+    Yields the leaves below a decoded etcd node. Empty directories count as
+    leaves without a value, as they do for etcd.EtcdResult.leaves.
+
+    :param node: A decoded etcd node
+    :type node: dict
+    :returns: Generator of (key, value) pairs
+    :rtype: generator
+    """
+    children = node.get('nodes')
+    if not children:
+        yield (node['key'], node.get('value'))
+        return
+    for child in children:
+        for leaf in _iter_leaves(child):
+            yield leaf
+
+
+def _iter_read(chunks):
+    """
+    Yields the leaves of a recursive directory read while the response is
+    still arriving. Each child of the directory is decoded as soon as it is
+    complete, so only the current chunk and child are held in memory.
+
+    :param chunks: The response body as an iterable of byte strings
+    :type chunks: iterable
+    :returns: Generator of (key, value) pairs
+    :rtype: generator
+    :raises: etcd.EtcdException
+    """
+    chunks = iter(chunks)
+    text = codecs.getincrementaldecoder('utf-8')()
+    decoder = json.JSONDecoder()
+    buf = ''
+    marker = _nodes_marker.search(buf)
+    while marker is None:
+        chunk = next(chunks, None)
+        if chunk is None:
+            # A directory without children
+            return
+        # Keep enough of the old buffer to find a marker split in two
+        buf = buf[-32:] + text.decode(chunk)
+        marker = _nodes_marker.search(buf)
+    pos = marker.end()
+    while True:
+        pos = _separators.match(buf, pos).end()
+        if buf.startswith(']', pos):
+            return
+        try:
+            node, pos = decoder.raw_decode(buf, pos)
+        except ValueError:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise etcd.EtcdException(
+                    'Server response ended in the middle of a node')
+            buf = buf[pos:] + text.decode(chunk)
+            pos = 0
+            continue
+        for leaf in _iter_leaves(node):
+            yield leaf
+
+
+class EtcdMirror(object):
+    """
+    In memory copy of an etcd tree which is kept current by following an
+    etcd watch. The tree is loaded with one recursive read and the watch
+    resumes from the index of that read. When the watch falls too far
+    behind, or etcd no longer has the events it needs, the tree is
+    reloaded.
+    """
+
+    #: Seconds to wait before retrying a failed watch or load
+    retry_delay = 1
+    #: Number of etcd indexes removed keys are remembered for
+    removals_kept = 10000
+
+    def __init__(self, client, namespace, max_lag=1000):
+        """
+        Creates a new EtcdMirror instance.
+
+        :param client: The etcd client to load and watch with
+        :type client: etcd.Client
+        :param namespace: The etcd directory to mirror
+        :type namespace: str
+        :param max_lag: Number of etcd indexes the watch may trail the
+                        cluster by before a full resync
+        :type max_lag: int
+        """
+        self._client = client
+        self._namespace = namespace
+        self.max_lag = max_lag
+        # Key -> (value, modifiedIndex). Removed keys have a None value.
+        self._nodes = {}
+        # Every key in _nodes, sorted, so a directory is a slice of it
+        self._keys = []
+        # (modifiedIndex, key) of removed keys, oldest first
+        self._removals = collections.deque()
+        self._dirs = set()
+        self._index = None
+        # Removals before this index are not known. It is the index of
+        # the last load until old removals are forgotten.
+        self._loaded_index = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.logger = logging.getLogger('store')
+
+    def _add_dirs(self, key):
+        """
+        Records every parent directory of a key.
+
+        :param key: An etcd key
+        :type key: str
+        """
+        parent = key.rsplit('/', 1)[0]
+        while parent and parent not in self._dirs:
+            self._dirs.add(parent)
+            parent = parent.rsplit('/', 1)[0]
+
+    def _slice(self, prefix):
+        """
+        Returns the range of _keys starting with a prefix.
+
+        :param prefix: A key prefix
+        :type prefix: str
+        :returns: A (start, end) pair of _keys indexes
+        :rtype: tuple
+        """
+        start = bisect.bisect_left(self._keys, prefix)
+        end = start
+        while end < len(self._keys) and self._keys[end].startswith(prefix):
+            end += 1
+        return (start, end)
+
+    def _set(self, key, value, index):
+        """
+        Records the value of a key, or its removal when value is None.
+
+        :param key: An etcd key
+        :type key: str
+        :param value: The value, or None if the key was removed
+        :type value: str or None
+        :param index: The modifiedIndex of the change
+        :type index: int
+        """
+        if key not in self._nodes:
+            bisect.insort(self._keys, key)
+        self._nodes[key] = (value, index)
+        if value is None:
+            self._removals.append((index, key))
+
+    def _forget_removals(self, index):
+        """
+        Forgets keys removed at or before an index, after which removals
+        before it are no longer known.
+
+        :param index: The etcd index
+        :type index: int
+        """
+        while self._removals and self._removals[0][0] <= index:
+            removed_index, key = self._removals.popleft()
+            if self._nodes.get(key) == (None, removed_index):
+                del self._nodes[key]
+                del self._keys[bisect.bisect_left(self._keys, key)]
+        if self._loaded_index is not None and index > self._loaded_index:
+            self._loaded_index = index
+
+    def load(self):
+        """
+        Replaces the mirrored tree with one recursive read of the
+        namespace.
+        """
+        nodes = {}
+        dirs = set()
+        try:
+            result = self._client.read(
+                self._namespace, recursive=True, quorum=True)
+            index = result.etcd_index
+            for node in result.get_subtree():
+                if node.dir:
+                    dirs.add(node.key)
+                else:
+                    nodes[node.key] = (node.value, node.modifiedIndex)
+        except etcd.EtcdKeyNotFound as error:
+            # Nothing stored yet. Watch from the index of the failed read.
+            index = (error.payload or {}).get('index', 0)
+        with self._lock:
+            self._nodes = nodes
+            self._keys = sorted(nodes)
+            self._removals = collections.deque()
+            self._dirs = dirs
+            for key in nodes.keys():
+                self._add_dirs(key)
+            self._index = index
+            self._loaded_index = index
+        self.logger.info('Loaded {0} keys from {1} at index {2}'.format(
+            len(nodes), self._namespace, index))
+
+    def apply(self, result):
+        """
+        Applies a single etcd watch event or write result to the mirror.
+        Events older than the mirrored copy of a key are ignored. Removed
+        keys are kept as tombstones so late events can not revive them,
+        and events from before the oldest tombstone kept are ignored for
+        keys which are not mirrored.
+
+        :param result: The etcd result
+        :type result: etcd.EtcdResult
+        """
+        with self._lock:
+            current = self._nodes.get(result.key)
+            if current and current[1] > result.modifiedIndex:
+                return
+            if (current is None and self._loaded_index is not None and
+                    result.modifiedIndex <= self._loaded_index):
+                return
+            if result.action in _removal_actions:
+                if result.dir:
+                    self._dirs.discard(result.key)
+                    prefix = result.key + '/'
+                    start, end = self._slice(prefix)
+                    for key in self._keys[start:end]:
+                        del self._nodes[key]
+                    del self._keys[start:end]
+                    self._dirs = set(
+                        x for x in self._dirs if not x.startswith(prefix))
+                    if result.key in self._nodes:
+                        del self._nodes[result.key]
+                        del self._keys[
+                            bisect.bisect_left(self._keys, result.key)]
+                else:
+                    self._set(result.key, None, result.modifiedIndex)
+            elif result.dir:
+                self._dirs.add(result.key)
+                self._add_dirs(result.key)
+            else:
+                self._set(result.key, result.value, result.modifiedIndex)
+                self._add_dirs(result.key)
+
+    def start(self):
+        """
+        Loads the tree and starts following the watch, if not already
+        started.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self.load()
+                thread = threading.Thread(target=self._follow)
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _follow(self):
+        """
+        Applies watch events until the process exits.
+        """
+        while True:
+            try:
+                self.follow_once()
+            except Exception as error:
+                self.logger.debug('Watch of {0} failed: {1}: {2}'.format(
+                    self._namespace, type(error), error))
+                time.sleep(self.retry_delay)
+
+    def follow_once(self):
+        """
+        Waits for and applies the next watch event, resyncing if the
+        watch has fallen too far behind.
+        """
+        try:
+            result = self._client.watch(
+                self._namespace, index=self._index + 1, recursive=True)
+        except etcd.EtcdEventIndexCleared:
+            self.logger.warn(
+                'Watch of {0} fell behind etcd history, resyncing'.format(
+                    self._namespace))
+            self.load()
+            return
+        self.apply(result)
+        self._index = max(self._index, result.modifiedIndex)
+        with self._lock:
+            self._forget_removals(self._index - self.removals_kept)
+        if result.etcd_index - self._index > self.max_lag:
+            self.logger.warn(
+                'Watch of {0} is {1} indexes behind, resyncing'.format(
+                    self._namespace, result.etcd_index - self._index))
+            self.load()
+
+    def get(self, key):
+        """
+        Returns the mirrored value of a key.
+
+        :param key: An etcd key
+        :type key: str
+        :returns: The value
+        :rtype: str
+        :raises: etcd.EtcdKeyNotFound
+        """
+        value = self._nodes.get(key, (None,))[0]
+        if value is None:
+            raise etcd.EtcdKeyNotFound('Key not found : {0}'.format(key))
+        return value
+
+    def list(self, key):
+        """
+        Returns the mirrored keys and values below a directory.
+
+        :param key: An etcd directory
+        :type key: str
+        :returns: (key, value) pairs ordered by key
+        :rtype: list
+        :raises: etcd.EtcdKeyNotFound
+        """
+        key = key.rstrip('/')
+        with self._lock:
+            if key not in self._dirs:
+                raise etcd.EtcdKeyNotFound('Key not found : {0}'.format(key))
+            start, end = self._slice(key + '/')
+            items = [(k, self._nodes[k][0]) for k in self._keys[start:end]]
+        return [(k, v) for k, v in items if v is not None]
+
+    def changes(self, key, since):
+        """
+        Returns the mirrored keys below a directory which were written or
+        removed after an index.
+
+        :param key: An etcd directory
+        :type key: str
+        :param since: The etcd index
+        :type since: int
+        :returns: (key, value) pairs ordered by key where value is None for
+                  removed keys, or None if removals since the index are
+                  not known
+        :rtype: list or None
+        """
+        with self._lock:
+            if self._loaded_index is None or since < self._loaded_index:
+                return None
+            start, end = self._slice(key.rstrip('/') + '/')
+            return [(k, self._nodes[k][0]) for k in self._keys[start:end]
+                    if self._nodes[k][1] > since]
+
 
 class EtcdStoreHandler(StoreHandlerBase):
     """
@@ -45,6 +440,11 @@ class EtcdStoreHandler(StoreHandlerBase):
 
     DEFAULT_SERVER_URL = 'http://127.0.0.1:2379'
 
+    NOT_FOUND_ERRORS = (KeyError, etcd.EtcdKeyNotFound)
+
+    #: Bytes read at a time while decoding a streamed listing
+    stream_chunk_size = 64 * 1024
+
     @classmethod
     def check_config(cls, config):
         """
@@ -63,6 +463,27 @@ class EtcdStoreHandler(StoreHandlerBase):
                     'Server URL scheme must be "https" when using client '
                     'side certificates (got "{0}")'.format(url.scheme))
 
+        consistency = config.get('read-consistency', {})
+        if not isinstance(consistency, dict):
+            consistency = {'*': consistency}
+        for model_name, level in consistency.items():
+            if level not in (READ_LINEARIZABLE, READ_SERIALIZABLE):
+                raise ConfigurationError(
+                    'Unknown read consistency "{0}" for "{1}". Expected '
+                    '"{2}" or "{3}"'.format(
+                        level, model_name,
+                        READ_LINEARIZABLE, READ_SERIALIZABLE))
+
+        read_urls = config.get('read-server-urls', [])
+        if not isinstance(read_urls, list):
+            raise ConfigurationError(
+                '"read-server-urls" must be a list of etcd member URLs')
+
+        max_lag = config.get('local-mirror-max-lag', 1000)
+        if not isinstance(max_lag, int) or max_lag < 1:
+            raise ConfigurationError(
+                '"local-mirror-max-lag" must be a positive integer')
+
     def __init__(self, config):
         """
         Creates a new instance of EtcdStoreHandler.
@@ -70,7 +491,45 @@ class EtcdStoreHandler(StoreHandlerBase):
         :param config: Configuration details
         :type config: dict
         """
-        url = urlparse(config.get('server_url', self.DEFAULT_SERVER_URL))
+        self._store = self._new_client(
+            config.get('server_url', self.DEFAULT_SERVER_URL), config)
+        self._etcd_namespace = '/commissaire'
+        # Names of list models whose models all have separate state
+        self._states_complete = set()
+
+        # Per model read consistency. A plain string applies to all models.
+        self._read_consistency = dict(_read_consistency_mapper)
+        consistency = config.get('read-consistency', {})
+        if isinstance(consistency, dict):
+            self._read_consistency.update(consistency)
+        else:
+            self._read_consistency = {'*': consistency}
+
+        # Serializable reads are spread across these members
+        self._read_stores = [self._store] + [
+            self._new_client(read_url, config)
+            for read_url in config.get('read-server-urls', [])]
+        self._read_store_cycle = itertools.cycle(self._read_stores)
+
+        # Reads served from memory, kept current by an etcd watch
+        self._mirror = None
+        if config.get('local-mirror', False):
+            self._mirror = EtcdMirror(
+                self._store, self._etcd_namespace,
+                config.get('local-mirror-max-lag', 1000))
+
+    def _new_client(self, server_url, config):
+        """
+        Creates a new etcd client for a single member.
+
+        :param server_url: URL of the etcd member
+        :type server_url: str
+        :param config: Configuration details
+        :type config: dict
+        :returns: An etcd client
+        :rtype: etcd.Client
+        """
+        url = urlparse(server_url)
         client_args = {
             'host': url.hostname,
             'protocol': url.scheme
@@ -81,8 +540,62 @@ class EtcdStoreHandler(StoreHandlerBase):
             client_args['cert'] = (
                 config['certificate-path'],
                 config['certificate-key-path'])
-        self._store = etcd.Client(**client_args)
-        self._etcd_namespace = '/commissaire'
+        return etcd.Client(**client_args)
+
+    def _get_read_consistency(self, model_instance, consistency=None):
+        """
+        Returns the read consistency to use for a model instance.
+
+        :param model_instance: Model instance to read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Per call override or None
+        :type consistency: str or None
+        :returns: READ_LINEARIZABLE or READ_SERIALIZABLE
+        :rtype: str
+        """
+        if consistency is None:
+            consistency = self._read_consistency.get(
+                model_instance.__class__.__name__,
+                self._read_consistency.get('*', READ_LINEARIZABLE))
+        return consistency
+
+    def _read(self, key, model_instance, consistency=None, **kwargs):
+        """
+        Reads a key with the consistency configured for the model.
+        Linearizable reads are quorum reads through the configured
+        server. Serializable reads rotate through all known members.
+
+        :param key: The etcd key to read
+        :type key: str
+        :param model_instance: Model instance being read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Per call override or None
+        :type consistency: str or None
+        :param kwargs: Other keyword arguments for etcd.Client.read
+        :type kwargs: dict
+        :returns: The etcd result
+        :rtype: etcd.EtcdResult
+        """
+        consistency = self._get_read_consistency(model_instance, consistency)
+        if consistency == READ_SERIALIZABLE:
+            return next(self._read_store_cycle).read(
+                key, quorum=False, **kwargs)
+        return self._store.read(key, quorum=True, **kwargs)
+
+    def _use_mirror(self, consistency):
+        """
+        Checks if a read should be served by the local mirror. Reads with
+        an explicit consistency always go to etcd.
+
+        :param consistency: Per call override or None
+        :type consistency: str or None
+        :returns: True if the local mirror should serve the read
+        :rtype: bool
+        """
+        if self._mirror is None or consistency is not None:
+            return False
+        self._mirror.start()
+        return True
 
     def _format_key(self, model_instance):
         """
@@ -99,9 +612,152 @@ class EtcdStoreHandler(StoreHandlerBase):
                 getattr(model_instance, model_instance._primary_key))
         return self._etcd_namespace + subkey
 
+    def _format_volatile_key(self, model_instance):
+        """
+        Returns the key and attributes of a model's frequently changing
+        state if it is stored apart from the rest of the model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: A (key, attributes) pair or None
+        :rtype: tuple or None
+        """
+        entry = _etcd_volatile_mapper.get(model_instance.__class__.__name__)
+        if entry is None:
+            return None
+        subkey, attributes = entry
+        if model_instance._primary_key:
+            subkey = subkey.format(
+                getattr(model_instance, model_instance._primary_key))
+        return (self._etcd_namespace + subkey, attributes)
+
+    def _write(self, key, value):
+        """
+        Writes a value.
+
+        :param key: The etcd key
+        :type key: str
+        :param value: The value to write
+        :type value: str
+        """
+        result = self._store.write(key, value)
+        if self._mirror is not None:
+            # Read our own writes without waiting for the watch.
+            self._mirror.apply(result)
+
+    def _fetch(self, key, model_instance, consistency=None):
+        """
+        Reads the value of a single key.
+
+        :param key: The etcd key
+        :type key: str
+        :param model_instance: Model instance being read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :returns: The value
+        :rtype: str
+        :raises: etcd.EtcdKeyNotFound
+        """
+        if self._use_mirror(consistency):
+            value = self._mirror.get(key)
+        else:
+            value = self._read(key, model_instance, consistency).value
+        return value
+
+    def _fetch_all(self, key, model_instance, consistency=None):
+        """
+        Reads every key below a directory.
+
+        :param key: The etcd directory
+        :type key: str
+        :param model_instance: Model instance being read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :returns: List of (key, value) pairs
+        :rtype: list
+        :raises: etcd.EtcdKeyNotFound
+        """
+        if self._use_mirror(consistency):
+            items = self._mirror.list(key)
+        else:
+            etcd_resp = self._read(
+                key, model_instance, consistency, recursive=True)
+            items = [(item.key, item.value) for item in etcd_resp.children]
+        return items
+
+    def _format_member_key(self, model_instance):
+        """
+        Returns the directory and attribute of a model's member set if each
+        member is stored under its own key.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: A (directory, attribute) pair or None
+        :rtype: tuple or None
+        """
+        entry = _etcd_member_mapper.get(model_instance.__class__.__name__)
+        if entry is None:
+            return None
+        subkey, attribute = entry
+        if model_instance._primary_key:
+            subkey = subkey.format(
+                getattr(model_instance, model_instance._primary_key))
+        return (self._etcd_namespace + subkey, attribute)
+
+    def _remove(self, key, recursive=False):
+        """
+        Deletes a key if it exists.
+
+        :param key: The etcd key
+        :type key: str
+        :param recursive: Delete a directory and everything below it
+        :type recursive: bool
+        """
+        try:
+            result = self._store.delete(key, recursive=recursive)
+        except etcd.EtcdKeyNotFound:
+            return
+        if self._mirror is not None:
+            self._mirror.apply(result)
+
+    def _list_members(self, model_instance, consistency=None):
+        """
+        Returns the members stored below a member directory. For list
+        models every member directory is read at once.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :returns: Primary key -> members, only for directories which exist
+        :rtype: dict
+        """
+        directory = self._format_member_key(model_instance)[0]
+        root = directory
+        if model_instance._json_type is not list:
+            root = directory.rsplit('/', 1)[0]
+        try:
+            items = self._fetch_all(directory, model_instance, consistency)
+        except etcd.EtcdKeyNotFound:
+            return {}
+        members = {}
+        for item_key, value in items:
+            parts = item_key[len(root) + 1:].split('/')
+            if not parts[0]:
+                continue
+            members.setdefault(parts[0], [])
+            if value is not None and len(parts) > 1:
+                members[parts[0]].append(parts[1])
+        return members
+
     def _save(self, model_instance):
         """
-        Saves data to etcd and returns back a saved model.
+        Saves data to etcd and returns back a saved model. Member keys are
+        only written for new records and records stored before members
+        were split out. Membership of other records is changed through the
+        hostset operations so a stale member set can not undo them.
 
         :param model_instance: Model instance to save
         :type model_instance: commissaire.model.Model
@@ -109,23 +765,63 @@ class EtcdStoreHandler(StoreHandlerBase):
         :rtype: commissaire.model.Model
         """
         key = self._format_key(model_instance)
-        self._store.write(key, model_instance.to_json(secure=True))
+        volatile = self._format_volatile_key(model_instance)
+        member = self._format_member_key(model_instance)
+        if volatile is None and member is None:
+            self._write(key, model_instance.to_json(secure=True))
+            return model_instance
+
+        data = model_instance._struct_for_json(secure=True)
+        if volatile is not None:
+            state = dict((x, data.pop(x)) for x in volatile[1])
+        if member is not None:
+            members = data.pop(member[1])
+            try:
+                stored = json.loads(self._fetch(
+                    key, model_instance, READ_LINEARIZABLE))
+            except etcd.EtcdKeyNotFound:
+                stored = None
+            if stored is not None:
+                # Stored before members were split out, or not at all.
+                members = stored.get(member[1], [])
+        self._write(key, json.dumps(data, sort_keys=True))
+        if volatile is not None:
+            self._write(volatile[0], json.dumps(state, sort_keys=True))
+        if member is not None:
+            for address in members:
+                self._write(member[0] + '/' + address, address)
         # TODO: Check if we need to update the data in the instance
         return model_instance
 
-    def _get(self, model_instance):
+    def _get(self, model_instance, consistency=None):
         """
         Returns data from a store and returns back a model.
 
         :param model_instance: Model instance to search and return
         :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
         :returns: The model instance
         :rtype: commissaire.model.Model
         """
         key = self._format_key(model_instance)
-        etcd_resp = self._store.get(key)
-        return model_instance.__class__(
-            **json.loads(etcd_resp.value))
+        data = json.loads(self._fetch(key, model_instance, consistency))
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is not None:
+            try:
+                data.update(json.loads(self._fetch(
+                    volatile[0], model_instance, consistency)))
+            except etcd.EtcdKeyNotFound:
+                # Stored before volatile state was split out.
+                pass
+        member = self._format_member_key(model_instance)
+        if member is not None:
+            members = self._list_members(model_instance, consistency)
+            # Records stored before members were split out keep theirs.
+            if model_instance.primary_key in members:
+                data[member[1]] = sorted(members[model_instance.primary_key])
+            data.setdefault(member[1], [])
+        return model_instance.__class__(**data)
 
     def _delete(self, model_instance):
         """
@@ -135,29 +831,202 @@ class EtcdStoreHandler(StoreHandlerBase):
         :type model_instance: commissaire.model.Model
         """
         key = self._format_key(model_instance)
-        self._store.delete(key)
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is not None:
+            self._remove(volatile[0])
+        member = self._format_member_key(model_instance)
+        if member is not None:
+            self._remove(member[0], recursive=True)
+        result = self._store.delete(key)
+        if self._mirror is not None:
+            self._mirror.apply(result)
 
-    def _list(self, model_instance):
+    def _prepare_members(self, model_instance):
         """
-        Lists data at a location in a store and returns back model instances.
+        Checks that a model with a member set exists and moves members of
+        records stored before members were split out to their own keys.
 
-        :param model_instance: Model instance to search for and list
+        :param model_instance: Model instance
         :type model_instance: commissaire.model.Model
-        :returns: A list of models
-        :rtype: list
+        :returns: The member directory
+        :rtype: str
+        :raises: etcd.EtcdKeyNotFound
+        """
+        directory, attribute = self._format_member_key(model_instance)
+        data = json.loads(self._fetch(
+            self._format_key(model_instance), model_instance))
+        if attribute in data:
+            self._save(self._get(model_instance))
+        return directory
+
+    def _hostset_add(self, model_instance, address):
+        """
+        Adds a host address to a Cluster's hostset by writing one key.
+
+        :param model_instance: Cluster instance to add to
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to add
+        :type address: str
+        """
+        directory = self._prepare_members(model_instance)
+        self._write(directory + '/' + address, address)
+
+    def _hostset_remove(self, model_instance, address):
+        """
+        Removes a host address from a Cluster's hostset by deleting one key.
+
+        :param model_instance: Cluster instance to remove from
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to remove
+        :type address: str
+        """
+        directory = self._prepare_members(model_instance)
+        self._remove(directory + '/' + address)
+
+    def _hostset_contains(self, model_instance, address):
+        """
+        Checks if a host address is in a Cluster's hostset by reading one
+        key.
+
+        :param model_instance: Cluster instance to check
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to look for
+        :type address: str
+        :returns: True if the address is a member
+        :rtype: bool
+        """
+        directory = self._prepare_members(model_instance)
+        try:
+            self._fetch(directory + '/' + address, model_instance)
+        except etcd.EtcdKeyNotFound:
+            return False
+        return True
+
+    def _list_volatile(self, model_instance, consistency=None):
+        """
+        Returns the separately stored state of every listed model.
+
+        :param model_instance: List model instance
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :returns: Primary key -> state
+        :rtype: dict
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None:
+            return {}
+        try:
+            items = self._fetch_all(volatile[0], model_instance, consistency)
+        except etcd.EtcdKeyNotFound:
+            return {}
+        return dict((k.rsplit('/', 1)[-1], json.loads(v))
+                    for k, v in items if v is not None)
+
+    def _stream_all(self, key, model_instance, consistency=None,
+                    index=None):
+        """
+        Reads every key below a directory, decoding the recursive read
+        while it arrives instead of after the whole response is loaded.
+
+        :param key: The etcd directory
+        :type key: str
+        :param model_instance: Model instance being read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :param index: When given, the etcd index of the read is appended
+        :type index: list or None
+        :returns: Generator of (key, value) pairs
+        :rtype: generator
+        :raises: etcd.EtcdKeyNotFound
+        """
+        response = None
+        if self._use_mirror(consistency):
+            if index is not None:
+                index.append(self._mirror._index)
+            items = self._mirror.list(key)
+        else:
+            consistency = self._get_read_consistency(
+                model_instance, consistency)
+            client = self._store
+            if consistency == READ_SERIALIZABLE:
+                client = next(self._read_store_cycle)
+            response = client.http.request(
+                'GET', client.base_uri + client.key_endpoint + key,
+                fields={
+                    'recursive': 'true',
+                    'quorum': str(consistency == READ_LINEARIZABLE).lower(),
+                },
+                timeout=client.read_timeout or None,
+                preload_content=False)
+            if response.status != 200:
+                try:
+                    etcd.EtcdError.handle(json.loads(
+                        response.data.decode('utf-8')))
+                finally:
+                    response.release_conn()
+            if index is not None:
+                index.append(int(response.getheader('X-Etcd-Index', 0)))
+            items = _iter_read(response.stream(self.stream_chunk_size))
+        try:
+            for item in items:
+                yield item
+        finally:
+            if response is not None:
+                response.release_conn()
+
+    def _iter_list(self, model_instance, consistency=None, index=None):
+        """
+        Yields the models of a list model one at a time as they are read.
+
+        :param model_instance: List model instance to read
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :param index: When given, the etcd index of the listing read is
+                      appended
+        :type index: list or None
+        :returns: Generator of model instances
+        :rtype: generator
+        :raises: etcd.EtcdKeyNotFound
         """
         key = self._format_key(model_instance)
         # The default class used is the same as the model_instance
         model_cls = model_instance.__class__
-        results = []
 
         # If this is a list then snag the configured class for use
         if model_instance._json_type is list:
             model_cls = model_instance._list_class
 
-        # populate the results
-        for item in self._store.read(key, recursive=True).children:
-            results.append(model_cls(**json.loads(item.value)))
+        states = self._list_volatile(model_instance, consistency)
+        member = self._format_member_key(model_instance)
+        members = {}
+        if member is not None:
+            members = self._list_members(model_instance, consistency)
+        for item_key, value in self._stream_all(
+                key, model_instance, consistency, index):
+            primary_key = item_key.rsplit('/', 1)[-1]
+            data = json.loads(value)
+            data.update(states.get(primary_key, {}))
+            if member is not None:
+                if primary_key in members:
+                    data[member[1]] = sorted(members[primary_key])
+                data.setdefault(member[1], [])
+            yield model_cls(**data)
+
+    def _list(self, model_instance, consistency=None):
+        """
+        Lists data at a location in a store and returns back model instances.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :param consistency: Read consistency override for this call
+        :type consistency: str or None
+        :returns: A list of models
+        :rtype: list
+        """
+        results = list(self._iter_list(model_instance, consistency))
 
         # If this is a list then fill the list container with the results
         # and return the model
@@ -168,5 +1037,230 @@ class EtcdStoreHandler(StoreHandlerBase):
                 results)
         return model_instance
 
+    def _revision(self, model_instance):
+        """
+        Returns the current etcd index.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The etcd index
+        :rtype: int
+        """
+        if self._use_mirror(None):
+            return self._mirror._index
+        try:
+            return self._read(self._etcd_namespace, model_instance).etcd_index
+        except etcd.EtcdKeyNotFound as error:
+            return (error.payload or {}).get('index', 0)
+
+    def _can_list_changes(self, model_instance):
+        """
+        Returns whether changes are listed on their own, which only the
+        local mirror can do.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: True if a local mirror is in use
+        :rtype: bool
+        """
+        return self._use_mirror(None)
+
+    def _list_changes(self, model_instance, since):
+        """
+        Lists the models which were created, updated or deleted after an
+        etcd index. Only the local mirror remembers removals, so without it
+        every model is listed at the index of the listing read itself.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param since: The etcd index, or None for every model
+        :type since: int or None
+        :returns: A (revision, model_instance, deleted) tuple
+        :rtype: tuple
+        """
+        if model_instance._json_type is not list:
+            return StoreHandlerBase._list_changes(
+                self, model_instance, since)
+        if since is None or not self._use_mirror(None):
+            index = []
+            setattr(model_instance, model_instance._list_attr,
+                    list(self._iter_list(model_instance, index=index)))
+            return (index[0], model_instance, None)
+
+        revision = self._mirror._index
+        directories = [self._format_key(model_instance)]
+        for extra in (self._format_volatile_key(model_instance),
+                      self._format_member_key(model_instance)):
+            if extra is not None:
+                directories.append(extra[0])
+        changed = set()
+        for directory in directories:
+            directory = directory.rstrip('/')
+            changes = self._mirror.changes(directory, int(since))
+            if changes is None:
+                return self._list_changes(model_instance, None)
+            for key, _ in changes:
+                changed.add(key[len(directory) + 1:].split('/', 1)[0])
+
+        model_cls = model_instance._list_class
+        results = []
+        deleted = []
+        for primary_key in sorted(changed):
+            try:
+                results.append(self._get(
+                    model_cls.new(**{model_cls._primary_key: primary_key})))
+            except etcd.EtcdKeyNotFound:
+                deleted.append(primary_key)
+        setattr(model_instance, model_instance._list_attr, results)
+        return (revision, model_instance, deleted)
+
+    def _all_states_split(self, model_instance, states):
+        """
+        Returns whether every listed model has separately stored state.
+        Models saved before state was split out keep it inline until they
+        are saved again. Once none are left none can appear, so this is
+        only read until it is true.
+
+        :param model_instance: List model instance
+        :type model_instance: commissaire.model.Model
+        :param states: Primary key -> state, from _list_volatile
+        :type states: dict
+        :returns: True if states holds every listed model
+        :rtype: bool
+        """
+        name = model_instance.__class__.__name__
+        if name in self._states_complete:
+            return True
+        try:
+            keys = [x.rsplit('/', 1)[-1] for x, _ in self._stream_all(
+                self._format_key(model_instance), model_instance)]
+        except etcd.EtcdKeyNotFound:
+            keys = []
+        if not set(keys) <= set(states):
+            return False
+        self._states_complete.add(name)
+        return True
+
+    def _list_attributes(self, model_instance, attributes):
+        """
+        Lists models with at least the given attributes populated. When
+        only separately stored state is requested the rest of each model,
+        including credentials, is not read.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :param attributes: Names of the attributes needed
+        :type attributes: tuple
+        :returns: A list of models
+        :rtype: list
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None or model_instance._json_type is not list:
+            return self._list(model_instance)
+        model_cls = model_instance._list_class
+        if not set(attributes).issubset(
+                set(volatile[1]) | set([model_cls._primary_key])):
+            return self._list(model_instance)
+
+        states = self._list_volatile(model_instance)
+        if not self._all_states_split(model_instance, states):
+            return self._list(model_instance)
+        results = []
+        for primary_key, state in sorted(states.items()):
+            state[model_cls._primary_key] = primary_key
+            results.append(model_cls.new(**state))
+        setattr(model_instance, model_instance._list_attr, results)
+        return model_instance
+
+    def _list_filtered(self, model_instance, filters, attributes=None):
+        """
+        Lists models whose attributes match every filter. Models are
+        read with one recursive read, or from separately stored state
+        alone when only that is needed.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models
+        :type attributes: tuple or None
+        :returns: A list of models
+        :rtype: list
+        """
+        volatile = self._format_volatile_key(model_instance)
+        if volatile is None or model_instance._json_type is not list:
+            return StoreHandlerBase._list_filtered(
+                self, model_instance, filters, attributes)
+        model_cls = model_instance._list_class
+        results = []
+        try:
+            if attributes is not None and set(attributes) | set(filters) <= (
+                    set(volatile[1]) | set([model_cls._primary_key])):
+                models = getattr(self._list_attributes(
+                    model_instance, tuple(set(attributes) | set(filters))),
+                    model_instance._list_attr)
+            else:
+                models = self._iter_list(model_instance)
+            for model in models:
+                if model_matches(model, filters):
+                    results.append(model)
+        except etcd.EtcdKeyNotFound:
+            # Nothing stored yet.
+            pass
+        setattr(model_instance, model_instance._list_attr, results)
+        return model_instance
+
+    def _format_lease_key(self, name):
+        """
+        Returns the key of a named lease.
+
+        :param name: Name of the lease
+        :type name: str
+        :returns: The etcd key
+        :rtype: str
+        """
+        return self._etcd_namespace + _etcd_lease_key.format(name)
+
+    def _acquire_lease(self, name, holder, ttl):
+        """
+        Acquires or renews a lease stored as a key with a ttl.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process asking for the lease
+        :type holder: str
+        :param ttl: Seconds the lease is held for
+        :type ttl: int
+        :returns: True if the holder now holds the lease
+        :rtype: bool
+        """
+        key = self._format_lease_key(name)
+        try:
+            self._store.write(key, holder, ttl=ttl, prevValue=holder)
+            return True
+        except (etcd.EtcdCompareFailed, etcd.EtcdKeyNotFound):
+            pass
+        try:
+            self._store.write(key, holder, ttl=ttl, prevExist=False)
+            return True
+        except etcd.EtcdAlreadyExist:
+            return False
+
+    def _release_lease(self, name, holder):
+        """
+        Releases a lease if it is held by the holder.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process releasing the lease
+        :type holder: str
+        """
+        try:
+            self._store.delete(
+                self._format_lease_key(name), prevValue=holder)
+        except (etcd.EtcdCompareFailed, etcd.EtcdKeyNotFound):
+            pass
+
 
 StoreHandler = EtcdStoreHandler
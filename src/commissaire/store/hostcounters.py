@@ -0,0 +1,190 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Per-cluster host counters kept current from store changes.
+"""
+
+import threading
+
+from commissaire.handlers.models import Hosts
+
+
+class HostCounters(object):
+    """
+    Counts the hosts of every cluster and how many are available. Host
+    statuses follow the store changes since the last update when the store
+    can list them. Otherwise only the statuses of every host are listed
+    again, and only once the store revision moved.
+    """
+
+    def __init__(self):
+        """
+        Creates a new HostCounters instance.
+        """
+        self._lock = threading.Lock()
+        # Store revision the statuses are current as of
+        self._revision = None
+        # Address -> status
+        self._statuses = {}
+        # Cluster name -> set of member addresses
+        self._members = {}
+        # Address -> set of cluster names
+        self._clusters = {}
+        # Cluster name -> [total, available]
+        self._counts = {}
+
+    def _add(self, address, status, sign):
+        """
+        Adds or subtracts a host to the counts of its clusters.
+
+        :param address: Address of the host
+        :type address: str
+        :param status: Status of the host
+        :type status: str
+        :param sign: 1 to add, -1 to subtract
+        :type sign: int
+        """
+        for name in self._clusters.get(address, ()):
+            counts = self._counts[name]
+            counts[0] += sign
+            if status == 'active':
+                counts[1] += sign
+
+    def _set_status(self, address, status):
+        """
+        Records the status of a host and updates the counts of its
+        clusters.
+
+        :param address: Address of the host
+        :type address: str
+        :param status: Status of the host, or None if it was deleted
+        :type status: str or None
+        """
+        if address in self._statuses:
+            self._add(address, self._statuses.pop(address), -1)
+        if status is not None:
+            self._statuses[address] = status
+            self._add(address, status, 1)
+
+    def _recount(self, name):
+        """
+        Counts the members of a cluster from scratch.
+
+        :param name: Name of the cluster
+        :type name: str
+        """
+        statuses = [
+            self._statuses[x] for x in self._members[name]
+            if x in self._statuses]
+        self._counts[name] = [len(statuses), statuses.count('active')]
+
+    def _reset(self, hosts):
+        """
+        Replaces every host status and counts every cluster again.
+
+        :param hosts: Every host
+        :type hosts: list
+        """
+        self._statuses = dict((x.address, x.status) for x in hosts)
+        for name in self._members.keys():
+            self._recount(name)
+
+    def _update(self, store_manager):
+        """
+        Brings the host statuses up to date with the store.
+
+        :param store_manager: Proxy object for remote stores
+        :type store_manager: commissaire.store.StoreHandlerManager
+        """
+        revision = store_manager.revision(Hosts.new())
+        if revision is not None and revision == self._revision:
+            return
+        if (revision is not None and self._revision is not None and
+                store_manager.can_list_changes(Hosts.new())):
+            revision, hosts, deleted = store_manager.list_changes(
+                Hosts.new(), self._revision)
+            if deleted is None:
+                self._reset(hosts.hosts)
+            else:
+                for address in deleted:
+                    self._set_status(address, None)
+                for host in hosts.hosts:
+                    self._set_status(host.address, host.status)
+        else:
+            # Only statuses are read. Read after the revision so no change
+            # is missed.
+            self._reset(store_manager.list(
+                Hosts.new(), attributes=('address', 'status')).hosts)
+        self._revision = revision
+
+    def _set_members(self, name, hostset):
+        """
+        Records the members of a cluster, counting only hosts which joined
+        or left since the last time.
+
+        :param name: Name of the cluster
+        :type name: str
+        :param hostset: Addresses of the members
+        :type hostset: list
+        """
+        members = set(hostset)
+        old = self._members.get(name)
+        self._members[name] = members
+        if old is None:
+            for address in members:
+                self._clusters.setdefault(address, set()).add(name)
+            self._recount(name)
+            return
+        counts = self._counts[name]
+        for address, sign in (
+                [(x, -1) for x in old - members] +
+                [(x, 1) for x in members - old]):
+            if sign > 0:
+                self._clusters.setdefault(address, set()).add(name)
+            else:
+                self._clusters[address].discard(name)
+            if address in self._statuses:
+                counts[0] += sign
+                if self._statuses[address] == 'active':
+                    counts[1] += sign
+
+    def forget(self, name):
+        """
+        Stops counting the hosts of a cluster.
+
+        :param name: Name of the cluster
+        :type name: str
+        """
+        with self._lock:
+            for address in self._members.pop(name, ()):
+                self._clusters[address].discard(name)
+            self._counts.pop(name, None)
+
+    def count(self, store_manager, cluster):
+        """
+        Fills in the hosts counters of a cluster.
+
+        :param store_manager: Proxy object for remote stores
+        :type store_manager: commissaire.store.StoreHandlerManager
+        :param cluster: The cluster, as stored
+        :type cluster: commissaire.handlers.models.Cluster
+        """
+        with self._lock:
+            self._update(store_manager)
+            self._set_members(cluster.name, cluster.hostset)
+            total, available = self._counts[cluster.name]
+        cluster.hosts['total'] = total
+        cluster.hosts['available'] = available
+        cluster.hosts['unavailable'] = total - available
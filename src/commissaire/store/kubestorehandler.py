@@ -17,13 +17,19 @@ Kubernetes based StoreHandler.
 """
 
 import json
+import logging
 import requests
+import threading
+import time
 
+from commissaire import constants as C
 from commissaire.compat.b64 import base64
 from commissaire.compat.urlparser import urlparse, urljoin
 from commissaire.containermgr.kubernetes import KubeContainerManager
+from commissaire.containermgr.kubernetes.session import new_session
 from commissaire.handlers.models import Hosts, Host
-from commissaire.store import ConfigurationError, StoreHandlerBase
+from commissaire.store import (
+    ConfigurationError, StoreHandlerBase, model_matches)
 
 _API_VERSION = 'v1'
 
@@ -41,6 +47,307 @@ _model_mapper = {
     'Status': '/namespaces/default/',
 }
 
+#: Maps ModelClassName to the annotation class name and attribute of a
+#: member set which is stored as one annotation per member
+_member_mapper = {
+    'Cluster': ('clusterhost', 'hostset'),
+}
+#: Annotation class names of members
+_member_classes = frozenset(x[0] for x in _member_mapper.values())
+
+#: Labels of the secrets which hold host credentials
+_secret_labels = {'commissaire-secret': 'host'}
+#: Labels of the nodes which are commissaire hosts
+_node_labels = {'commissaire-host': 'true'}
+#: Annotation on the default namespace marking that the nodes of hosts
+#: saved before nodes were labeled have been labeled
+_nodes_labeled_annotation = 'commissaire-nodes-labeled'
+
+#: Path of the ConfigMaps which hold leases and, optionally, models
+_lease_path = '/namespaces/default/configmaps/'
+#: Label naming the model class of a ConfigMap which holds a model
+_model_label = 'commissaire-model'
+#: Annotation on a lease's ConfigMap which holds the lease record
+_lease_annotation = 'commissaire-lease'
+
+
+def _selector(labels):
+    """
+    Returns a label selector matching every label in a dict.
+
+    :param labels: Label name -> value
+    :type labels: dict
+    :returns: The label selector
+    :rtype: str
+    """
+    return ','.join(
+        '{0}={1}'.format(k, v) for k, v in sorted(labels.items()))
+
+
+def _iter_pages(session, url, params, page_size):
+    """
+    Yields the pages of a Kubernetes list, following continue tokens
+    until the list is complete.
+
+    :param session: The session to list with
+    :type session: requests.Session
+    :param url: URL of the collection
+    :type url: str
+    :param params: Query parameters such as selectors
+    :type params: dict
+    :param page_size: Maximum number of objects per page
+    :type page_size: int
+    :returns: Generator of decoded list responses
+    :rtype: generator
+    :raises: requests.exceptions.RequestException
+    """
+    page_params = dict(params, limit=page_size)
+    while True:
+        response = session.get(url, params=page_params)
+        response.raise_for_status()
+        data = response.json()
+        yield data
+        token = data.get('metadata', {}).get('continue')
+        if not token:
+            return
+        page_params = dict(page_params, **{'continue': token})
+
+
+def _index_annotations(annotations):
+    """
+    Parses commissaire annotations, named
+    commissaire-{class}-{primary key}-{attribute}, into an index. Member
+    annotations are indexed under their owner with the member as both
+    attribute and value.
+
+    :param annotations: Annotations of a Kubernetes object
+    :type annotations: dict
+    :returns: Class name -> primary key -> attribute -> value
+    :rtype: dict
+    """
+    index = {}
+    for k, v in annotations.items():
+        parts = k.split('-', 3)
+        if len(parts) != 4 or parts[0] != 'commissaire':
+            continue
+        _, class_name, primary_key, attribute = parts
+        if class_name in _member_classes:
+            # The value must match the key so "a-b" members are not taken
+            # for members of "a".
+            if not v or not k.endswith('-' + v):
+                continue
+            prefix = 'commissaire-{0}-'.format(class_name)
+            primary_key = k[len(prefix):-len(v) - 1]
+            attribute = v
+        index.setdefault(class_name, {}).setdefault(
+            primary_key, {})[attribute] = v
+    return index
+
+
+def _resource_version(obj):
+    """
+    Returns the resourceVersion of a Kubernetes object as a number so
+    versions can be ordered.
+
+    :param obj: A Kubernetes object
+    :type obj: dict
+    :returns: The resourceVersion or 0 if it is not a number
+    :rtype: int
+    """
+    try:
+        return int(obj.get('metadata', {}).get('resourceVersion'))
+    except (TypeError, ValueError):
+        return 0
+
+
+class KubeMirror(object):
+    """
+    In memory copy of a Kubernetes collection which is kept current by
+    following a watch, in the manner of an informer. The collection is
+    loaded with one list and the watch resumes from the resourceVersion of
+    that list. When the apiserver no longer has the events the watch needs
+    the collection is listed again.
+    """
+
+    #: Seconds to wait before retrying a failed watch or load
+    retry_delay = 1
+    #: Seconds the apiserver keeps a watch open before it is renewed
+    watch_timeout = 300
+
+    def __init__(self, session, url, field_selector=None,
+                 label_selector=None, page_size=500):
+        """
+        Creates a new KubeMirror instance.
+
+        :param session: The session to list and watch with
+        :type session: requests.Session
+        :param url: URL of the collection
+        :type url: str
+        :param field_selector: Restricts the mirrored objects, or None
+        :type field_selector: str or None
+        :param label_selector: Restricts the mirrored objects, or None
+        :type label_selector: str or None
+        :param page_size: Maximum number of objects listed per request
+        :type page_size: int
+        """
+        self._session = session
+        self._url = url
+        self._field_selector = field_selector
+        self._label_selector = label_selector
+        self._page_size = page_size
+        # Object name -> (object or None once deleted, resourceVersion)
+        self._objects = {}
+        self._resource_version = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.logger = logging.getLogger('store')
+
+    def _params(self, **params):
+        """
+        Returns the query parameters for a list or watch.
+
+        :param params: Additional parameters
+        :type params: dict
+        :returns: The query parameters
+        :rtype: dict
+        """
+        if self._field_selector:
+            params['fieldSelector'] = self._field_selector
+        if self._label_selector:
+            params['labelSelector'] = self._label_selector
+        return params
+
+    def load(self):
+        """
+        Replaces the mirrored collection with one paged list.
+        """
+        objects = {}
+        for data in _iter_pages(
+                self._session, self._url, self._params(), self._page_size):
+            for item in data.get('items') or []:
+                objects[item['metadata']['name']] = (
+                    item, _resource_version(item))
+        with self._lock:
+            self._objects = objects
+            # Every page of a list is read at the same resourceVersion
+            self._resource_version = data.get(
+                'metadata', {}).get('resourceVersion')
+        self.logger.info('Loaded {0} objects from {1} at {2}'.format(
+            len(objects), self._url, self._resource_version))
+
+    def apply(self, event_type, obj):
+        """
+        Applies a single watch event or write result to the mirror. Events
+        older than the mirrored copy of an object are ignored. Deleted
+        objects are kept as tombstones so late events can not revive them.
+
+        :param event_type: ADDED, MODIFIED or DELETED
+        :type event_type: str
+        :param obj: The Kubernetes object
+        :type obj: dict
+        """
+        name = obj.get('metadata', {}).get('name')
+        version = _resource_version(obj)
+        with self._lock:
+            current = self._objects.get(name)
+            if current and current[1] > version:
+                return
+            if event_type == 'DELETED':
+                self._objects[name] = (None, version)
+            else:
+                self._objects[name] = (obj, version)
+
+    def start(self):
+        """
+        Loads the collection and starts following the watch, if not
+        already started.
+        """
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self.load()
+                thread = threading.Thread(target=self._follow)
+                thread.daemon = True
+                thread.start()
+                self._thread = thread
+
+    def _follow(self):
+        """
+        Applies watch events until the process exits.
+        """
+        while True:
+            try:
+                self.follow_once()
+            except Exception as error:
+                self.logger.debug('Watch of {0} failed: {1}: {2}'.format(
+                    self._url, type(error), error))
+                time.sleep(self.retry_delay)
+
+    def follow_once(self):
+        """
+        Applies the events of one watch request until the apiserver ends
+        it, listing again if the watch has expired.
+        """
+        # Give the apiserver time to end the watch itself
+        response = self._session.get(
+            self._url, stream=True, timeout=self.watch_timeout + 30,
+            params=self._params(
+                watch='true', resourceVersion=self._resource_version,
+                timeoutSeconds=self.watch_timeout))
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line)
+            obj = event.get('object', {})
+            if event.get('type') == 'ERROR':
+                if obj.get('code') == requests.codes.GONE:
+                    self.logger.warn(
+                        'Watch of {0} expired, listing again'.format(
+                            self._url))
+                    self.load()
+                    return
+                raise Exception(obj.get('message', 'Watch error'))
+            self.apply(event.get('type'), obj)
+            self._resource_version = obj.get(
+                'metadata', {}).get('resourceVersion')
+
+    def get(self, name):
+        """
+        Returns the mirrored copy of an object.
+
+        :param name: Name of the object
+        :type name: str
+        :returns: The Kubernetes object
+        :rtype: dict
+        :raises: KeyError
+        """
+        obj = self._objects.get(name, (None,))[0]
+        if obj is None:
+            raise KeyError('No object named {0}'.format(name))
+        return obj
+
+    def list(self):
+        """
+        Returns the mirrored objects.
+
+        :returns: Kubernetes objects ordered by name
+        :rtype: list
+        """
+        return [v[0] for k, v in sorted(self._objects.items())
+                if v[0] is not None]
+
+    @property
+    def resource_version(self):
+        """
+        The resourceVersion the mirror is current to.
+
+        :rtype: str
+        """
+        return self._resource_version
+
 
 class KubernetesStoreHandler(StoreHandlerBase):
     """
@@ -48,6 +355,8 @@ class KubernetesStoreHandler(StoreHandlerBase):
     """
 
     DEFAULT_SERVER_URL = 'http://127.0.0.1:8080'
+    #: Number of nodes returned by each request while listing hosts
+    DEFAULT_PAGE_SIZE = 500
 
     container_manager_class = KubeContainerManager
 
@@ -68,6 +377,25 @@ class KubernetesStoreHandler(StoreHandlerBase):
                 raise ConfigurationError(
                     'Server URL scheme must be "https" when using client '
                     'side certificates (got "{0}")'.format(url.scheme))
+        if config.get('model-storage', 'annotations') not in (
+                'annotations', 'configmaps'):
+            raise ConfigurationError(
+                '"model-storage" must be "annotations" or "configmaps"')
+        page_size = config.get('page-size', cls.DEFAULT_PAGE_SIZE)
+        if not isinstance(page_size, int) or page_size < 1:
+            raise ConfigurationError(
+                '"page-size" must be a positive integer')
+        max_age = config.get('status-max-age', C.DEFAULT_STATUS_MAX_AGE)
+        if (isinstance(max_age, bool) or
+                not isinstance(max_age, (int, float)) or max_age < 0):
+            raise ConfigurationError(
+                '"status-max-age" must be zero or a positive number')
+        for key in ('pool-size', 'connect-timeout', 'read-timeout'):
+            value = config.get(key, 1)
+            if (isinstance(value, bool) or
+                    not isinstance(value, (int, float)) or value <= 0):
+                raise ConfigurationError(
+                    '"{0}" must be a positive number'.format(key))
 
     def __init__(self, config):
         """
@@ -76,65 +404,160 @@ class KubernetesStoreHandler(StoreHandlerBase):
         :param config: Configuration details
         :type config: dict
         """
-        self._store = requests.Session()
-        # Use a bearer token if it's provided
-        token = config.get('token', None)
-        if token:
-            self._store.headers["Authorization"] = "Bearer {0}".format(token)
-
-        # Use client certificate if it's provided
-        certificate_path = config.get('certificate_path')
-        certificate_key_path = config.get('certificate_key_path')
-        if certificate_path and certificate_key_path:
-            self._store.cert = (certificate_path, certificate_key_path)
-
-        # TODO: Verify TLS!!!
-        self._store.verify = False
+        self._store = new_session(config)
         base_url = config.get('server_url', self.DEFAULT_SERVER_URL)
         self._endpoint = urljoin(base_url, '/api/' + _API_VERSION)
 
         # The endpoint to hit for secrets
         self._secrets_endpoint = self._endpoint + '/namespaces/default/secrets'
+        # Namespace paths known to have an annotation container
+        self._annotated_paths = set()
+        self._page_size = config.get('page-size', self.DEFAULT_PAGE_SIZE)
+        # Whether nodes saved before nodes were labeled have been labeled
+        self._nodes_labeled = False
+        # Whether namespace models are stored as ConfigMaps of their own
+        self._configmaps = (
+            config.get('model-storage', 'annotations') == 'configmaps')
+
+        # Model path -> KubeMirror serving reads of that path
+        self._mirrors = {}
+        if config.get('local-mirror', False):
+            self._mirrors = {
+                '/nodes/': KubeMirror(
+                    self._store, self._endpoint + '/nodes',
+                    label_selector=_selector(_node_labels),
+                    page_size=self._page_size),
+                '/namespaces/default/': KubeMirror(
+                    self._store, self._endpoint + '/namespaces',
+                    'metadata.name=default'),
+            }
+
+    def _read(self, path, name=''):
+        """
+        Reads the namespace, a node or every node, from the local mirror
+        when one is configured.
+
+        :param path: A path from _model_mapper
+        :type path: str
+        :param name: Name of a node, or an empty string for the path itself
+        :type name: str
+        :returns: The Kubernetes object, or a list with the nodes as items
+        :rtype: dict
+        """
+        mirror = self._mirrors.get(path)
+        if mirror is None:
+            return self._store.get(self._endpoint + path + name).json()
+        if path == '/nodes/':
+            self._label_nodes()
+        mirror.start()
+        if path == '/nodes/' and not name:
+            return {'items': mirror.list()}
+        try:
+            return mirror.get(name or 'default')
+        except KeyError:
+            return {}
+
+    def _label_nodes(self):
+        """
+        Labels the nodes of hosts saved before hosts were labeled so
+        listings restricted to the label find them. Every node is paged
+        through once per store and the default namespace is annotated
+        when done, so other processes only read the annotation.
+        """
+        if self._nodes_labeled:
+            return
+        namespace_url = self._endpoint + '/namespaces/default'
+        namespace = self._store.get(namespace_url).json()
+        annotations = namespace.get('metadata', {}).get('annotations') or {}
+        if _nodes_labeled_annotation not in annotations:
+            for data in _iter_pages(
+                    self._store, self._endpoint + '/nodes', {},
+                    self._page_size):
+                for item in data.get('items') or []:
+                    metadata = item.get('metadata', {})
+                    labels = metadata.get('labels') or {}
+                    if all(labels.get(k) == v
+                           for k, v in _node_labels.items()):
+                        continue
+                    if any(x.startswith('commissaire-host-')
+                           for x in metadata.get('annotations') or {}):
+                        self._store.patch(
+                            self._endpoint + '/nodes/' + metadata['name'],
+                            json={'metadata': {'labels': _node_labels}},
+                            headers={'Content-Type':
+                                     'application/merge-patch+json'})
+            self._store.patch(
+                namespace_url,
+                json={'metadata': {'annotations': {
+                    _nodes_labeled_annotation: 'true'}}},
+                headers={'Content-Type': 'application/merge-patch+json'})
+        self._nodes_labeled = True
+
+    def _apply_write(self, path, response):
+        """
+        Applies the object returned by a write to the local mirror so the
+        write is read back without waiting for the watch.
 
-    def _format_kwargs(self, model_instance, annotations, listing=False):
+        :param path: A path from _model_mapper
+        :type path: str
+        :param response: The response of the write
+        :type response: requests.Response
+        """
+        mirror = self._mirrors.get(path)
+        if mirror is not None and response.status_code == requests.codes.OK:
+            mirror.apply('MODIFIED', response.json())
+
+    def _format_kwargs(self, model_instance, index, primary_key):
         """
         Formats keyword arguments used when creating a model.
 
-        :param model_instance: Model instance to save
+        :param model_instance: Model instance to create
         :type model_instance: commissaire.model.Model
-        :param annotations: Annotations to use when creating keyword arguments.
-        :type annotations: dict
-        :param listing: Notes if this is an attempt to get a list of items.
-        :type listing: bool
+        :param index: Annotations parsed by _index_annotations
+        :type index: dict
+        :param primary_key: Primary key of the model in the index
+        :type primary_key: str
         :returns: Dictionary of keyword arguments
         :rtype: dict
         """
         kwargs = {}
-        for k, v in annotations.items():
-            try:
-                _, class_name, primary_key, model_kwarg = k.split('-', 3)
-                model_kwarg = model_kwarg.replace('-', '_')
-
-                # Make sure we the data is for this instance
-                if (model_instance.__class__.__name__.lower() != class_name and
-                        not listing):
-                    continue
-                elif not listing:
-                    if model_instance.primary_key != primary_key:
-                        continue
-
+        class_name = model_instance.__class__.__name__
+        attributes = index.get(class_name.lower(), {}).get(primary_key, {})
+        for k, v in attributes.items():
+            model_kwarg = k.replace('-', '_')
+            if model_kwarg in model_instance._attribute_map.keys():
                 # Deserialize any json structs
                 if v.startswith('json:'):
                     v = json.loads(v[5:])
-
-                if model_kwarg in model_instance._attribute_map.keys():
-                    kwargs[model_kwarg] = v
-            except ValueError:
-                # This means it is not a commissaire model annotaiton.
-                pass
+                kwargs[model_kwarg] = v
+
+        member = _member_mapper.get(class_name)
+        if member is not None and kwargs:
+            members = sorted(index.get(member[0], {}).get(
+                kwargs.get(model_instance._primary_key, primary_key), {}))
+            # Records stored before members were split out keep theirs.
+            if members or member[1] not in kwargs:
+                kwargs[member[1]] = members
         return kwargs
 
-    def _format_model(self, resp_data, model_instance, listing=False):
+    def _format_members(self, annotations, member_class, primary_key):
+        """
+        Returns the members stored as separate annotations.
+
+        :param annotations: Annotations to search.
+        :type annotations: dict
+        :param member_class: The annotation class name of the members.
+        :type member_class: str
+        :param primary_key: Primary key of the model owning the members.
+        :type primary_key: str
+        :returns: Sorted list of members
+        :rtype: list
+        """
+        return sorted(_index_annotations(annotations).get(
+            member_class, {}).get(primary_key, {}))
+
+    def _format_model(self, resp_data, model_instance, listing=False,
+                      secrets=None):
         """
         Takes a model instance and figures out the proper request.
 
@@ -144,6 +567,9 @@ class KubernetesStoreHandler(StoreHandlerBase):
         :type model_instance: commissaire.model.Model
         :param listing: Notes if this is an attempt to get a list of items.
         :type listing: bool
+        :param secrets: Secrets of a Host if they are already known, an
+                        empty dict to leave them out or None to read them.
+        :type secrets: dict or None
         :returns: The model instance
         :rtype: commissaire.model.Model
         """
@@ -152,12 +578,35 @@ class KubernetesStoreHandler(StoreHandlerBase):
             raise KeyError('No annotations for {0}'.format(
                 model_instance.primary_key))
 
-        kwargs = self._format_kwargs(
-            model_instance,
-            annotations, listing)
+        index = _index_annotations(annotations)
+        primary_key = model_instance.primary_key
+        if listing:
+            # A listed object holds a single model of its class
+            primary_key = next(iter(index.get(
+                model_instance.__class__.__name__.lower(), {})), None)
+        return self._build_model(model_instance, index, primary_key, secrets)
+
+    def _build_model(self, model_instance, index, primary_key, secrets=None):
+        """
+        Creates a model from parsed annotations.
+
+        :param model_instance: Model instance to create
+        :type model_instance: commissaire.model.Model
+        :param index: Annotations parsed by _index_annotations
+        :type index: dict
+        :param primary_key: Primary key of the model in the index
+        :type primary_key: str
+        :param secrets: Secrets of a Host if they are already known, an
+                        empty dict to leave them out or None to read them.
+        :type secrets: dict or None
+        :returns: The model instance
+        :rtype: commissaire.model.Model
+        """
+        kwargs = self._format_kwargs(model_instance, index, primary_key)
         # Host is special in that it has sensitive data stored in secrets
         if model_instance.__class__.__name__ == 'Host':
-            secrets = self._get_secret(model_instance.primary_key)
+            if secrets is None:
+                secrets = self._get_secret(model_instance.primary_key)
             kwargs.update(secrets)
 
         if not kwargs:
@@ -197,10 +646,25 @@ class KubernetesStoreHandler(StoreHandlerBase):
                 'metadata': {
                     'name': name,
                     'type': 'Opaque',
+                    'labels': _secret_labels,
                 },
                 'data': encoded_data,
             })
 
+    def _decode_secret(self, data):
+        """
+        Decodes the data of a Kubernetes secret.
+
+        :param data: The data member of the secret.
+        :type data: dict
+        :returns: Attribute name -> value
+        :rtype: dict
+        """
+        secrets = {}
+        for k, v in data.items():
+            secrets[k.replace('-', '_')] = base64.decodebytes(v)
+        return secrets
+
     def _get_secret(self, name):
         """
         Gets a Kubernetes secret.
@@ -213,7 +677,6 @@ class KubernetesStoreHandler(StoreHandlerBase):
         if response.status_code != requests.codes.OK:
             raise KeyError('No secrets for {0}'.format(name))
 
-        secrets = {}
         rj = response.json()
 
         # The we have a data key use it directly
@@ -224,10 +687,36 @@ class KubernetesStoreHandler(StoreHandlerBase):
         elif 'items' in rj.keys():
             rj = rj['items'][0]['data']
 
-        for k, v in rj.items():
-            secrets[k.replace('-', '_')] = base64.decodebytes(v)
+        return self._decode_secret(rj)
 
-        return secrets
+    def _list_secrets(self):
+        """
+        Gets every host secret with a single request.
+
+        :returns: Secret name -> decoded secret
+        :rtype: dict
+        """
+        response = self._store.get(self._secrets_endpoint, params={
+            'labelSelector': ','.join(
+                '{0}={1}'.format(k, v) for k, v in _secret_labels.items())})
+        if response.status_code != requests.codes.OK:
+            return {}
+        return dict(
+            (x['metadata']['name'], self._decode_secret(x.get('data', {})))
+            for x in response.json().get('items') or [])
+
+    def _label_secret(self, name):
+        """
+        Labels a secret stored before secrets were labeled so later
+        listings find it.
+
+        :param name: The name of the secret.
+        :type name: str
+        """
+        self._store.patch(
+            self._secrets_endpoint + '/' + name,
+            json={'metadata': {'labels': _secret_labels}},
+            headers={'Content-Type': 'application/merge-patch+json'})
 
     def _delete_secret(self, name):
         """
@@ -251,6 +740,8 @@ class KubernetesStoreHandler(StoreHandlerBase):
         func = getattr(self, '_{0}_on_namespace'.format(op))
         if class_name in ('Host', 'Hosts'):
             func = getattr(self, '_{0}_host'.format(op))
+        elif self._on_configmap(model_instance):
+            func = getattr(self, '_{0}_configmap'.format(op))
         return func(model_instance)
 
     def _save(self, model_instance):  # pragma: no cover
@@ -306,17 +797,35 @@ class KubernetesStoreHandler(StoreHandlerBase):
             'op': 'add',
             'path': patch_path,
             'value': data})
+        # Label the node so listing hosts selects only commissaire nodes
+        for key, value in _node_labels.items():
+            full_patch.append({
+                'op': 'add',
+                'path': '/metadata/labels/' + key,
+                'value': value})
 
         path = _model_mapper[model_instance.__class__.__name__]
         response = self._store.patch(
             self._endpoint + path + model_instance.primary_key,
             json=full_patch,
             headers={'Content-Type': 'application/json-patch+json'})
+        if response.status_code == requests.codes.UNPROCESSABLE_ENTITY:
+            # The node has no labels yet
+            full_patch = full_patch[:1] + [{
+                'op': 'add',
+                'path': '/metadata/labels',
+                'value': dict(_node_labels)}]
+            response = self._store.patch(
+                self._endpoint + path + model_instance.primary_key,
+                json=full_patch,
+                headers={'Content-Type': 'application/json-patch+json'})
+        self._apply_write(path, response)
         return self._format_model(response.json(), model_instance)
 
     def _save_on_namespace(self, model_instance):
         """
-        Saves data to a namespace and returns back a saved model.
+        Saves data to a namespace with a single patch and returns back a
+        saved model.
 
         :param model_instance: Model instance to save
         :type model_instance: commissaire.model.Model
@@ -327,27 +836,30 @@ class KubernetesStoreHandler(StoreHandlerBase):
         patch_path = "/metadata/annotations"
         path = _model_mapper[model_instance.__class__.__name__]
         class_name = model_instance.__class__.__name__.lower()
+        member = _member_mapper.get(model_instance.__class__.__name__)
 
-        r = self._store.get(self._endpoint + path)
-        if not r.json().get('metadata', {}).get('annotations', {}):
-            # Ensure we have an annotation container.
-            if self._store.patch(
-                self._endpoint + path,
-                json=[{
+        full_patch = []
+        annotations = None
+        if member is not None or path not in self._annotated_paths:
+            # Members are only written for new or legacy records.
+            metadata = self._store.get(self._endpoint + path).json().get(
+                'metadata', {})
+            annotations = metadata.get('annotations', {})
+            if annotations:
+                self._annotated_paths.add(path)
+            else:
+                # Ensure we have an annotation container.
+                full_patch.append({
                     'op': 'add',
                     'path': patch_path,
-                    'value': {'commissaire-manager': 'yes'}
-                }],
-                headers={'Content-Type': 'application/json-patch+json'}
-            ).status_code != 200:
-                raise KeyError(
-                    'Could creat annotation container for {0}={1}'.format(
-                        class_name, model_instance.primary_key))
-
-        response = None
+                    'value': {'commissaire-manager': 'yes'}})
+
         # NOTE: Kubernetes does not allow underscores in keys. To get past
         #       this we substitute _'s with -'s
         for x in model_instance._attribute_map.keys():
+            # Members are stored as their own annotations below
+            if member is not None and x == member[1]:
+                continue
             annotation_key = 'commissaire-{0}-{1}-{2}'.format(
                 class_name, model_instance.primary_key, x.replace('_', '-'))
             annotation_value = getattr(model_instance, x)
@@ -358,22 +870,212 @@ class KubernetesStoreHandler(StoreHandlerBase):
 
             # Skip any empty values
             if annotation_value:
-                full_patch = [{
+                full_patch.append({
                     'op': 'add',
                     'path': patch_path + '/' + annotation_key,
-                    'value': str(annotation_value)}]
+                    'value': str(annotation_value)})
+
+        if member is not None:
+            operations = self._member_operations(
+                model_instance, member, annotations)
+            if operations:
+                # Fail if the members changed since they were read.
+                full_patch.insert(0, {
+                    'op': 'test', 'path': '/metadata/resourceVersion',
+                    'value': metadata.get('resourceVersion')})
+                full_patch.extend(operations)
+        if not full_patch:
+            raise KeyError('Could not save annotations!')
 
-                response = self._store.patch(
-                    self._endpoint + path,
-                    json=full_patch,
-                    headers={'Content-Type': 'application/json-patch+json'})
-                if response.status_code != requests.codes.OK:
-                    # TODO log
-                    print('Could not save annotation {0}: {1}'.format(
-                        annotation_key, response.status_code))
-        if response:
-            return self._format_model(response.json(), model_instance)
-        raise KeyError('Could not save annotations!')
+        response = self._store.patch(
+            self._endpoint + path,
+            json=full_patch,
+            headers={'Content-Type': 'application/json-patch+json'})
+        self._apply_write(path, response)
+        if response.status_code != requests.codes.OK:
+            # The annotation container may have been removed since.
+            self._annotated_paths.discard(path)
+            raise KeyError(
+                'Could not save annotations for {0}={1}: {2}'.format(
+                    class_name, model_instance.primary_key,
+                    response.status_code))
+        self._annotated_paths.add(path)
+        return self._format_model(response.json(), model_instance)
+
+    def _member_operations(self, model_instance, member, annotations):
+        """
+        Returns the patch operations which store the members of a new
+        record, or move the members of a record stored before members were
+        split out to their own annotations. Members of other records are
+        only changed by the hostset operations.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :param member: The (annotation class name, attribute) of the members
+        :type member: tuple
+        :param annotations: The current annotations of the namespace
+        :type annotations: dict
+        :returns: JSON patch operations
+        :rtype: list
+        """
+        patch_path = '/metadata/annotations/'
+        member_class, attribute = member
+        class_name = model_instance.__class__.__name__.lower()
+        legacy_key = 'commissaire-{0}-{1}-{2}'.format(
+            class_name, model_instance.primary_key, attribute)
+        operations = []
+        if legacy_key in annotations:
+            members = json.loads(annotations[legacy_key][5:])
+            operations.append({
+                'op': 'remove', 'path': patch_path + legacy_key})
+        elif 'commissaire-{0}-{1}-{2}'.format(
+                class_name, model_instance.primary_key,
+                model_instance._primary_key) not in annotations:
+            members = getattr(model_instance, attribute) or []
+        else:
+            return []
+        prefix = 'commissaire-{0}-{1}-'.format(
+            member_class, model_instance.primary_key)
+        operations.extend([
+            {'op': 'add', 'path': patch_path + prefix + x, 'value': x}
+            for x in sorted(set(members))])
+        return operations
+
+    def _member_patch(self, model_instance, address, operations):
+        """
+        Patches a single member annotation if the model exists. A test
+        operation on the model's primary key annotation makes the patch
+        fail as a whole when it does not.
+
+        :param model_instance: Model instance which owns the member set
+        :type model_instance: commissaire.model.Model
+        :param address: The member
+        :type address: str
+        :param operations: Returns the patch operations for a member path
+        :type operations: callable
+        :returns: The member set still stored inside the model, if any
+        :rtype: list or None
+        :raises: KeyError
+        """
+        patch_path = '/metadata/annotations/'
+        class_name = model_instance.__class__.__name__.lower()
+        member_class, attribute = _member_mapper[
+            model_instance.__class__.__name__]
+        full_patch = [{
+            'op': 'test',
+            'path': patch_path + 'commissaire-{0}-{1}-{2}'.format(
+                class_name, model_instance.primary_key,
+                model_instance._primary_key),
+            'value': model_instance.primary_key}]
+        full_patch.extend(operations(
+            patch_path + 'commissaire-{0}-{1}-{2}'.format(
+                member_class, model_instance.primary_key, address)))
+
+        path = _model_mapper[model_instance.__class__.__name__]
+        response = self._store.patch(
+            self._endpoint + path,
+            json=full_patch,
+            headers={'Content-Type': 'application/json-patch+json'})
+        self._apply_write(path, response)
+        if response.status_code != requests.codes.OK:
+            raise KeyError('No data for {0}: {1}'.format(
+                model_instance.primary_key, response.status_code))
+        legacy = response.json().get('metadata', {}).get(
+            'annotations', {}).get('commissaire-{0}-{1}-{2}'.format(
+                class_name, model_instance.primary_key, attribute))
+        if legacy is not None:
+            return json.loads(legacy[5:])
+        return None
+
+    def _convert_members(self, model_instance):
+        """
+        Moves the member set of a record stored before members were split
+        out to their own annotations.
+
+        :param model_instance: Model instance which owns the member set
+        :type model_instance: commissaire.model.Model
+        """
+        self._save_on_namespace(self._get_on_namespace(model_instance))
+
+    def _hostset_add(self, model_instance, address):
+        """
+        Adds a host address to a Cluster's hostset by adding one annotation.
+
+        :param model_instance: Cluster instance to add to
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to add
+        :type address: str
+        """
+        if self._on_configmap(model_instance):
+            return self._configmap_member_patch(
+                model_instance, address,
+                lambda x: [{'op': 'add', 'path': x, 'value': address}])
+        legacy = self._member_patch(
+            model_instance, address,
+            lambda x: [{'op': 'add', 'path': x, 'value': address}])
+        if legacy is not None:
+            self._convert_members(model_instance)
+
+    def _hostset_remove(self, model_instance, address):
+        """
+        Removes a host address from a Cluster's hostset by removing one
+        annotation.
+
+        :param model_instance: Cluster instance to remove from
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to remove
+        :type address: str
+        """
+        # Adding first makes removing a non-member succeed.
+        if self._on_configmap(model_instance):
+            return self._configmap_member_patch(
+                model_instance, address,
+                lambda x: [{'op': 'add', 'path': x, 'value': address},
+                           {'op': 'remove', 'path': x}])
+        operations = (
+            lambda x: [{'op': 'add', 'path': x, 'value': address},
+                       {'op': 'remove', 'path': x}])
+        if self._member_patch(
+                model_instance, address, operations) is not None:
+            # The address may only now have moved to its own annotation.
+            self._convert_members(model_instance)
+            self._member_patch(model_instance, address, operations)
+
+    def _hostset_contains(self, model_instance, address):
+        """
+        Checks if a host address is in a Cluster's hostset without building
+        the cluster model.
+
+        :param model_instance: Cluster instance to check
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to look for
+        :type address: str
+        :returns: True if the address is a member
+        :rtype: bool
+        :raises: KeyError
+        """
+        if self._on_configmap(model_instance):
+            member = _member_mapper[model_instance.__class__.__name__]
+            data = self._read_configmap(model_instance).get('data') or {}
+            return '{0}.{1}'.format(member[1], address) in data
+        class_name = model_instance.__class__.__name__.lower()
+        member_class, attribute = _member_mapper[
+            model_instance.__class__.__name__]
+        path = _model_mapper[model_instance.__class__.__name__]
+        annotations = self._read(path).get(
+            'metadata', {}).get('annotations', {})
+        if 'commissaire-{0}-{1}-{2}'.format(
+                class_name, model_instance.primary_key,
+                model_instance._primary_key) not in annotations:
+            raise KeyError('No data for {0}'.format(
+                model_instance.primary_key))
+        if 'commissaire-{0}-{1}-{2}'.format(
+                member_class, model_instance.primary_key,
+                address) in annotations:
+            return True
+        legacy = annotations.get('commissaire-{0}-{1}-{2}'.format(
+            class_name, model_instance.primary_key, attribute))
+        return legacy is not None and address in json.loads(legacy[5:])
 
     def _get(self, model_instance):  # pragma: no cover
         """
@@ -396,9 +1098,8 @@ class KubernetesStoreHandler(StoreHandlerBase):
         :rtype: commissaire.model.Model
         """
         path = _model_mapper[model_instance.__class__.__name__]
-        response = self._store.get(
-            self._endpoint + path + model_instance.primary_key)
-        return self._format_model(response.json(), model_instance)
+        return self._format_model(
+            self._read(path, model_instance.primary_key), model_instance)
 
     def _get_on_namespace(self, model_instance):
         """
@@ -410,9 +1111,7 @@ class KubernetesStoreHandler(StoreHandlerBase):
         :rtype: commissaire.model.Model
         """
         path = _model_mapper[model_instance.__class__.__name__]
-        response = self._store.get(
-            self._endpoint + path)
-        return self._format_model(response.json(), model_instance)
+        return self._format_model(self._read(path), model_instance)
 
     def _delete(self, model_instance):  # pragma: no cover
         """
@@ -467,6 +1166,7 @@ class KubernetesStoreHandler(StoreHandlerBase):
                 model_instance.primary_key),
             json=full_patch,
             headers={'Content-Type': 'application/json-patch+json'})
+        self._apply_write(_model_mapper['Host'], response)
         if response.status_code != requests.codes.OK:
             raise KeyError(response.text)
 
@@ -479,23 +1179,43 @@ class KubernetesStoreHandler(StoreHandlerBase):
         """
         full_patch = []
         class_name = model_instance.__class__.__name__.lower()
+        path = _model_mapper[model_instance.__class__.__name__]
+        member = _member_mapper.get(model_instance.__class__.__name__)
+        annotations = {}
+        if member is not None:
+            annotations = self._store.get(self._endpoint + path).json().get(
+                'metadata', {}).get('annotations', {})
         for x in model_instance._attribute_map.keys():
             patch_path = (
                 '/metadata/annotations/commissaire-{0}-{1}-{2}'.format(
                     class_name, model_instance.primary_key, x))
             patch_value = str(getattr(model_instance, x))
 
+            # Members are removed from their own annotations below
+            if member is not None and x == member[1]:
+                if patch_path.rsplit('/', 1)[1] not in annotations:
+                    continue
+
             # Skip any empty values
             if not patch_value:
                 continue
 
             full_patch.append({'op': 'remove', 'path': patch_path})
 
-        path = _model_mapper[model_instance.__class__.__name__]
+        if member is not None:
+            for x in self._format_members(
+                    annotations, member[0], model_instance.primary_key):
+                full_patch.append({
+                    'op': 'remove',
+                    'path': (
+                        '/metadata/annotations/commissaire-{0}-{1}-{2}'.format(
+                            member[0], model_instance.primary_key, x))})
+
         response = self._store.patch(
             self._endpoint + path,
             json=full_patch,
             headers={'Content-Type': 'application/json-patch+json'})
+        self._apply_write(path, response)
         if response.status_code != requests.codes.OK:
             raise KeyError(response.text)
 
@@ -510,50 +1230,540 @@ class KubernetesStoreHandler(StoreHandlerBase):
         """
         return self._dispatch('list', model_instance)
 
-    def _list_on_namespace(self, model_instance):
+    def _list_on_namespace(self, model_instance, data=None):
+        """
+        Lists data within a namespace and returns back model instances.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :param data: The namespace if it has already been read
+        :type data: dict or None
+        :returns: A list of models
+        :rtype: list
+        """
         results = []
-        path = _model_mapper[model_instance.__class__.__name__]
-        data = self._store.get(self._endpoint + path).json()
-        items = {}
-        # FIXME: This works but it's a hack
-        for k, v in data.get('metadata', {}).get('annotations', {}).items():
-            parts = k.split('-')
-            if parts[1] == model_instance._list_class.__name__.lower():
-                if not items.get(parts[2]):
-                    items[parts[2]] = {}
-                items[parts[2]][k] = v
-
-        for item in items.values():
+        if data is None:
+            path = _model_mapper[model_instance.__class__.__name__]
+            data = self._read(path)
+        index = _index_annotations(
+            data.get('metadata', {}).get('annotations', {}))
+        list_class = model_instance._list_class
+        for primary_key in index.get(list_class.__name__.lower(), {}):
             try:
-                results.append(self._format_model({
-                    'metadata': {'annotations': item}},
-                    model_instance._list_class.new(), True))
+                results.append(self._build_model(
+                    list_class.new(), index, primary_key))
             except (TypeError, KeyError):
                 # TODO: Add logging
                 pass
 
         return model_instance.new(**{model_instance._list_attr: results})
 
-    def _list_host(self, model_instance):
+    def _list_changes(self, model_instance, since):
+        """
+        Lists the models which changed after a resourceVersion. Models
+        stored on a namespace are all listed when the namespace changed and
+        none are when it did not. Nodes change with every status update, so
+        every host is always listed.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param since: The resourceVersion, or None for every model
+        :type since: str or None
+        :returns: A (revision, model_instance, deleted) tuple
+        :rtype: tuple
+        """
+        class_name = model_instance.__class__.__name__
+        if (class_name in ('Host', 'Hosts') or
+                self._on_configmap(model_instance)):
+            return StoreHandlerBase._list_changes(self, model_instance, since)
+        data = self._read(_model_mapper[class_name])
+        revision = data.get('metadata', {}).get('resourceVersion')
+        if since is not None and str(since) == revision:
+            return (revision, model_instance.new(
+                **{model_instance._list_attr: []}), [])
+        return (revision, self._list_on_namespace(model_instance, data), None)
+
+    def _revision(self, model_instance):
+        """
+        Returns the resourceVersion of the namespace for models stored on
+        it, or of the list of labeled nodes for hosts.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The resourceVersion, or None for models stored as
+                  ConfigMaps
+        :rtype: str or None
+        """
+        if self._on_configmap(model_instance):
+            return None
+        path = _model_mapper[model_instance.__class__.__name__]
+        mirror = self._mirrors.get(path)
+        if mirror is not None:
+            mirror.start()
+            return mirror.resource_version
+        if path == '/nodes/':
+            # One node is enough for the list's resourceVersion.
+            response = self._store.get(
+                self._endpoint + '/nodes',
+                params={'labelSelector': _selector(_node_labels), 'limit': 1})
+            response.raise_for_status()
+            data = response.json()
+        else:
+            data = self._read(path)
+        return data.get('metadata', {}).get('resourceVersion')
+
+    def _list_host(self, model_instance, secrets=True):
         """
         Lists data at a location in a store and returns back model instances.
+        Only labeled nodes are listed, a page at a time, and host secrets
+        are read with one request for all hosts.
 
         :param model_instance: Model instance to search for and list
         :type model_instance: commissaire.model.Model
+        :param secrets: Whether host secrets are needed
+        :type secrets: bool
         :returns: A list of models
         :rtype: list
         """
         hosts = []
         path = _model_mapper[model_instance.__class__.__name__]
-        items = self._store.get(self._endpoint + path).json()
-        for item in items.get('items'):
+        host_secrets = {}
+        if secrets:
+            host_secrets = self._list_secrets()
+        if path in self._mirrors:
+            items = self._read(path).get('items')
+        else:
+            self._label_nodes()
+            items = (
+                item for data in _iter_pages(
+                    self._store, self._endpoint + path,
+                    {'labelSelector': _selector(_node_labels)},
+                    self._page_size)
+                for item in data.get('items') or [])
+        for item in items:
             try:
-                hosts.append(self._format_model(item, Host.new(), True))
+                host_secret = {}
+                if secrets:
+                    name = item.get('metadata', {}).get('name')
+                    host_secret = host_secrets.get(name)
+                    if host_secret is None:
+                        host_secret = self._get_secret(name)
+                        self._label_secret(name)
+                hosts.append(self._format_model(
+                    item, Host.new(), True, host_secret))
             except (TypeError, KeyError):
                 # TODO: Add logging
                 pass
 
         return Hosts.new(hosts=hosts)
 
+    def _list_attributes(self, model_instance, attributes):
+        """
+        Lists models with at least the given attributes populated. Hosts
+        are listed without reading secrets unless credentials are needed.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :param attributes: Names of the attributes needed
+        :type attributes: tuple
+        :returns: A list of models
+        :rtype: list
+        """
+        if (model_instance.__class__.__name__ == 'Hosts' and
+                not set(attributes) & set(Host._hidden_attributes)):
+            return self._list_host(model_instance, secrets=False)
+        return self._list(model_instance)
+
+    def _list_page(self, model_instance, filters, attributes=None,
+                   limit=None, cursor=None):
+        """
+        Lists the models matching every filter in primary key order,
+        starting after a cursor. Hosts are read a page of nodes at a time
+        with the apiserver's limit and continue parameters until enough
+        of them matched. Their cursor holds the continue token of the
+        page the next host is on and the last address listed.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param filters: Attribute name -> accepted values
+        :type filters: dict
+        :param attributes: Names of the attributes needed, or None for
+                           complete models
+        :type attributes: tuple or None
+        :param limit: Most models to list, or None for every model
+        :type limit: int or None
+        :param cursor: A cursor returned for the previous page, or None
+        :type cursor: str or None
+        :returns: A (model_instance, cursor) pair where cursor continues
+                  after this page or is None on the last page
+        :rtype: tuple
+        """
+        path = _model_mapper[model_instance.__class__.__name__]
+        if (model_instance.__class__.__name__ != 'Hosts' or
+                path in self._mirrors or 'address' in filters or
+                (limit is None and cursor is None)):
+            return StoreHandlerBase._list_page(
+                self, model_instance, filters, attributes, limit, cursor)
+        # None reads each host's secret, an empty dict leaves them out.
+        secrets = {}
+        if attributes is None or (
+                set(attributes) & set(Host._hidden_attributes)):
+            secrets = None
+        token, after = None, None
+        if cursor is not None:
+            token, _, after = cursor.rpartition(' ')
+        params = {'labelSelector': _selector(_node_labels)}
+        if token:
+            params['continue'] = token
+
+        self._label_nodes()
+        hosts = []
+        for data in _iter_pages(
+                self._store, self._endpoint + path, params,
+                self._page_size):
+            for item in data.get('items') or []:
+                address = item.get('metadata', {}).get('name')
+                if after is not None and address <= after:
+                    continue
+                try:
+                    host = self._format_model(item, Host.new(), True, secrets)
+                except (TypeError, KeyError):
+                    continue
+                if not model_matches(host, filters):
+                    continue
+                if limit is not None and len(hosts) == limit:
+                    return (Hosts.new(hosts=hosts), '{0} {1}'.format(
+                        token or '', hosts[-1].address))
+                hosts.append(host)
+            token = data.get('metadata', {}).get('continue')
+        return (Hosts.new(hosts=hosts), None)
+
+    def _on_configmap(self, model_instance):
+        """
+        Returns whether a model is stored as a ConfigMap of its own.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: True if the model is stored as a ConfigMap
+        :rtype: bool
+        """
+        return self._configmaps and _model_mapper.get(
+            model_instance.__class__.__name__) == '/namespaces/default/'
+
+    def _configmap_name(self, model_instance):
+        """
+        Returns the name of the ConfigMap which holds a model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The ConfigMap name
+        :rtype: str
+        """
+        name = 'commissaire-' + model_instance.__class__.__name__.lower()
+        if model_instance._primary_key is None:
+            return name
+        return name + '-' + model_instance.primary_key
+
+    def _configmap_data(self, model_instance):
+        """
+        Returns the ConfigMap data of a model. Members are stored as their
+        own {attribute}.{member} keys.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: Key -> string value
+        :rtype: dict
+        """
+        data = {}
+        member = _member_mapper.get(model_instance.__class__.__name__)
+        for x in model_instance._attribute_map.keys():
+            value = getattr(model_instance, x)
+            if member is not None and x == member[1]:
+                for address in value or []:
+                    data['{0}.{1}'.format(x, address)] = address
+                continue
+            # If the value is iterable (list, dict) turn it into a json string
+            if hasattr(value, '__iter__'):
+                value = 'json:' + json.dumps(value)
+            # Skip any empty values
+            if value:
+                data[x] = str(value)
+        return data
+
+    def _format_configmap(self, config_map, model_instance):
+        """
+        Creates a model from the ConfigMap which holds it.
+
+        :param config_map: The ConfigMap
+        :type config_map: dict
+        :param model_instance: Model instance to create
+        :type model_instance: commissaire.model.Model
+        :returns: The model instance
+        :rtype: commissaire.model.Model
+        :raises: KeyError
+        """
+        kwargs = {}
+        member = _member_mapper.get(model_instance.__class__.__name__)
+        if member is not None:
+            kwargs[member[1]] = []
+        for k, v in (config_map.get('data') or {}).items():
+            if member is not None and k.startswith(member[1] + '.'):
+                kwargs[member[1]].append(v)
+            elif k in model_instance._attribute_map.keys():
+                # Deserialize any json structs
+                if v.startswith('json:'):
+                    v = json.loads(v[5:])
+                kwargs[k] = v
+        if member is not None:
+            kwargs[member[1]].sort()
+
+        try:
+            model = model_instance.__class__.new(**kwargs)
+            model._coerce()
+            return model
+        except TypeError as te:
+            raise KeyError(
+                'Caught {0}: {1}'.format(
+                    te.__class__.__name__, te.args[0]), te)
+
+    def _read_configmap(self, model_instance):
+        """
+        Reads the ConfigMap which holds a model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The ConfigMap
+        :rtype: dict
+        :raises: KeyError
+        """
+        response = self._store.get(
+            self._endpoint + _lease_path +
+            self._configmap_name(model_instance))
+        if response.status_code != requests.codes.OK:
+            raise KeyError('No data for {0}: {1}'.format(
+                self._configmap_name(model_instance), response.status_code))
+        return response.json()
+
+    def _save_configmap(self, model_instance):
+        """
+        Saves a model as a ConfigMap of its own, replacing what it held
+        apart from the members of an existing record.
+
+        :param model_instance: Model instance to save
+        :type model_instance: commissaire.model.Model
+        :returns: The saved model instance
+        :rtype: commissaire.model.Model
+        """
+        name = self._configmap_name(model_instance)
+        config_map = {
+            'apiVersion': _API_VERSION,
+            'kind': 'ConfigMap',
+            'metadata': {
+                'name': name,
+                'labels': {
+                    _model_label: model_instance.__class__.__name__.lower()},
+            },
+            'data': self._configmap_data(model_instance),
+        }
+        member = _member_mapper.get(model_instance.__class__.__name__)
+        if member is None:
+            response = self._store.put(
+                self._endpoint + _lease_path + name, json=config_map)
+            if response.status_code == requests.codes.NOT_FOUND:
+                response = self._store.post(
+                    self._endpoint + _lease_path, json=config_map)
+        else:
+            # Members are only written when the ConfigMap is created, after
+            # that they change through the hostset operations.
+            response = self._store.post(
+                self._endpoint + _lease_path, json=config_map)
+            if response.status_code == requests.codes.CONFLICT:
+                data = dict.fromkeys(
+                    x for x in model_instance._attribute_map.keys()
+                    if x != member[1])
+                data.update((k, v) for k, v in config_map['data'].items()
+                            if not k.startswith(member[1] + '.'))
+                response = self._store.patch(
+                    self._endpoint + _lease_path + name,
+                    json={'data': data},
+                    headers={'Content-Type': 'application/merge-patch+json'})
+        if response.status_code not in (
+                requests.codes.OK, requests.codes.CREATED):
+            raise KeyError('Could not save {0}: {1}'.format(
+                name, response.status_code))
+        return self._format_configmap(response.json(), model_instance)
+
+    def _get_configmap(self, model_instance):
+        """
+        Returns a model stored as a ConfigMap of its own.
+
+        :param model_instance: Model instance to search and return
+        :type model_instance: commissaire.model.Model
+        :returns: The model instance
+        :rtype: commissaire.model.Model
+        """
+        return self._format_configmap(
+            self._read_configmap(model_instance), model_instance)
+
+    def _delete_configmap(self, model_instance):
+        """
+        Deletes the ConfigMap which holds a model.
+
+        :param model_instance: Model instance to delete
+        :type model_instance: commissaire.model.Model
+        """
+        response = self._store.delete(
+            self._endpoint + _lease_path +
+            self._configmap_name(model_instance))
+        if response.status_code != requests.codes.OK:
+            raise KeyError(response.text)
+
+    def _list_configmap(self, model_instance):
+        """
+        Lists the models of a class stored as ConfigMaps, selecting them
+        by label a page at a time.
+
+        :param model_instance: Model instance to search for and list
+        :type model_instance: commissaire.model.Model
+        :returns: A list of models
+        :rtype: list
+        """
+        results = []
+        list_class = model_instance._list_class
+        for data in _iter_pages(
+                self._store, self._endpoint + _lease_path,
+                {'labelSelector': _selector(
+                    {_model_label: list_class.__name__.lower()})},
+                self._page_size):
+            for item in data.get('items') or []:
+                try:
+                    results.append(
+                        self._format_configmap(item, list_class.new()))
+                except (TypeError, KeyError):
+                    # TODO: Add logging
+                    pass
+        return model_instance.new(**{model_instance._list_attr: results})
+
+    def _configmap_member_patch(self, model_instance, address, operations):
+        """
+        Patches a single member key of a model stored as a ConfigMap if the
+        model exists.
+
+        :param model_instance: Model instance which owns the member set
+        :type model_instance: commissaire.model.Model
+        :param address: The member
+        :type address: str
+        :param operations: Returns the patch operations for a member path
+        :type operations: callable
+        :raises: KeyError
+        """
+        attribute = _member_mapper[model_instance.__class__.__name__][1]
+        full_patch = [{
+            'op': 'test',
+            'path': '/data/' + model_instance._primary_key,
+            'value': model_instance.primary_key}]
+        full_patch.extend(operations('/data/{0}.{1}'.format(
+            attribute, address)))
+        response = self._store.patch(
+            self._endpoint + _lease_path +
+            self._configmap_name(model_instance),
+            json=full_patch,
+            headers={'Content-Type': 'application/json-patch+json'})
+        if response.status_code != requests.codes.OK:
+            raise KeyError('No data for {0}: {1}'.format(
+                model_instance.primary_key, response.status_code))
+
+    def _read_lease(self, name):
+        """
+        Reads the ConfigMap of a lease and the lease record it holds.
+
+        :param name: Name of the lease
+        :type name: str
+        :returns: A (config_map, record) pair, both None if there is no
+                  such lease
+        :rtype: tuple
+        """
+        response = self._store.get(
+            self._endpoint + _lease_path + 'commissaire-lease-' + name)
+        if response.status_code == requests.codes.NOT_FOUND:
+            return (None, None)
+        config_map = response.json()
+        try:
+            record = json.loads(config_map.get('metadata', {}).get(
+                'annotations', {}).get(_lease_annotation, '{}'))
+        except ValueError:
+            record = {}
+        return (config_map, record)
+
+    def _write_lease(self, name, config_map, record):
+        """
+        Writes a lease record. Creating a ConfigMap fails if another process
+        created it first and replacing one fails if its resourceVersion
+        changed since it was read.
+
+        :param name: Name of the lease
+        :type name: str
+        :param config_map: The ConfigMap as read or None to create it
+        :type config_map: dict or None
+        :param record: The lease record
+        :type record: dict
+        :returns: True if the record was written
+        :rtype: bool
+        """
+        if config_map is None:
+            response = self._store.post(self._endpoint + _lease_path, json={
+                'kind': 'ConfigMap',
+                'apiVersion': _API_VERSION,
+                'metadata': {
+                    'name': 'commissaire-lease-' + name,
+                    'annotations': {_lease_annotation: json.dumps(record)},
+                },
+            })
+            return response.status_code == requests.codes.CREATED
+        metadata = config_map.setdefault('metadata', {})
+        if not metadata.get('annotations'):
+            metadata['annotations'] = {}
+        metadata['annotations'][_lease_annotation] = json.dumps(record)
+        response = self._store.put(
+            self._endpoint + _lease_path + 'commissaire-lease-' + name,
+            json=config_map)
+        return response.status_code == requests.codes.OK
+
+    def _acquire_lease(self, name, holder, ttl):
+        """
+        Acquires or renews a lease stored as an annotation on a ConfigMap.
+        Expiry is judged by the clock of the process asking for the lease.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process asking for the lease
+        :type holder: str
+        :param ttl: Seconds the lease is held for
+        :type ttl: int
+        :returns: True if the holder now holds the lease
+        :rtype: bool
+        """
+        now = time.time()
+        config_map, record = self._read_lease(name)
+        if (record and record.get('holder') != holder and
+                record.get('renew_time', 0) + record.get('ttl', 0) > now):
+            return False
+        return self._write_lease(name, config_map, {
+            'holder': holder, 'renew_time': now, 'ttl': ttl})
+
+    def _release_lease(self, name, holder):
+        """
+        Releases a lease if it is held by the holder by expiring it.
+
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process releasing the lease
+        :type holder: str
+        """
+        config_map, record = self._read_lease(name)
+        if record and record.get('holder') == holder:
+            self._write_lease(name, config_map, {
+                'holder': holder, 'renew_time': time.time(), 'ttl': 0})
+
 
 StoreHandler = KubernetesStoreHandler
@@ -0,0 +1,300 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Online migration of models between store handlers.
+"""
+
+import hashlib
+import logging
+
+from commissaire.handlers.models import (
+    ClusterDeploy, ClusterRestart, ClusterUpgrade, Clusters, Hosts, Networks)
+from commissaire.store import model_fingerprint
+
+#: List models used to enumerate every stored instance of their list class
+_list_models = (Clusters, Hosts, Networks)
+
+#: Models which are stored once per cluster and keyed by the cluster name
+_cluster_models = (ClusterDeploy, ClusterRestart, ClusterUpgrade)
+
+
+def iter_stored_models(store_manager, model_types, get_handler=None):
+    """
+    Yields every stored instance of the given model types. Model types
+    with nothing stored are skipped, any other read error is raised so a
+    partial read is never mistaken for a complete one.
+
+    :param store_manager: The store manager to read through
+    :type store_manager: commissaire.store.storehandlermanager.
+                         StoreHandlerManager
+    :param model_types: Model types to read
+    :type model_types: tuple
+    :param get_handler: Returns the handler to read a model from. Defaults
+                        to the registered handler. Clusters are read from
+                        the registered handler when it returns None.
+    :type get_handler: callable or None
+    :returns: Generator of model instances
+    :rtype: generator
+    """
+    if get_handler is None:
+        get_handler = store_manager._get_handler
+
+    for list_model in _list_models:
+        if list_model._list_class not in model_types:
+            continue
+        handler = get_handler(list_model.new())
+        try:
+            for item in handler._iter_list(list_model.new()):
+                yield item
+        except handler.NOT_FOUND_ERRORS:
+            # Nothing stored yet.
+            pass
+
+    cluster_models = [x for x in _cluster_models if x in model_types]
+    if not cluster_models:
+        return
+    # Operations are stored by cluster name, so each side looks them up
+    # for its own clusters. Records left for clusters the other side has
+    # deleted are found that way.
+    handler = (get_handler(Clusters.new()) or
+               store_manager._get_handler(Clusters.new()))
+    try:
+        clusters = handler._list(Clusters.new()).clusters
+    except handler.NOT_FOUND_ERRORS:
+        clusters = []
+    for cluster in clusters:
+        for cls in cluster_models:
+            handler = get_handler(cls.new())
+            try:
+                yield handler._get(cls.new(name=cluster.name))
+            except handler.NOT_FOUND_ERRORS:
+                # No such operation has been recorded.
+                pass
+
+
+class MigrationError(Exception):
+    """
+    Exception class for failed store migrations.
+    """
+    pass
+
+
+class StoreMigration(object):
+    """
+    Streams models from their registered store handler to another store
+    handler. While the migration runs every write is dual-written to both
+    handlers. Once the copy verifies, reads are cut over to the new handler
+    and the old handler keeps receiving writes until the next restart.
+    """
+
+    def __init__(self, store_manager, handler_type, config,
+                 model_types, batch_size=100):
+        """
+        Creates a new StoreMigration instance.
+
+        :param store_manager: The store manager to migrate
+        :type store_manager: commissaire.store.storehandlermanager.
+                             StoreHandlerManager
+        :param handler_type: A class derived from StoreHandler
+        :type handler_type: type
+        :param config: Configuration parameters for the handler
+        :type config: dict
+        :param model_types: Model types to migrate
+        :type model_types: tuple
+        :param batch_size: Number of models written per batch
+        :type batch_size: int
+        """
+        self.store_manager = store_manager
+        self.handler_type = handler_type
+        self.config = config
+        model_types = set(model_types)
+        # Listing a model type requires its list model to move with it.
+        model_types.update(
+            [x for x in _list_models if x._list_class in model_types])
+        self.model_types = tuple(model_types)
+        self.batch_size = batch_size
+        self.logger = logging.getLogger('store')
+
+    def start(self):
+        """
+        Starts dual-writing the migrated model types to the new handler.
+        This must be called before the store manager is handed to worker
+        processes so they dual-write as well.
+
+        :raises: commissaire.store.ConfigurationError
+        """
+        self.store_manager.register_mirror_handler(
+            self.handler_type, self.config, *self.model_types)
+        self.logger.info('Dual-writing {0} to {1}'.format(
+            ', '.join(sorted(x.__name__ for x in self.model_types)),
+            self.handler_type.__name__))
+
+    def _iter_models(self, get_handler):
+        """
+        Yields every stored instance of the migrated model types.
+
+        :param get_handler: Returns the handler to read a model from
+        :type get_handler: callable
+        :returns: Generator of model instances
+        :rtype: generator
+        """
+        return iter_stored_models(
+            self.store_manager, self.model_types, get_handler)
+
+    def _batches(self, models):
+        """
+        Groups models into lists of at most batch_size.
+
+        :param models: Iterable of models
+        :type models: iterable
+        :returns: Generator of lists of models
+        :rtype: generator
+        """
+        batch = []
+        for model in models:
+            batch.append(model)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def copy(self):
+        """
+        Streams every migrated model from the current handler to the new
+        handler in batches.
+
+        :returns: The number of models copied
+        :rtype: int
+        """
+        copied = 0
+        for batch in self._batches(
+                self._iter_models(self.store_manager._get_handler)):
+            for model in batch:
+                mirror = self.store_manager._get_mirror_handler(model)
+                mirror._save(model)
+                mirror._replace_hostset(model)
+            copied += len(batch)
+            self.logger.info('Migrated {0} models to {1}'.format(
+                copied, self.handler_type.__name__))
+        return copied
+
+    def _summarize(self, get_handler):
+        """
+        Returns fingerprints of every migrated model as read by a handler.
+
+        :param get_handler: Returns the handler to read a model from
+        :type get_handler: callable
+        :returns: Class name -> primary key -> fingerprint
+        :rtype: dict
+        """
+        summary = {}
+        for model in self._iter_models(get_handler):
+            summary.setdefault(model.__class__.__name__, {})[
+                model.primary_key] = model_fingerprint(model)
+        return summary
+
+    def verify(self):
+        """
+        Compares counts and checksums of the migrated models on both
+        handlers.
+
+        :returns: A (report, mismatched) tuple. The report maps class names
+                  to counts and checksums, mismatched is a list of
+                  (class_name, primary_key) pairs which differ.
+        :rtype: tuple
+        """
+        source = self._summarize(self.store_manager._get_handler)
+        destination = self._summarize(self.store_manager._get_mirror_handler)
+
+        def checksum(fingerprints):
+            return hashlib.sha1(''.join(
+                sorted(k + v for k, v in fingerprints.items()))).hexdigest()
+
+        report = {}
+        mismatched = []
+        for class_name in set(source.keys()) | set(destination.keys()):
+            src = source.get(class_name, {})
+            dst = destination.get(class_name, {})
+            report[class_name] = {
+                'source_count': len(src),
+                'destination_count': len(dst),
+                'source_checksum': checksum(src),
+                'destination_checksum': checksum(dst),
+            }
+            for key in set(src.keys()) | set(dst.keys()):
+                if src.get(key) != dst.get(key):
+                    mismatched.append((class_name, key))
+            self.logger.info('Verified {0}: {1}'.format(
+                class_name, report[class_name]))
+        return (report, mismatched)
+
+    def repair(self, mismatched):
+        """
+        Re-copies mismatched models from the current handler, removing
+        models from the new handler which no longer exist. Errors other
+        than a model not being stored are raised.
+
+        :param mismatched: List of (class_name, primary_key) pairs
+        :type mismatched: list
+        """
+        classes = {x.__name__: x for x in self.model_types}
+        for class_name, key in mismatched:
+            cls = classes[class_name]
+            model = cls.new(**{cls._primary_key: key})
+            mirror = self.store_manager._get_mirror_handler(model)
+            handler = self.store_manager._get_handler(model)
+            try:
+                model = handler._get(model)
+            except handler.NOT_FOUND_ERRORS:
+                self.logger.debug('Removing {0} {1} from {2}'.format(
+                    class_name, key, self.handler_type.__name__))
+                mirror._delete(model)
+                continue
+            mirror._save(model)
+            mirror._replace_hostset(model)
+
+    def cutover(self):
+        """
+        Serves reads of the migrated model types from the new handler.
+        """
+        self.store_manager.cutover(*self.model_types)
+        self.logger.info('Cut over {0} to {1}'.format(
+            ', '.join(sorted(x.__name__ for x in self.model_types)),
+            self.handler_type.__name__))
+
+    def run(self):
+        """
+        Copies, verifies and cuts over. Models changed by concurrent
+        writes during the copy are repaired once before giving up.
+
+        :returns: The verification report
+        :rtype: dict
+        :raises: MigrationError
+        """
+        self.copy()
+        report, mismatched = self.verify()
+        if mismatched:
+            self.logger.info('Repairing {0} mismatched models'.format(
+                len(mismatched)))
+            self.repair(mismatched)
+            report, mismatched = self.verify()
+        if mismatched:
+            raise MigrationError(
+                'Migration to {0} did not verify for {1} models'.format(
+                    self.handler_type.__name__, len(mismatched)),
+                mismatched)
+        self.cutover()
+        return report
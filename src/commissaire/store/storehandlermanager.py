@@ -13,14 +13,98 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
+import os
 
+from collections import namedtuple
 from copy import deepcopy
 
 from commissaire.model import ValidationError
 from commissaire.store import ConfigurationError
 
 
+#: StoreHandlerManagers resolved from descriptors in this process.
+_resolved_managers = {}
+#: The process id which owns _resolved_managers.
+_resolved_pid = None
+
+
+class StoreHandlerManagerDescriptor(
+        namedtuple('StoreHandlerManagerDescriptor', ('entries', 'mirrors'))):
+    """
+    Immutable and picklable description of a StoreHandlerManager's
+    configuration. Descriptors are cheap to pass to subprocesses and
+    resolve to a single long lived StoreHandlerManager per process.
+
+    Each entry and mirror is a (handler_type, config_json, model_types)
+    triple.
+    """
+
+    __slots__ = ()
+
+    def resolve(self):
+        """
+        Returns the StoreHandlerManager for this descriptor, creating it
+        the first time it is requested in the current process. Handlers
+        and connections created by the manager are reused by every later
+        caller resolving an equal descriptor.
+
+        :returns: A StoreHandlerManager
+        :rtype: commissaire.store.storehandlermanager.StoreHandlerManager
+        """
+        global _resolved_pid
+        # Connections must never be shared with a forked parent.
+        if _resolved_pid != os.getpid():
+            _resolved_managers.clear()
+            _resolved_pid = os.getpid()
+
+        manager = _resolved_managers.get(self)
+        if manager is None:
+            manager = StoreHandlerManager()
+            for handler_type, config_json, model_types in self.entries:
+                manager.register_store_handler(
+                    handler_type, json.loads(config_json), *model_types)
+            for handler_type, config_json, model_types in self.mirrors:
+                manager.register_mirror_handler(
+                    handler_type, json.loads(config_json), *model_types)
+            _resolved_managers[self] = manager
+        return manager
+
+
+def _assigned_entries(registry):
+    """
+    Returns the unique entries of a model registry, each paired with the
+    model types which are currently assigned to it.
+
+    :param registry: Model type -> (handler_type, config, model_types)
+    :type registry: dict
+    :returns: List of (handler_type, config, model_types) triples
+    :rtype: list
+    """
+    assigned = {}
+    for mt, entry in registry.items():
+        assigned.setdefault(id(entry), (entry, []))[1].append(mt)
+    return [(entry[0], entry[1],
+             tuple(sorted(mts, key=lambda mt: getattr(mt, '__name__', ''))))
+            for entry, mts in assigned.values()]
+
+
+def resolve_store_manager(store_manager):
+    """
+    Returns a usable StoreHandlerManager from either a manager or a
+    StoreHandlerManagerDescriptor.
+
+    :param store_manager: A store manager or a descriptor of one
+    :type store_manager: StoreHandlerManager or StoreHandlerManagerDescriptor
+    :returns: A StoreHandlerManager
+    :rtype: commissaire.store.storehandlermanager.StoreHandlerManager
+    """
+    if isinstance(store_manager, StoreHandlerManagerDescriptor):
+        return store_manager.resolve()
+    return store_manager
+
+
 class StoreHandlerManager(object):
     """
     Configures StoreHandler instances and routes storage requests to
@@ -38,8 +122,16 @@ class StoreHandlerManager(object):
         # Stash them here to include them in list_store_handlers().
         self._registry_extras = []
 
+        # Model types -> secondary handler entries which receive a copy
+        # of every write. Used to dual-write while migrating stores.
+        self._mirror_registry = {}
+        self._mirror_handlers = {}
+
         self._container_managers = []
 
+        self._metrics = dict.fromkeys(
+            ('save', 'save_skipped', 'get', 'delete', 'list'), 0)
+
         # Logger objects can't be pickled, so fetch ours lazily so
         # cloned StoreHandlerManagers can be passed to subprocesses.
         self.__logger = None
@@ -52,11 +144,33 @@ class StoreHandlerManager(object):
         clone = StoreHandlerManager()
         clone._registry = deepcopy(self._registry)
         clone._registry_extras = deepcopy(self._registry_extras)
+        clone._mirror_registry = deepcopy(self._mirror_registry)
         # clone._handlers should remain empty.
         # clone._container_managers should remain empty.
         # clone.__loggers should remain None.
         return clone
 
+    def descriptor(self):
+        """
+        Returns an immutable, picklable descriptor of this manager's
+        configuration. Unlike clone() the descriptor carries no mutable
+        state and resolves to a long lived manager in the receiving process.
+
+        :returns: A descriptor for this manager's configuration
+        :rtype: StoreHandlerManagerDescriptor
+        """
+        def freeze(registry):
+            return tuple(
+                (handler_type, json.dumps(config, sort_keys=True), mts)
+                for handler_type, config, mts in _assigned_entries(registry))
+
+        extras = tuple(
+            (handler_type, json.dumps(config, sort_keys=True), ())
+            for handler_type, config, _ in self._registry_extras)
+        return StoreHandlerManagerDescriptor(
+            freeze(self._registry) + extras,
+            freeze(self._mirror_registry))
+
     def register_store_handler(self, handler_type, config, *model_types):
         """
         Associates a StoreHandler subclass with one or more model types.
@@ -85,6 +199,67 @@ class StoreHandlerManager(object):
         else:
             self._registry_extras.append(entry)
 
+    def register_mirror_handler(self, handler_type, config, *model_types):
+        """
+        Associates a secondary StoreHandler subclass with one or more model
+        types. Every save and delete of those models is repeated on the
+        mirror after it succeeds on the primary handler. Reads are never
+        served by a mirror.
+
+        :param handler_type: A class derived from StoreHandler
+        :type handler_type: type
+        :param config: Configuration parameters for the handler
+        :type config: dict
+        :param model_types: Model types to mirror
+        :type module_types: tuple
+        """
+        handler_type.check_config(config)
+        entry = (handler_type, config, model_types)
+        for mt in model_types:
+            if mt in self._mirror_registry:
+                conflicting_type, _, _ = self._mirror_registry[mt]
+                raise ConfigurationError(
+                    'Model "{0}" already mirrored to "{1}"'.format(
+                        getattr(mt, '__name__', '?'),
+                        getattr(conflicting_type, '__module__', '?')))
+        for mt in model_types:
+            self._mirror_registry[mt] = entry
+
+    def unregister_mirror_handler(self, *model_types):
+        """
+        Stops mirroring writes for the given model types.
+
+        :param model_types: Model types to stop mirroring
+        :type module_types: tuple
+        """
+        for mt in model_types:
+            self._mirror_registry.pop(mt, None)
+            self._mirror_handlers.pop(mt, None)
+
+    def cutover(self, *model_types):
+        """
+        Swaps the primary and mirror handlers for the given model types.
+        Reads are then served by the former mirror while the former
+        primary keeps receiving a copy of every write.
+
+        :param model_types: Model types to cut over
+        :type module_types: tuple
+        :raises: KeyError if a model type has no mirror
+        """
+        for mt in model_types:
+            if mt not in self._mirror_registry:
+                raise KeyError('Model "{0}" has no mirror'.format(
+                    getattr(mt, '__name__', '?')))
+        for mt in model_types:
+            self._registry[mt], self._mirror_registry[mt] = (
+                self._mirror_registry[mt], self._registry[mt])
+            primary = self._handlers.pop(mt, None)
+            mirror = self._mirror_handlers.pop(mt, None)
+            if mirror is not None:
+                self._handlers[mt] = mirror
+            if primary is not None:
+                self._mirror_handlers[mt] = primary
+
     def list_store_handlers(self):
         """
         Returns all registered store handlers as a list of triples.
@@ -95,7 +270,11 @@ class StoreHandlerManager(object):
         :rtype: list
         """
         # This collects all unique instances from the registry.
-        entries = {id(x): x for x in self._registry.values()}.values()
+        entries = {id(x): x for x in self._registry.values()}
+        # Mirrors are still configured backends even if they own no reads.
+        for x in self._mirror_registry.values():
+            entries.setdefault(id(x), x)
+        entries = entries.values()
         entries.extend(self._registry_extras)
         return entries
 
@@ -147,11 +326,45 @@ class StoreHandlerManager(object):
         handler = self._handlers.get(type(model))
         if handler is None:
             # Let this raise a KeyError if the registry lookup fails.
-            handler_type, config, model_types = self._registry[type(model)]
+            entry = self._registry[type(model)]
+            handler_type, config, model_types = entry
+            handler = handler_type(config)
+            self._handlers.update({
+                mt: handler for mt in model_types
+                if self._registry.get(mt) is entry})
+        return handler
+
+    def _get_mirror_handler(self, model):
+        """
+        Looks up, and if necessary instantiates, the mirror StoreHandler
+        instance for the given model.
+
+        :returns: The mirror handler or None if the model is not mirrored
+        :rtype: commissaire.store.StoreHandlerBase or None
+        """
+        handler = self._mirror_handlers.get(type(model))
+        if handler is None:
+            entry = self._mirror_registry.get(type(model))
+            if entry is None:
+                return None
+            handler_type, config, model_types = entry
             handler = handler_type(config)
-            self._handlers.update({mt: handler for mt in model_types})
+            self._mirror_handlers.update({
+                mt: handler for mt in model_types
+                if self._mirror_registry.get(mt) is entry})
         return handler
 
+    def metrics(self):
+        """
+        Returns counters of store operations made through this manager.
+        Saves the store found to change nothing are counted in
+        ``save_skipped`` and not in ``save``.
+
+        :returns: Operation name -> count
+        :rtype: dict
+        """
+        return dict(self._metrics)
+
     def _get_logger(self):
         """
         Returns the 'store' logger for debug messages.
@@ -181,10 +394,61 @@ class StoreHandlerManager(object):
             logger.error(ve.args[0], ve.args[1])
             raise ve
         logger.debug('> SAVE {0}'.format(model_instance))
-        model_instance = handler._save(model_instance)
-        logger.debug('< SAVE {0}'.format(model_instance))
+        model_instance, written = handler._save_if_changed(model_instance)
+        if written:
+            self._metrics['save'] += 1
+            logger.debug('< SAVE {0}'.format(model_instance))
+        else:
+            self._metrics['save_skipped'] += 1
+            logger.debug('= SAVE {0} unchanged'.format(model_instance))
+        mirror = self._get_mirror_handler(model_instance)
+        if mirror is not None:
+            try:
+                mirror._save(model_instance)
+            except Exception as error:
+                logger.warn('Mirror SAVE of {0} failed: {1}: {2}'.format(
+                    model_instance, type(error), error))
         return model_instance
 
+    def save_all(self, *model_instances):
+        """
+        Saves several models. When every model is handled by the same
+        store handler they are saved in a single call, which is atomic
+        for handlers supporting transactions.
+
+        :param model_instances: Model instances to save
+        :type model_instances: tuple
+        :returns: The saved model instances
+        :rtype: list
+        """
+        logger = self._get_logger()
+        handlers = [self._get_handler(x) for x in model_instances]
+        if len(set(id(x) for x in handlers)) != 1:
+            return [self.save(x) for x in model_instances]
+
+        for model_instance in model_instances:
+            try:
+                model_instance._validate()
+            except ValidationError as ve:
+                logger.error(ve.args[0], ve.args[1])
+                raise ve
+
+        logger.debug('> SAVE ALL {0}'.format(list(model_instances)))
+        saved, written = handlers[0]._save_all_if_changed(
+            list(model_instances))
+        self._metrics['save'] += written
+        self._metrics['save_skipped'] += len(model_instances) - written
+        for model_instance in model_instances:
+            mirror = self._get_mirror_handler(model_instance)
+            if mirror is not None:
+                try:
+                    mirror._save(model_instance)
+                except Exception as error:
+                    logger.warn('Mirror SAVE of {0} failed: {1}: {2}'.format(
+                        model_instance, type(error), error))
+        logger.debug('< SAVE ALL {0}'.format(saved))
+        return list(model_instances)
+
     def get(self, model_instance):
         """
         Returns data from a store and returns back a model.
@@ -193,17 +457,25 @@ class StoreHandlerManager(object):
         :type model_instance: commissaire.model.Model
         :returns: The saved model instance
         :rtype: commissaire.model.Model
+        :raises: KeyError if the model is not stored
         """
         logger = self._get_logger()
         handler = self._get_handler(model_instance)
         logger.debug('> GET {0}'.format(model_instance))
-        model_instance = handler._get(model_instance)
+        try:
+            model_instance = handler._get(model_instance)
+        except KeyError:
+            raise
+        except handler.NOT_FOUND_ERRORS as error:
+            # Callers only handle KeyError, whatever the store.
+            raise KeyError('{0}: {1}'.format(type(error).__name__, error))
         # Validate after getting
         try:
             model_instance._validate()
         except ValidationError as ve:
             logger.error(ve.args[0], ve.args[1])
             raise ve
+        self._metrics['get'] += 1
         logger.debug('< GET {0}'.format(model_instance))
         return model_instance
 
@@ -218,19 +490,275 @@ class StoreHandlerManager(object):
         handler = self._get_handler(model_instance)
         logger.debug('> DELETE {0}'.format(model_instance))
         handler._delete(model_instance)
+        self._metrics['delete'] += 1
+        mirror = self._get_mirror_handler(model_instance)
+        if mirror is not None:
+            try:
+                mirror._delete(model_instance)
+            except Exception as error:
+                logger.warn('Mirror DELETE of {0} failed: {1}: {2}'.format(
+                    model_instance, type(error), error))
 
-    def list(self, model_instance):
+    def _hostset_op(self, op, model_instance, address):
+        """
+        Runs a hostset operation on the handler for a Cluster. Store errors
+        are raised as KeyError as they are for a missing cluster.
+
+        :param op: The operation. add, remove or contains.
+        :type op: str
+        :param model_instance: Cluster instance to operate on
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address
+        :type address: str
+        :returns: The result of the handler
+        :rtype: bool or None
+        :raises: KeyError
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        logger.debug('> HOSTSET {0} {1} {2}'.format(
+            op.upper(), model_instance, address))
+        try:
+            result = getattr(handler, '_hostset_' + op)(
+                model_instance, address)
+        except KeyError:
+            raise
+        except Exception as error:
+            raise KeyError('{0}: {1}'.format(type(error).__name__, error))
+        self._metrics['get' if op == 'contains' else 'save'] += 1
+        mirror = self._get_mirror_handler(model_instance)
+        if mirror is not None and op != 'contains':
+            try:
+                getattr(mirror, '_hostset_' + op)(model_instance, address)
+            except Exception as error:
+                logger.warn(
+                    'Mirror HOSTSET {0} of {1} failed: {2}: {3}'.format(
+                        op.upper(), model_instance, type(error), error))
+        return result
+
+    def hostset_add(self, model_instance, address):
+        """
+        Adds a host address to a Cluster's hostset, idempotently.
+
+        :param model_instance: Cluster instance to add to
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to add
+        :type address: str
+        :raises: KeyError if the cluster does not exist
+        """
+        self._hostset_op('add', model_instance, address)
+
+    def hostset_remove(self, model_instance, address):
+        """
+        Removes a host address from a Cluster's hostset, idempotently.
+
+        :param model_instance: Cluster instance to remove from
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to remove
+        :type address: str
+        :raises: KeyError if the cluster does not exist
+        """
+        self._hostset_op('remove', model_instance, address)
+
+    def hostset_contains(self, model_instance, address):
+        """
+        Checks if a host address is in a Cluster's hostset.
+
+        :param model_instance: Cluster instance to check
+        :type model_instance: commissaire.handlers.models.Cluster
+        :param address: Host address to look for
+        :type address: str
+        :returns: True if the address is a member
+        :rtype: bool
+        :raises: KeyError if the cluster does not exist
+        """
+        return self._hostset_op('contains', model_instance, address)
+
+    def replace_hostset(self, model_instance):
+        """
+        Makes the stored hostset of a saved Cluster match the model's.
+        Saves may leave the members of stored clusters alone, so this is
+        for restoring whole clusters. Other models are ignored.
+
+        :param model_instance: Model instance which was saved
+        :type model_instance: commissaire.model.Model
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        logger.debug('> HOSTSET REPLACE {0}'.format(model_instance))
+        handler._replace_hostset(model_instance)
+        mirror = self._get_mirror_handler(model_instance)
+        if mirror is not None:
+            try:
+                mirror._replace_hostset(model_instance)
+            except Exception as error:
+                logger.warn(
+                    'Mirror HOSTSET REPLACE of {0} failed: {1}: {2}'.format(
+                        model_instance, type(error), error))
+
+    def list(self, model_instance, attributes=None, filters=None):
         """
         Lists data at a location in a store and returns back model instances.
 
         :param model_instance: Model instance to search for and list
         :type model_instance: commissaire.model.Model
+        :param attributes: Only these attributes are needed, or None for
+                           complete models. Other attributes may be left
+                           at their defaults.
+        :type attributes: tuple or None
+        :param filters: Only list models whose attributes have one of the
+                        accepted values, as attribute name -> values
+        :type filters: dict or None
         :returns: A list of models
         :rtype: list
         """
         logger = self._get_logger()
         handler = self._get_handler(model_instance)
         logger.debug('> LIST {0}'.format(model_instance))
-        model_instance = handler._list(model_instance)
+        if filters:
+            model_instance = handler._list_filtered(
+                model_instance, filters, attributes)
+        elif attributes is None:
+            model_instance = handler._list(model_instance)
+        else:
+            model_instance = handler._list_attributes(
+                model_instance, tuple(attributes))
+        self._metrics['list'] += 1
         logger.debug('< LIST {0}'.format(model_instance))
         return model_instance
+
+    def list_page(self, model_instance, attributes=None, filters=None,
+                  limit=None, cursor=None):
+        """
+        Lists one page of models in primary key order.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param attributes: Only these attributes are needed, or None for
+                           complete models
+        :type attributes: tuple or None
+        :param filters: Only list models whose attributes have one of the
+                        accepted values, as attribute name -> values
+        :type filters: dict or None
+        :param limit: Most models to list, or None for every model
+        :type limit: int or None
+        :param cursor: The cursor returned for the previous page, or None
+        :type cursor: str or None
+        :returns: A (model_instance, cursor) pair where cursor continues
+                  after this page or is None on the last page
+        :rtype: tuple
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        logger.debug('> LIST PAGE {0} after {1}'.format(
+            model_instance, cursor))
+        if attributes is not None:
+            attributes = tuple(attributes)
+        model_instance, next_cursor = handler._list_page(
+            model_instance, filters or {}, attributes, limit, cursor)
+        self._metrics['list'] += 1
+        logger.debug('< LIST PAGE {0} next {1}'.format(
+            model_instance, next_cursor))
+        return (model_instance, next_cursor)
+
+    def iter_list(self, model_instance):
+        """
+        Yields the models of a list model one at a time as the store
+        handler reads them.
+
+        :param model_instance: List model instance to read
+        :type model_instance: commissaire.model.Model
+        :returns: Generator of model instances
+        :rtype: generator
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        logger.debug('> ITER {0}'.format(model_instance))
+        self._metrics['list'] += 1
+        for item in handler._iter_list(model_instance):
+            yield item
+
+    def revision(self, model_instance):
+        """
+        Returns the current store revision for a model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: The store revision, or None if the store has none
+        :rtype: int or str or None
+        """
+        return self._get_handler(model_instance)._revision(model_instance)
+
+    def can_list_changes(self, model_instance):
+        """
+        Returns whether list_changes returns only the models which changed
+        rather than every model.
+
+        :param model_instance: Model instance
+        :type model_instance: commissaire.model.Model
+        :returns: True if changes are listed on their own
+        :rtype: bool
+        """
+        return self._get_handler(model_instance)._can_list_changes(
+            model_instance)
+
+    def list_changes(self, model_instance, since=None):
+        """
+        Lists the models which were created, updated or deleted after a
+        store revision.
+
+        :param model_instance: List model instance to fill
+        :type model_instance: commissaire.model.Model
+        :param since: Store revision, or None for every model
+        :type since: int or str or None
+        :returns: A (revision, model_instance, deleted) tuple. deleted is a
+                  list of primary keys, or None when model_instance holds
+                  every model and replaces what the caller had.
+        :rtype: tuple
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        logger.debug('> CHANGES {0} since {1}'.format(model_instance, since))
+        revision, model_instance, deleted = handler._list_changes(
+            model_instance, since)
+        self._metrics['list'] += 1
+        logger.debug('< CHANGES {0} at {1}'.format(model_instance, revision))
+        return (revision, model_instance, deleted)
+
+    def acquire_lease(self, model_instance, name, holder, ttl):
+        """
+        Acquires or renews a named lease on the handler of a model, so
+        processes sharing that handler can agree on a single holder.
+
+        :param model_instance: Model instance whose handler holds the lease
+        :type model_instance: commissaire.model.Model
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process asking for the lease
+        :type holder: str
+        :param ttl: Seconds the lease is held for unless renewed
+        :type ttl: int
+        :returns: True if the holder now holds the lease
+        :rtype: bool
+        """
+        logger = self._get_logger()
+        handler = self._get_handler(model_instance)
+        acquired = handler._acquire_lease(name, holder, ttl)
+        logger.debug('< LEASE {0} for {1}: {2}'.format(
+            name, holder, acquired))
+        return acquired
+
+    def release_lease(self, model_instance, name, holder):
+        """
+        Releases a named lease if it is held by the holder.
+
+        :param model_instance: Model instance whose handler holds the lease
+        :type model_instance: commissaire.model.Model
+        :param name: Name of the lease
+        :type name: str
+        :param holder: Identity of the process releasing the lease
+        :type holder: str
+        """
+        logger = self._get_logger()
+        logger.debug('> RELEASE {0} for {1}'.format(name, holder))
+        self._get_handler(model_instance)._release_lease(name, holder)
@@ -13,11 +13,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import os
 
 from falcon.testing import TestBase
 
 from commissaire.model import Model
+from commissaire.store import StoreHandlerBase
 
 # Keep this list synchronized with oscmd modules.
 available_os_types = ('fedora', 'redhat', 'rhel', 'centos')
@@ -60,3 +62,41 @@ class TestModel(Model):
     }
     _attribute_defaults = {'foo': ''}
     _primary_key = 'foo'
+
+
+class MemoryStoreHandler(StoreHandlerBase):
+    """
+    Simple in memory store handler for use in test cases.
+    """
+
+    @classmethod
+    def check_config(cls, config):
+        """
+        Any configuration is valid.
+        """
+        pass
+
+    def __init__(self, config):
+        StoreHandlerBase.__init__(self, config)
+        self._store = {}
+
+    def _save(self, model_instance):
+        self._store[(model_instance.__class__.__name__,
+                     model_instance.primary_key)] = model_instance.to_json(
+                         secure=True)
+        return model_instance
+
+    def _get(self, model_instance):
+        return model_instance.__class__(**json.loads(self._store[(
+            model_instance.__class__.__name__, model_instance.primary_key)]))
+
+    def _delete(self, model_instance):
+        del self._store[(
+            model_instance.__class__.__name__, model_instance.primary_key)]
+
+    def _list(self, model_instance):
+        model_cls = model_instance._list_class
+        results = [model_cls(**json.loads(v))
+                   for k, v in sorted(self._store.items())
+                   if k[0] == model_cls.__name__]
+        return model_instance.new(**{model_instance._list_attr: results})
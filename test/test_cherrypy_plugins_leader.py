@@ -0,0 +1,88 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.cherrypy_plugins.leader module.
+"""
+
+import mock
+
+from . import TestCase
+from commissaire.cherrypy_plugins.leader import Plugin
+
+
+class Test_LeaderPlugin(TestCase):
+    """
+    Tests for the LeaderPlugin class.
+    """
+
+    def before(self):
+        """
+        Called before every test.
+        """
+        self.bus = mock.MagicMock()
+        self.store_manager = mock.MagicMock()
+        self.plugin = Plugin(self.bus, self.store_manager, ttl=30)
+
+    def after(self):
+        """
+        Called after every test.
+        """
+        self.bus = None
+        self.plugin = None
+
+    def test_leader_plugin_renew_frequency(self):
+        """
+        Verify the lease is renewed several times per ttl.
+        """
+        self.assertEquals(10, self.plugin.frequency)
+
+    def test_leader_plugin_elected_and_lost(self):
+        """
+        Verify changes in leadership are published once.
+        """
+        self.store_manager.acquire_lease.return_value = True
+        self.plugin.renew()
+        self.plugin.renew()
+        self.bus.publish.assert_called_once_with('leader-elected')
+        self.assertTrue(self.plugin.is_elected())
+        self.store_manager.acquire_lease.assert_called_with(
+            mock.ANY, 'leader', self.plugin.holder, 30)
+
+        self.bus.publish.reset_mock()
+        self.store_manager.acquire_lease.return_value = False
+        self.plugin.renew()
+        self.bus.publish.assert_called_once_with('leader-lost')
+        self.assertFalse(self.plugin.is_elected())
+
+    def test_leader_plugin_store_error(self):
+        """
+        Verify a failed renewal gives up the leadership.
+        """
+        self.plugin.leader = True
+        self.store_manager.acquire_lease.side_effect = Exception('down')
+        self.plugin.renew()
+        self.bus.publish.assert_called_once_with('leader-lost')
+
+    def test_leader_plugin_stop(self):
+        """
+        Verify stop() releases a held lease.
+        """
+        self.plugin.leader = True
+        self.plugin.stop()
+        self.store_manager.release_lease.assert_called_once_with(
+            mock.ANY, 'leader', self.plugin.holder)
+        self.bus.publish.assert_called_once_with('leader-lost')
+        self.bus.unsubscribe.assert_called_once_with(
+            'leader-is-elected', self.plugin.is_elected)
@@ -0,0 +1,63 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.cherrypy_plugins.watcher module.
+"""
+
+import mock
+
+from . import TestCase
+from commissaire.cherrypy_plugins.watcher import Plugin
+
+
+class Test_WatcherPlugin(TestCase):
+    """
+    Tests for the WatcherPlugin class.
+    """
+
+    def before(self):
+        """
+        Called before every test.
+        """
+        self.bus = mock.MagicMock()
+        self.plugin = Plugin(self.bus, mock.MagicMock())
+        self.plugin.process = mock.MagicMock()
+
+    def after(self):
+        """
+        Called after every test.
+        """
+        self.bus = None
+        self.plugin = None
+
+    def test_watcher_plugin_stop_watcher(self):
+        """
+        Verify the watcher is asked to stop rather than terminated.
+        """
+        self.plugin.process.is_alive.side_effect = (True, False)
+        self.plugin.stop_watcher()
+        self.assertTrue(self.plugin.stop_event.is_set())
+        self.plugin.process.join.assert_called_once_with(
+            self.plugin.STOP_TIMEOUT)
+        self.assertFalse(self.plugin.process.terminate.called)
+
+    def test_watcher_plugin_stop_watcher_timeout(self):
+        """
+        Verify a watcher which does not stop in time is terminated.
+        """
+        self.plugin.process.is_alive.return_value = True
+        self.plugin.stop_watcher()
+        self.plugin.process.terminate.assert_called_once_with()
+        self.assertEquals(2, self.plugin.process.join.call_count)
@@ -16,11 +16,16 @@
 Test cases for the commissaire.oscmd module.
 """
 
+import mock
+
+from Queue import Queue
+
 from mock import MagicMock
 
 from . import TestCase
 from commissaire.compat.urlparser import urlparse
 from commissaire.containermgr.kubernetes import KubeContainerManager
+from commissaire.containermgr.kubernetes.session import new_session
 
 CONFIG = {
     'server_url': 'http://127.0.0.1:8080',
@@ -64,3 +69,118 @@ class Test_KubeContainerManager(TestCase):
             status_code, data = kube_container_mgr.get_host_status('10.2.0.2')
             self.assertEquals(test_data[0], status_code)
             self.assertEquals(test_data[1], data)
+
+    def test_sessions_share_connections(self):
+        """
+        Verify sessions to one apiserver share a pool and time out.
+        """
+        config = dict(CONFIG, **{'read-timeout': 7})
+        first = new_session(config)
+        second = new_session(config, credentials=False)
+        self.assertEquals('Bearer token', first.headers['Authorization'])
+        self.assertNotIn('Authorization', second.headers)
+        self.assertIs(
+            first.get_adapter('http://127.0.0.1:8080/'),
+            second.get_adapter('http://127.0.0.1:8080/'))
+        self.assertEquals((5, 7), first.timeout)
+
+        # Forked processes get their own pool
+        with mock.patch('os.getpid', return_value=-1):
+            third = new_session(config)
+        self.assertIsNot(
+            first.get_adapter('http://127.0.0.1:8080/'),
+            third.get_adapter('http://127.0.0.1:8080/'))
+
+        with mock.patch('requests.Session.request') as _request:
+            first.get('http://127.0.0.1:8080/api/v1/nodes')
+            self.assertEquals((5, 7), _request.call_args[1]['timeout'])
+            first.get('http://127.0.0.1:8080/api/v1/nodes', timeout=60)
+            self.assertEquals(60, _request.call_args[1]['timeout'])
+
+    def test_get_with_token(self):
+        """
+        Verify requests made with a token do not carry commissaire's.
+        """
+        kube_container_mgr = KubeContainerManager(CONFIG)
+        kube_container_mgr.token_con.get = MagicMock()
+        kube_container_mgr._get_with_token('/serviceaccounts', 'other')
+        kube_container_mgr.token_con.get.assert_called_once_with(
+            'http://127.0.0.1:8080/api/v1/serviceaccounts',
+            headers={'Authorization': 'Bearer other'})
+
+    def test_get_host_status_cached(self):
+        """
+        Verify node status is served from one bulk list until it is stale.
+        """
+        kube_container_mgr = KubeContainerManager(
+            dict(CONFIG, **{'status-max-age': 10}))
+        nodes = {'items': [
+            {'metadata': {'name': x}, 'status': {'phase': x}}
+            for x in ('10.2.0.2', '10.2.0.3')]}
+        kube_container_mgr.con.get = MagicMock(return_value=MagicMock(
+            status_code=200, json=MagicMock(return_value=nodes)))
+
+        with mock.patch('time.time', return_value=100):
+            for address in ('10.2.0.2', '10.2.0.3', '10.2.0.2'):
+                status_code, data = kube_container_mgr.get_host_status(
+                    address)
+                self.assertEquals(200, status_code)
+                self.assertEquals(address, data['metadata']['name'])
+            kube_container_mgr.con.get.assert_called_once_with(
+                'http://127.0.0.1:8080/api/v1/nodes')
+
+            # Raw requests always go to the node
+            nodes['status'] = {}
+            kube_container_mgr.get_host_status('10.2.0.2', True)
+            self.assertEquals(
+                'http://127.0.0.1:8080/api/v1/nodes/10.2.0.2',
+                kube_container_mgr.con.get.call_args[0][0])
+
+        with mock.patch('time.time', return_value=110):
+            kube_container_mgr.get_host_status('10.2.0.2')
+            self.assertEquals(
+                'http://127.0.0.1:8080/api/v1/nodes',
+                kube_container_mgr.con.get.call_args[0][0])
+
+    def test_wait_for_node(self):
+        """
+        Verify nodes are waited for with one list per poll.
+        """
+        kube_container_mgr = KubeContainerManager(CONFIG)
+        kube_container_mgr.node_poll_interval = 0.01
+        nodes = {'items': []}
+        kube_container_mgr.con.get = MagicMock(return_value=MagicMock(
+            status_code=200, json=MagicMock(return_value=nodes)))
+
+        results = Queue()
+        kube_container_mgr.wait_for_node('10.2.0.2', 30, results.put)
+        kube_container_mgr.wait_for_node('10.2.0.3', 0, results.put)
+        # The node which may not be waited for gives up right away
+        self.assertFalse(results.get(timeout=5))
+        nodes['items'].append({'metadata': {'name': '10.2.0.2'}})
+        self.assertTrue(results.get(timeout=5))
+        for call in kube_container_mgr.con.get.call_args_list:
+            self.assertEquals(
+                ('http://127.0.0.1:8080/api/v1/nodes',), call[0])
+
+    def test_node_ready_states(self):
+        """
+        Verify node Ready conditions are read from one list of nodes.
+        """
+        kube_container_mgr = KubeContainerManager(CONFIG)
+
+        def node(name, *conditions):
+            return {'metadata': {'name': name}, 'status': {'conditions': [
+                {'type': x, 'status': y} for x, y in conditions]}}
+
+        kube_container_mgr.con.get = MagicMock(return_value=MagicMock(
+            status_code=200, json=MagicMock(return_value={'items': [
+                node('a', ('OutOfDisk', 'False'), ('Ready', 'True')),
+                node('b', ('Ready', 'False')),
+                node('c', ('Ready', 'Unknown')),
+                node('d')]})))
+        self.assertEquals(
+            {'a': True, 'b': False, 'c': None, 'd': None},
+            kube_container_mgr.node_ready_states())
+        kube_container_mgr.con.get.assert_called_once_with(
+            'http://127.0.0.1:8080/api/v1/nodes')
@@ -26,7 +26,7 @@ from . import TestCase
 from .constants import *
 from mock import MagicMock
 from commissaire import constants as C
-from commissaire.handlers import clusters
+from commissaire.handlers import clusters, util
 from commissaire.handlers.models import Host
 from commissaire.middleware import JSONify
 from commissaire.store.storehandlermanager import StoreHandlerManager
@@ -98,7 +98,7 @@ class Test_ClustersResource(TestCase):
             return_value = clusters.Clusters(
                 clusters=[clusters.Cluster.new(
                     name=self.cluster_name, status='', hostset=[])])
-            manager.list.return_value = return_value
+            manager.list_changes.return_value = (7, return_value, None)
 
             body = self.simulate_request('/api/v0/clusters')
             self.assertEqual(falcon.HTTP_200, self.srmock.status)
@@ -106,6 +106,78 @@ class Test_ClustersResource(TestCase):
             self.assertEqual(
                 [self.cluster_name],
                 json.loads(body[0]))
+            self.assertEqual(
+                '7', self.srmock.headers_dict['Commissaire-Revision'])
+
+    def test_clusters_listing_not_modified(self):
+        """
+        Verify Clusters listings answer If-None-Match from the revision.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            manager.can_list_changes.return_value = True
+            manager.list_changes.return_value = (7, clusters.Clusters(
+                clusters=[clusters.Cluster.new(
+                    name=self.cluster_name, status='', hostset=[])]), None)
+
+            self.simulate_request('/api/v0/clusters')
+            self.assertEqual('"r7"', self.srmock.headers_dict['ETag'])
+
+            body = self.simulate_request(
+                '/api/v0/clusters', headers={'If-None-Match': '"r7"'})
+            self.assertEqual(falcon.HTTP_304, self.srmock.status)
+            self.assertEqual('', ''.join(body))
+
+    def test_clusters_listing_content_etag(self):
+        """
+        Verify listings are tagged from content when the store's revision
+        is not read with the listing.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            manager.can_list_changes.return_value = False
+            manager.list_changes.return_value = (7, clusters.Clusters(
+                clusters=[clusters.Cluster.new(
+                    name=self.cluster_name, status='', hostset=[])]), None)
+
+            body = self.simulate_request('/api/v0/clusters')
+            self.assertEqual(
+                util.content_etag(''.join(body)),
+                self.srmock.headers_dict['ETag'])
+
+            self.simulate_request(
+                '/api/v0/clusters', headers={'If-None-Match': '"r7"'})
+            self.assertEqual(falcon.HTTP_200, self.srmock.status)
+
+    def test_clusters_listing_since(self):
+        """
+        Verify listing Clusters changed since a store revision.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+
+            return_value = clusters.Clusters(
+                clusters=[clusters.Cluster.new(
+                    name=self.cluster_name, status='', hostset=[])])
+            manager.list_changes.return_value = (9, return_value, ['old'])
+
+            body = self.simulate_request(
+                '/api/v0/clusters', query_string='since=7')
+            self.assertEqual(falcon.HTTP_200, self.srmock.status)
+            self.assertEqual(7, manager.list_changes.call_args[0][1])
+            self.assertEqual({
+                'revision': 9,
+                'reset': False,
+                'updated': [self.cluster_name],
+                'deleted': ['old']}, json.loads(body[0]))
+
+            # Revisions must be integers
+            self.simulate_request(
+                '/api/v0/clusters', query_string='since=bogus')
+            self.assertEqual(falcon.HTTP_400, self.srmock.status)
 
     def test_clusters_listing_with_no_clusters(self):
         """
@@ -114,7 +186,7 @@ class Test_ClustersResource(TestCase):
         with mock.patch('cherrypy.engine.publish') as _publish:
             return_value = clusters.Clusters(clusters=[])
             manager = mock.MagicMock(StoreHandlerManager)
-            manager.list.return_value = return_value
+            manager.list_changes.return_value = (None, return_value, None)
             _publish.return_value = [manager]
 
             body = self.simulate_request('/api/v0/clusters')
@@ -261,6 +333,33 @@ class Test_ClusterResource(TestCase):
             self.assertEqual(falcon.HTTP_404, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
 
+    def test_cluster_retrieve_not_modified(self):
+        """
+        Verify cluster retrieval answers If-None-Match from the content.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            manager.get.return_value = make_new(CLUSTER_WITH_HOST)
+            manager.list.return_value = make_new(HOSTS)
+
+            self.simulate_request('/api/v0/cluster/development')
+            etag = self.srmock.headers_dict['ETag']
+
+            body = self.simulate_request(
+                '/api/v0/cluster/development',
+                headers={'If-None-Match': 'W/"other", W/' + etag})
+            self.assertEqual(falcon.HTTP_304, self.srmock.status)
+            self.assertEqual('', ''.join(body))
+
+            # A changed cluster is sent again
+            manager.get.return_value.status = 'failed'
+            body = self.simulate_request(
+                '/api/v0/cluster/development',
+                headers={'If-None-Match': etag})
+            self.assertEqual(falcon.HTTP_200, self.srmock.status)
+            self.assertNotEqual(etag, self.srmock.headers_dict['ETag'])
+
     def test_cluster_create(self):
         """
         Verify creating a cluster.
@@ -492,9 +591,14 @@ class Test_ClusterHostsResource(TestCase):
             manager.get.return_value = make_new(CLUSTER_WITH_FLAT_HOST)
             body = self.simulate_request(
                 '/api/v0/cluster/development/hosts', method='PUT',
-                body='{"old": ["10.2.0.2"], "new": ["10.2.0.2", "10.2.0.3"]}')
+                body='{"old": ["10.2.0.2"], "new": ["10.2.0.3"]}')
             self.assertEqual(falcon.HTTP_200, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
+            manager.hostset_add.assert_called_once_with(
+                manager.get.return_value, '10.2.0.3')
+            manager.hostset_remove.assert_called_once_with(
+                manager.get.return_value, '10.2.0.2')
+            self.assertFalse(manager.save.called)
 
             # Verify bad request (KeyError) returns the proper result
             manager.get.side_effect = KeyError
@@ -553,21 +657,23 @@ class Test_ClusterSingleHostResource(TestCase):
             _publish.return_value = [manager]
 
             # Verify member host returns the proper result
-            manager.get.return_value = make_new(CLUSTER_WITH_FLAT_HOST)
+            manager.hostset_contains.return_value = True
             body = self.simulate_request(
                 '/api/v0/cluster/development/hosts/10.2.0.2')
             self.assertEqual(falcon.HTTP_200, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
+            self.assertEqual(
+                '10.2.0.2', manager.hostset_contains.call_args[0][1])
 
             # Verify non-member host returns the proper result
-            manager.get.return_value = make_new(CLUSTER_WITH_FLAT_HOST)
+            manager.hostset_contains.return_value = False
             body = self.simulate_request(
                 '/api/v0/cluster/development/hosts/10.9.9.9')
             self.assertEqual(falcon.HTTP_404, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
 
             # Verify bad cluster name returns the proper result
-            manager.get.side_effect = Exception
+            manager.hostset_contains.side_effect = KeyError
             body = self.simulate_request(
                 '/api/v0/cluster/bogus/hosts/10.2.0.2')
             self.assertEqual(falcon.HTTP_404, self.srmock.status)
@@ -582,14 +688,15 @@ class Test_ClusterSingleHostResource(TestCase):
             _publish.return_value = [manager]
 
             # Verify inserting host returns the proper result
-            manager.get.return_value = make_new(CLUSTER_WITH_FLAT_HOST)
             body = self.simulate_request(
                 '/api/v0/cluster/developent/hosts/10.2.0.3', method='PUT')
             self.assertEqual(falcon.HTTP_200, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
+            self.assertEqual(
+                '10.2.0.3', manager.hostset_add.call_args[0][1])
 
             # Verify bad cluster name returns the proper result
-            manager.get.side_effect = Exception
+            manager.hostset_add.side_effect = KeyError
             body = self.simulate_request(
                 '/api/v0/cluster/bogus/hosts/10.2.0.3', method='PUT')
             self.assertEqual(falcon.HTTP_404, self.srmock.status)
@@ -604,14 +711,15 @@ class Test_ClusterSingleHostResource(TestCase):
             _publish.return_value = [manager]
 
             # Verify deleting host returns the proper result
-            manager.get.return_value = make_new(CLUSTER_WITH_FLAT_HOST)
             body = self.simulate_request(
                 '/api/v0/cluster/development/hosts/10.2.0.2', method='DELETE')
             self.assertEqual(falcon.HTTP_200, self.srmock.status)
             self.assertEqual({}, json.loads(body[0]))
+            self.assertEqual(
+                '10.2.0.2', manager.hostset_remove.call_args[0][1])
 
             # Verify bad cluster name returns the proper result
-            manager.get.side_effect = Exception
+            manager.hostset_remove.side_effect = KeyError
             body = self.simulate_request(
                 '/api/v0/cluster/bogus/hosts/10.2.0.2', method='DELETE')
             self.assertEqual(falcon.HTTP_404, self.srmock.status)
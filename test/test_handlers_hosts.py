@@ -195,7 +195,8 @@ class Test_HostsResource(TestCase):
         with mock.patch('cherrypy.engine.publish') as _publish:
             manager = mock.MagicMock(StoreHandlerManager)
             _publish.return_value = [manager]
-            manager.list.return_value = make_new(HOSTS)
+            manager.list_changes.return_value = (
+                None, make_new(HOSTS), None)
 
             body = self.simulate_request('/api/v0/hosts')
             # datasource's get should have been called once
@@ -204,6 +205,121 @@ class Test_HostsResource(TestCase):
                 [json.loads(HOST_JSON)],
                 json.loads(body[0]))
 
+    def test_hosts_listing_since(self):
+        """
+        Verify listing Hosts changed since a store revision.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            manager.list_changes.return_value = (
+                12, make_new(HOSTS), None)
+
+            body = self.simulate_request(
+                '/api/v0/hosts', query_string='since=3')
+            self.assertEqual(self.srmock.status, falcon.HTTP_200)
+            self.assertEqual(
+                '12', self.srmock.headers_dict['Commissaire-Revision'])
+            self.assertEqual({
+                'revision': 12,
+                'reset': True,
+                'updated': [json.loads(HOST_JSON)],
+                'deleted': []}, json.loads(body[0]))
+
+    def test_hosts_listing_not_modified(self):
+        """
+        Verify Hosts listings answer If-None-Match without serializing.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            listing = make_new(HOSTS)
+            manager.can_list_changes.return_value = True
+            manager.list_changes.return_value = (12, listing, None)
+
+            with mock.patch.object(listing, 'to_json') as _to_json:
+                body = self.simulate_request(
+                    '/api/v0/hosts', headers={'If-None-Match': '"r12"'})
+                self.assertEqual(self.srmock.status, falcon.HTTP_304)
+                self.assertEqual('"r12"', self.srmock.headers_dict['ETag'])
+                self.assertEqual('', ''.join(body))
+                self.assertFalse(_to_json.called)
+
+    def test_hosts_listing_query(self):
+        """
+        Verify filtered, projected and paged Hosts listings.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            manager.get.return_value = Cluster.new(
+                name='development', hostset=['10.0.0.1', '10.0.0.2'])
+            manager.list_page.return_value = (Hosts.new(hosts=[
+                Host.new(address='10.0.0.1', status='failed')]), '10.0.0.1')
+
+            body = self.simulate_request(
+                '/api/v0/hosts', query_string=(
+                    'status=failed&cluster=development'
+                    '&fields=address,status&limit=1'))
+            self.assertEqual(self.srmock.status, falcon.HTTP_200)
+            self.assertEqual(
+                [{'address': '10.0.0.1', 'status': 'failed'}],
+                json.loads(body[0]))
+            self.assertEqual(
+                '10.0.0.1',
+                self.srmock.headers_dict['Commissaire-Next-Cursor'])
+            manager.list_page.assert_called_once_with(
+                mock.ANY, attributes=mock.ANY, filters={
+                    'status': ['failed'],
+                    'address': ['10.0.0.1', '10.0.0.2']},
+                limit=1, cursor=None)
+            self.assertEqual(
+                set(['address', 'status']),
+                set(manager.list_page.call_args[1]['attributes']))
+
+            # The next page ends the listing
+            manager.list_page.return_value = (Hosts.new(hosts=[
+                Host.new(address='10.0.0.2', status='failed')]), None)
+            body = self.simulate_request(
+                '/api/v0/hosts', query_string=(
+                    'status=failed&fields=address&limit=1'
+                    '&cursor=10.0.0.1'))
+            self.assertEqual(self.srmock.status, falcon.HTTP_200)
+            self.assertEqual(
+                [{'address': '10.0.0.2'}], json.loads(body[0]))
+            self.assertNotIn(
+                'Commissaire-Next-Cursor', self.srmock.headers_dict)
+            self.assertEqual(
+                '10.0.0.1', manager.list_page.call_args[1]['cursor'])
+
+            # No matches is not an error
+            manager.list_page.return_value = (Hosts.new(hosts=[]), None)
+            body = self.simulate_request(
+                '/api/v0/hosts', query_string='os=rhel')
+            self.assertEqual(self.srmock.status, falcon.HTTP_200)
+            self.assertEqual([], json.loads(body[0]))
+
+            # Missing clusters are not found
+            manager.get.side_effect = KeyError
+            self.simulate_request(
+                '/api/v0/hosts', query_string='cluster=missing')
+            self.assertEqual(self.srmock.status, falcon.HTTP_404)
+
+    def test_hosts_listing_bad_query(self):
+        """
+        Verify Hosts listings reject unknown or hidden fields.
+        """
+        with mock.patch('cherrypy.engine.publish') as _publish:
+            manager = mock.MagicMock(StoreHandlerManager)
+            _publish.return_value = [manager]
+            for query_string in (
+                    'fields=ssh_priv_key', 'fields=nope',
+                    'status=failed&since=3'):
+                self.simulate_request(
+                    '/api/v0/hosts', query_string=query_string)
+                self.assertEqual(self.srmock.status, falcon.HTTP_400)
+            self.assertFalse(manager.list_page.called)
+
     def test_hosts_listing_with_no_hosts(self):
         """
         Verify listing Hosts when no hosts exists.
@@ -364,6 +480,8 @@ class Test_HostResource(TestCase):
             self.assertEqual({}, json.loads(body[0]))
             # Make sure creation is idempotent if the request parameters
             # agree with an existing host.
+            manager.hostset_contains.side_effect = None
+            manager.hostset_contains.return_value = True
             manager.get.side_effect = (
                 make_new(HOST),
                 test_cluster)
@@ -429,6 +547,7 @@ class Test_ImplicitHostResource(TestCase):
             manager.get.side_effect = (
                 make_new(HOST),
                 Exception)
+            manager.hostset_contains.side_effect = KeyError
             body = self.simulate_request(
                 '/api/v0/host', method='PUT', body=data)
             self.assertEqual(self.srmock.status, falcon.HTTP_409)
@@ -436,6 +555,8 @@ class Test_ImplicitHostResource(TestCase):
 
             # Make sure creation is idempotent if the request parameters
             # agree with an existing host.
+            manager.hostset_contains.side_effect = None
+            manager.hostset_contains.return_value = True
             manager.get.side_effect = (
                 make_new(HOST),
                 Cluster.new(
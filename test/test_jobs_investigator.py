@@ -82,3 +82,32 @@ class Test_JobsInvestigator(TestCase):
             host, error = response_queue.put.call_args[0][0]
             self.assertEquals(host.status, 'inactive')
             self.assertIsNone(error)
+
+    def test_investigator_waits_for_registration(self):
+        """
+        Verify registration is awaited through the container managers.
+        """
+        with mock.patch('commissaire.transport.ansibleapi.Transport') as _tp:
+            _tp().get_info.return_value = (0, {'os': 'fedora'})
+            _tp().bootstrap.return_value = (0, {})
+
+            request_queue = Queue()
+            response_queue = MagicMock(Queue)
+            con_mgr = MagicMock()
+            con_mgr.wait_for_node.side_effect = (
+                lambda name, timeout, callback: callback(True))
+            manager = MagicMock(StoreHandlerManager)
+            manager.list_container_managers.return_value = [con_mgr]
+
+            request_queue.put_nowait((manager, {
+                'address': '10.0.0.2',
+                'ssh_priv_key': 'dGVzdAo=',
+                'remote_user': 'root'
+            }, Cluster.new().__dict__))
+            investigator(request_queue, response_queue, run_once=True)
+
+            self.assertEquals(
+                '10.0.0.2', con_mgr.wait_for_node.call_args[0][0])
+            host, error = response_queue.put.call_args[0][0]
+            self.assertEquals('active', host.status)
+            self.assertIsNone(error)
@@ -26,7 +26,7 @@ from .constants import CLUSTER, HOST, make_new
 from commissaire import constants as C
 from commissaire.compat.urlparser import urlparse
 
-from commissaire.jobs.watcher import watcher
+from commissaire.jobs.watcher import _check_ready_hosts, watcher
 from commissaire.handlers.models import Hosts, Clusters
 from commissaire.store.storehandlermanager import StoreHandlerManager
 from Queue import Queue
@@ -93,3 +93,166 @@ class Test_JobsWatcher(TestCase):
 
             store_manager.list.assert_called_once()
             store_manager.save.assert_called_once()
+
+    def test_watcher_skips_queued_hosts(self):
+        """
+        Verify hosts already queued are not queued again from the store.
+        """
+        with mock.patch('commissaire.transport.ansibleapi.Transport') as _tp:
+            test_host = make_new(HOST)
+            test_host.last_check = datetime.datetime.now().isoformat()
+
+            q = Queue()
+            q.put_nowait((test_host, datetime.datetime.utcnow()))
+
+            store_manager = MagicMock(StoreHandlerManager)
+            store_manager.list.return_value = Hosts.new(hosts=[test_host])
+
+            watcher(q, store_manager, run_once=True)
+
+            # The host was not due for a check and is queued only once
+            self.assertEquals(1, q.qsize())
+            self.assertFalse(_tp().check_host_availability.called)
+            store_manager.save.assert_not_called()
+
+    def test_watcher_container_manager_mode(self):
+        """
+        Verify node conditions replace SSH checks unless they are unknown.
+        """
+        for states, ssh_result, status, ssh_used in (
+                ({'address': True}, (1, {}), 'active', False),
+                ({'address': False}, (0, {}), 'failed', False),
+                ({}, (0, {}), 'active', True)):
+            with mock.patch(
+                    'commissaire.transport.ansibleapi.Transport') as _tp:
+                _tp().check_host_availability.return_value = ssh_result
+
+                test_host = make_new(HOST)
+                test_host.address = 'address'
+                test_host.last_check = (
+                    datetime.datetime.now() - datetime.timedelta(days=10)
+                ).isoformat()
+                test_host.status = 'failed'
+
+                test_cluster = make_new(CLUSTER)
+                test_cluster.type = C.CLUSTER_TYPE_KUBERNETES
+                test_cluster.hostset = [test_host.address]
+
+                con_mgr = MagicMock()
+                con_mgr.node_ready_states.return_value = states
+                store_manager = MagicMock(StoreHandlerManager)
+                store_manager.list.side_effect = (
+                    Hosts.new(hosts=[test_host]),
+                    Clusters.new(clusters=[test_cluster]),
+                    Clusters.new(clusters=[test_cluster]))
+                store_manager.list_container_managers.return_value = [
+                    con_mgr]
+
+                watcher(Queue(), store_manager, run_once=True,
+                        mode='container-manager')
+
+                self.assertEquals(status, test_host.status)
+                self.assertEquals(
+                    ssh_used, _tp().check_host_availability.called)
+                store_manager.list_container_managers.assert_called_once_with(
+                    C.CLUSTER_TYPE_KUBERNETES)
+
+    def test_watcher_container_manager_mode_reads_once_per_pass(self):
+        """
+        Verify node conditions are read once for every due host in a pass.
+        """
+        with mock.patch('commissaire.transport.ansibleapi.Transport') as _tp:
+            last_check = (
+                datetime.datetime.now() - datetime.timedelta(days=10)
+            ).isoformat()
+            hosts = []
+            for address in ('one', 'two', 'three'):
+                test_host = make_new(HOST)
+                test_host.address = address
+                test_host.last_check = last_check
+                test_host.status = 'failed'
+                hosts.append(test_host)
+
+            test_cluster = make_new(CLUSTER)
+            test_cluster.type = C.CLUSTER_TYPE_KUBERNETES
+            test_cluster.hostset = ['one', 'two', 'three']
+
+            con_mgr = MagicMock()
+            con_mgr.node_ready_states.return_value = {
+                'one': True, 'two': False, 'three': True}
+            store_manager = MagicMock(StoreHandlerManager)
+            store_manager.list.side_effect = (
+                Hosts.new(hosts=hosts),
+                Clusters.new(clusters=[test_cluster]))
+            store_manager.save.side_effect = lambda host: host
+            store_manager.list_container_managers.return_value = [con_mgr]
+
+            q = Queue()
+            watcher(q, store_manager, run_once=True,
+                    mode='container-manager')
+
+            self.assertEquals(
+                ['active', 'failed', 'active'], [h.status for h in hosts])
+            self.assertEquals(3, store_manager.save.call_count)
+            self.assertEquals(3, q.qsize())
+            con_mgr.node_ready_states.assert_called_once_with()
+            self.assertFalse(_tp().check_host_availability.called)
+
+    def test_watcher_stop_event(self):
+        """
+        Verify a set stop event stops the watcher before the next host.
+        """
+        with mock.patch('commissaire.transport.ansibleapi.Transport') as _tp:
+            test_host = make_new(HOST)
+            test_host.last_check = (
+                datetime.datetime.now() - datetime.timedelta(days=10)
+            ).isoformat()
+
+            store_manager = MagicMock(StoreHandlerManager)
+            store_manager.list.return_value = Hosts.new(hosts=[test_host])
+            stop_event = MagicMock()
+            stop_event.is_set.return_value = True
+
+            q = Queue()
+            watcher(q, store_manager, mode='container-manager',
+                    stop_event=stop_event)
+
+            # The host is left queued, unchecked
+            self.assertEquals(1, q.qsize())
+            self.assertFalse(_tp().check_host_availability.called)
+            store_manager.save.assert_not_called()
+
+    def test_check_ready_hosts_stop_event(self):
+        """
+        Verify a pass requeues the remaining hosts once it is stopped.
+        """
+        last_run = datetime.datetime.utcnow() - datetime.timedelta(days=10)
+        q = Queue()
+        for address in ('one', 'two'):
+            test_host = make_new(HOST)
+            test_host.address = address
+            q.put_nowait((test_host, last_run))
+
+        test_cluster = make_new(CLUSTER)
+        test_cluster.type = C.CLUSTER_TYPE_KUBERNETES
+        test_cluster.hostset = ['one', 'two']
+
+        con_mgr = MagicMock()
+        con_mgr.node_ready_states.return_value = {'one': True, 'two': True}
+        store_manager = MagicMock(StoreHandlerManager)
+        store_manager.list.return_value = Clusters.new(
+            clusters=[test_cluster])
+        store_manager.save.side_effect = lambda host: host
+        store_manager.list_container_managers.return_value = [con_mgr]
+        stop_event = MagicMock()
+        stop_event.is_set.side_effect = (False, True)
+
+        _check_ready_hosts(
+            q, store_manager, MagicMock(), datetime.datetime.utcnow(),
+            stop_event)
+
+        store_manager.save.assert_called_once_with(mock.ANY)
+        self.assertEquals(
+            [('one', True), ('two', False)],
+            [(h.address, r != last_run) for h, r in (
+                q.get_nowait(), q.get_nowait())])
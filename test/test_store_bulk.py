@@ -0,0 +1,155 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.store.bulk module.
+"""
+
+import json
+import mock
+import os
+import shutil
+import tempfile
+
+from StringIO import StringIO
+
+from . import TestCase, MemoryStoreHandler
+from .constants import CLUSTER, HOST, make_new
+
+from commissaire.handlers.models import (
+    Cluster, ClusterRestart, Clusters, Host, Hosts)
+from commissaire.store.bulk import ModelImporter, export_models
+from commissaire.store.storehandlermanager import StoreHandlerManager
+
+
+def new_manager():
+    """
+    Returns a store manager backed by a MemoryStoreHandler.
+    """
+    manager = StoreHandlerManager()
+    manager.register_store_handler(
+        MemoryStoreHandler, {},
+        Host, Hosts, Cluster, Clusters, ClusterRestart)
+    return manager
+
+
+class Test_Bulk(TestCase):
+    """
+    Tests for bulk export and import.
+    """
+
+    def before(self):
+        """
+        Sets up a populated store manager before each run.
+        """
+        self.tmpdir = tempfile.mkdtemp()
+        self.manager = new_manager()
+        for x in range(0, 5):
+            host = make_new(HOST)
+            host.address = '10.2.0.{0}'.format(x)
+            self.manager.save(host)
+        self.manager.save(make_new(CLUSTER))
+        self.manager.save(ClusterRestart.new(
+            name=CLUSTER.name, status='finished'))
+
+    def after(self):
+        """
+        Removes temporary files after each run.
+        """
+        shutil.rmtree(self.tmpdir)
+
+    def test_export_models(self):
+        """
+        Verify every registered model is exported as one line of JSON.
+        """
+        fp = StringIO()
+        self.assertEquals(7, export_models(self.manager, fp))
+        lines = fp.getvalue().splitlines()
+        self.assertEquals(7, len(lines))
+        hosts = [x for x in map(json.loads, lines) if x['model'] == 'Host']
+        self.assertEquals(5, len(hosts))
+        # Exports are full backups so credentials are included
+        self.assertEquals(HOST.ssh_priv_key, hosts[0]['data']['ssh_priv_key'])
+
+    def test_export_models_fails_on_read_errors(self):
+        """
+        Verify read errors fail the export instead of skipping models.
+        """
+        handler = self.manager._get_handler(Host.new())
+        with mock.patch.object(handler, '_iter_list', side_effect=IOError):
+            self.assertRaises(
+                IOError, export_models, self.manager, StringIO())
+
+    def test_import_models(self):
+        """
+        Verify an export can be imported into an empty store.
+        """
+        fp = StringIO()
+        export_models(self.manager, fp)
+        fp.seek(0)
+        manager = new_manager()
+        imported, errors = ModelImporter(
+            manager, workers=2, batch_size=3).run(fp)
+        self.assertEquals(7, imported)
+        self.assertEquals([], errors)
+        self.assertEquals(5, len(manager.list(Hosts.new()).hosts))
+        self.assertEquals(
+            'finished',
+            manager.get(ClusterRestart.new(name=CLUSTER.name)).status)
+
+    def test_import_models_with_errors(self):
+        """
+        Verify bad lines are reported without stopping the import.
+        """
+        fp = StringIO('{"model": "Bogus", "data": {}}\nnot json\n\n')
+        imported, errors = ModelImporter(new_manager()).run(fp)
+        self.assertEquals(0, imported)
+        self.assertEquals([1, 2], [x[0] for x in errors])
+
+    def test_import_models_resume(self):
+        """
+        Verify an import resumes after the last checkpoint.
+        """
+        fp = StringIO()
+        export_models(self.manager, fp)
+        progress_path = os.path.join(self.tmpdir, 'progress')
+        with open(progress_path, 'w') as progress:
+            progress.write('6')
+
+        fp.seek(0)
+        manager = new_manager()
+        importer = ModelImporter(
+            manager, batch_size=2, progress_path=progress_path)
+        imported, _ = importer.run(fp, resume=True)
+        self.assertEquals(1, imported)
+        with open(progress_path, 'r') as progress:
+            self.assertEquals('7', progress.read())
+
+    def test_import_models_checkpoint_stops_at_errors(self):
+        """
+        Verify the checkpoint never passes the first failed line.
+        """
+        fp = StringIO()
+        export_models(self.manager, fp)
+        lines = fp.getvalue().splitlines()
+        lines[1] = 'not json'
+        progress_path = os.path.join(self.tmpdir, 'progress')
+
+        importer = ModelImporter(
+            new_manager(), batch_size=2, progress_path=progress_path)
+        imported, errors = importer.run(StringIO('\n'.join(lines)))
+        self.assertEquals(6, imported)
+        self.assertEquals([2], [x[0] for x in errors])
+        with open(progress_path, 'r') as progress:
+            self.assertEquals('1', progress.read())
@@ -0,0 +1,520 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.store.etcd3storehandler.Etcd3StoreHandler
+class.
+"""
+
+import json
+
+import mock
+import requests
+
+from . test_store_handler_base_class import _Test_StoreHandler
+from .constants import HOST, make_new
+
+from commissaire.handlers.models import (
+    Cluster, Clusters, Host, Hosts, Network, Networks)
+from commissaire.store import ConfigurationError
+from commissaire.store.etcd3storehandler import (
+    Etcd3StoreHandler, _decode, _encode)
+
+
+def make_response(body):
+    """
+    Creates a fake gateway response.
+    """
+    response = mock.MagicMock()
+    response.json.return_value = body
+    return response
+
+
+def make_kv(key, value, revision=1):
+    """
+    Creates a gateway key value.
+    """
+    return {
+        'key': _encode(key),
+        'value': _encode(value),
+        'mod_revision': str(revision),
+    }
+
+
+class Test_Etcd3StoreHandler(_Test_StoreHandler):
+    """
+    Tests for the Etcd3StoreHandler class.
+    """
+
+    cls = Etcd3StoreHandler
+
+    def before(self):
+        """
+        Sets up a fresh instance with a fake session before each run.
+        """
+        super(Test_Etcd3StoreHandler, self).before()
+        self.instance._store = mock.MagicMock()
+
+    def sent(self, call_index=0):
+        """
+        Returns the (url, body) of a request sent to the gateway.
+        """
+        args, kwargs = self.instance._store.post.call_args_list[call_index]
+        return (args[0], json.loads(kwargs['data']))
+
+    def test_check_config_with_invalid_page_size(self):
+        """
+        Verify page sizes must be positive integers.
+        """
+        self.assertRaises(
+            ConfigurationError,
+            Etcd3StoreHandler.check_config, {'page-size': 0})
+
+    def test__get(self):
+        """
+        Verify models are read from a single key.
+        """
+        network = Network.new(name='test', type='flannel_etcd', options={})
+        self.instance._store.post.return_value = make_response({
+            'kvs': [make_kv('/commissaire/networks/test',
+                            network.to_json(secure=True))]})
+        result = self.instance._get(Network.new(name='test'))
+        self.assertEquals('test', result.name)
+        url, body = self.sent()
+        self.assertEquals('http://127.0.0.1:2379/v3/kv/range', url)
+        self.assertEquals(
+            '/commissaire/networks/test', _decode(body['key']))
+        self.assertNotIn('range_end', body)
+
+        self.instance._store.post.return_value = make_response({})
+        self.assertRaises(
+            KeyError, self.instance._get, Network.new(name='test'))
+
+    def test__get_assembles_cluster_members(self):
+        """
+        Verify cluster hostsets are read from their member keys.
+        """
+        self.instance._store.post.return_value = make_response({
+            'responses': [
+                {'response_range': {'kvs': [make_kv(
+                    '/commissaire/clusters/test',
+                    json.dumps({'name': 'test', 'status': 'ok',
+                                'type': 'kubernetes',
+                                'network': 'default'}))]}},
+                {'response_range': {'kvs': [
+                    make_kv('/commissaire/cluster-hosts/test/10.0.0.2',
+                            '10.0.0.2'),
+                    make_kv('/commissaire/cluster-hosts/test/10.0.0.1',
+                            '10.0.0.1')]}},
+            ]})
+        cluster = self.instance._get(Cluster.new(name='test'))
+        self.assertEquals(['10.0.0.1', '10.0.0.2'], cluster.hostset)
+        _, body = self.sent()
+        self.assertEquals(
+            '/commissaire/cluster-hosts/test/',
+            _decode(body['success'][1]['request_range']['key']))
+
+    def test__save_cluster_members(self):
+        """
+        Verify member keys are only written for new or legacy clusters.
+        """
+        cluster = Cluster.new(
+            name='test', status='ok', hostset=['10.0.0.2', '10.0.0.3'])
+        # New clusters write their hostset if still missing
+        self.instance._store.post.side_effect = [
+            make_response({}),
+            make_response({'succeeded': True}),
+        ]
+        self.instance._save(cluster)
+        _, body = self.sent(1)
+        self.assertEquals('CREATE', body['compare'][0]['target'])
+        ops = body['success']
+        self.assertNotIn(
+            'hostset', json.loads(_decode(ops[0]['request_put']['value'])))
+        self.assertEquals(
+            ['/commissaire/cluster-hosts/test/10.0.0.2',
+             '/commissaire/cluster-hosts/test/10.0.0.3'],
+            [_decode(x['request_put']['key']) for x in ops[1:]])
+
+        # Stored clusters keep their member keys
+        self.instance._store.post.reset_mock()
+        self.instance._store.post.side_effect = [
+            make_response({'kvs': [make_kv(
+                '/commissaire/clusters/test', json.dumps({'name': 'test'}))]}),
+            make_response({}),
+        ]
+        self.instance._save(cluster)
+        url, body = self.sent(1)
+        self.assertTrue(url.endswith('/kv/txn'))
+        self.assertEquals(
+            ['/commissaire/clusters/test'],
+            [_decode(x['request_put']['key']) for x in body['failure']])
+
+        # Legacy clusters move their stored hostset, retrying on changes
+        self.instance._store.post.reset_mock()
+        legacy = make_kv(
+            '/commissaire/clusters/test',
+            json.dumps({'name': 'test', 'hostset': ['10.0.0.1']}), 4)
+        self.instance._store.post.side_effect = [
+            make_response({'kvs': [legacy]}),
+            make_response({'succeeded': False}),
+            make_response({'kvs': [legacy]}),
+            make_response({'succeeded': True}),
+        ]
+        self.instance._save(cluster)
+        self.assertEquals(4, self.instance._store.post.call_count)
+        _, body = self.sent(3)
+        self.assertEquals('MOD', body['compare'][0]['target'])
+        self.assertEquals('4', body['compare'][0]['mod_revision'])
+        self.assertEquals(
+            ['/commissaire/cluster-hosts/test/10.0.0.1'],
+            [_decode(x['request_put']['key']) for x in body['success'][1:]])
+
+    def test__save_if_changed(self):
+        """
+        Verify a save is skipped when etcd already holds every value.
+        """
+        host = Host.new(
+            address='10.0.0.1', status='active', os='', cpus=2, memory=1024,
+            space=1000, last_check='', ssh_priv_key='', remote_user='')
+        self.instance._store.post.return_value = make_response({
+            'succeeded': True})
+        self.assertEquals(
+            (host, False), self.instance._save_if_changed(host))
+        url, body = self.sent()
+        self.assertTrue(url.endswith('/kv/txn'))
+        self.assertEquals(
+            [('/commissaire/hosts/10.0.0.1', 'VALUE'),
+             ('/commissaire/host-status/10.0.0.1', 'VALUE')],
+            [(_decode(x['key']), x['target']) for x in body['compare']])
+        self.assertEquals(
+            [x['value'] for x in body['compare']],
+            [x['request_put']['value'] for x in body['failure']])
+        self.assertNotIn('success', body)
+
+        # A changed value fails the comparison and is written
+        self.instance._store.post.return_value = make_response({})
+        self.assertEquals(
+            (host, True), self.instance._save_if_changed(host))
+
+    def test__hostset_operations(self):
+        """
+        Verify hostset members are changed one key at a time.
+        """
+        blob = make_kv('/commissaire/clusters/test',
+                       json.dumps({'name': 'test', 'status': 'ok'}))
+        self.instance._store.post.return_value = make_response({
+            'succeeded': True,
+            'responses': [
+                {'response_put': {}},
+                {'response_range': {'kvs': [blob]}}]})
+        self.instance._hostset_add(Cluster.new(name='test'), '10.0.0.1')
+        self.assertEquals(1, self.instance._store.post.call_count)
+        url, body = self.sent()
+        self.assertTrue(url.endswith('/kv/txn'))
+        self.assertEquals('CREATE', body['compare'][0]['target'])
+        self.assertEquals(
+            '/commissaire/cluster-hosts/test/10.0.0.1',
+            _decode(body['success'][0]['request_put']['key']))
+
+        self.instance._store.post.return_value = make_response({
+            'succeeded': True,
+            'responses': [
+                {'response_range': {}},
+                {'response_range': {'kvs': [blob]}}]})
+        self.assertFalse(self.instance._hostset_contains(
+            Cluster.new(name='test'), '10.0.0.1'))
+
+        # Missing clusters fail the comparison
+        self.instance._store.post.return_value = make_response({})
+        self.assertRaises(
+            KeyError, self.instance._hostset_remove,
+            Cluster.new(name='test'), '10.0.0.1')
+
+    def test__hostset_remove_legacy(self):
+        """
+        Verify removing from a legacy hostset converts it first.
+        """
+        legacy = make_kv(
+            '/commissaire/clusters/test',
+            json.dumps({'name': 'test', 'status': 'ok', 'type': 'kubernetes',
+                        'network': 'default',
+                        'hostset': ['10.0.0.1', '10.0.0.2']}))
+        self.instance._store.post.return_value = make_response({
+            'succeeded': True,
+            'responses': [
+                {'response_range': {'kvs': [legacy]}},
+                {'response_range': {'kvs': [legacy]}}]})
+        self.instance._hostset_remove(Cluster.new(name='test'), '10.0.0.1')
+        urls = [x[0][0] for x in self.instance._store.post.call_args_list]
+        # Remove, read, convert and remove again
+        self.assertEquals(
+            ['txn', 'txn', 'range', 'txn', 'txn'],
+            [x.rsplit('/', 1)[-1] for x in urls])
+        _, body = self.sent(4)
+        self.assertEquals(
+            '/commissaire/cluster-hosts/test/10.0.0.1',
+            _decode(body['success'][0]['request_delete_range']['key']))
+
+    def test__list_paginates(self):
+        """
+        Verify listings page through a prefix at a single revision.
+        """
+        self.instance._page_size = 1
+        clusters = [Cluster.new(name=x, hostset=[]) for x in ('a', 'b')]
+        self.instance._store.post.side_effect = [
+            make_response({
+                'header': {'revision': '7'}, 'more': True,
+                'kvs': [make_kv('/commissaire/clusters/a',
+                                clusters[0].to_json(secure=True))]}),
+            make_response({
+                'header': {'revision': '7'},
+                'kvs': [make_kv('/commissaire/clusters/b',
+                                clusters[1].to_json(secure=True))]}),
+            make_response({
+                'header': {'revision': '7'},
+                'kvs': [make_kv('/commissaire/cluster-hosts/b/10.0.0.1',
+                                '10.0.0.1')]}),
+        ]
+        result = self.instance._list(Clusters.new())
+        self.assertEquals(['a', 'b'], [x.name for x in result.clusters])
+        self.assertEquals(
+            [[], ['10.0.0.1']], [x.hostset for x in result.clusters])
+
+        _, first = self.sent(0)
+        self.assertEquals('/commissaire/clusters/', _decode(first['key']))
+        self.assertEquals('/commissaire/clusters0', _decode(first['range_end']))
+        self.assertEquals(1, first['limit'])
+        self.assertNotIn('revision', first)
+        _, second = self.sent(1)
+        self.assertEquals('/commissaire/clusters/a\0', _decode(second['key']))
+        self.assertEquals(7, second['revision'])
+
+    def test__save_all_uses_a_transaction(self):
+        """
+        Verify several models are saved in one transaction.
+        """
+        host = Host.new(
+            address='10.0.0.1', status='', os='', cpus=2, memory=1024,
+            space=1000, last_check='', ssh_priv_key='', remote_user='')
+        cluster = Cluster.new(name='test', hostset=['10.0.0.1'])
+        self.instance._store.post.return_value = make_response({
+            'succeeded': True})
+        self.instance._save_all([host, cluster])
+        # Existing hostset members are read before the transaction
+        self.assertEquals(2, self.instance._store.post.call_count)
+        url, body = self.sent(1)
+        self.assertTrue(url.endswith('/kv/txn'))
+        self.assertEquals(
+            ['/commissaire/hosts/10.0.0.1',
+             '/commissaire/host-status/10.0.0.1',
+             '/commissaire/clusters/test',
+             '/commissaire/cluster-hosts/test/10.0.0.1'],
+            [_decode(x['request_put']['key']) for x in body['success']])
+
+    def test__get_assembles_split_hosts(self):
+        """
+        Verify host facts and status are read in one transaction.
+        """
+        self.instance._store.post.return_value = make_response({
+            'responses': [
+                {'response_range': {'kvs': [make_kv(
+                    '/commissaire/hosts/10.0.0.1',
+                    json.dumps({
+                        'address': '10.0.0.1', 'os': 'fedora', 'cpus': 2,
+                        'memory': 1024, 'space': 1000, 'ssh_priv_key': '',
+                        'remote_user': 'root'}))]}},
+                {'response_range': {'kvs': [make_kv(
+                    '/commissaire/host-status/10.0.0.1',
+                    json.dumps({'status': 'active', 'last_check': 'now'}))]}},
+            ]})
+        host = self.instance._get(Host.new(address='10.0.0.1'))
+        self.assertEquals('fedora', host.os)
+        self.assertEquals('active', host.status)
+        url, _ = self.sent()
+        self.assertTrue(url.endswith('/kv/txn'))
+
+    def test__list_page_reads_only_needed_keys(self):
+        """
+        Verify paged host listings read a page of keys at a time, stop
+        once the page is full and include hosts without status records.
+        """
+        legacy = make_new(HOST)
+        legacy.address = '10.0.0.2'
+        legacy.status = 'failed'
+        self.instance._page_size = 2
+        self.instance._store.post.side_effect = [
+            make_response({
+                'header': {'revision': '5'}, 'more': True,
+                'kvs': [{'key': _encode('/commissaire/hosts/10.0.0.1')},
+                        {'key': _encode('/commissaire/hosts/10.0.0.2')}]}),
+            make_response({'kvs': [make_kv(
+                '/commissaire/host-status/10.0.0.1',
+                json.dumps({'status': 'active', 'last_check': ''}))]}),
+            make_response({'kvs': [make_kv(
+                '/commissaire/hosts/10.0.0.2', legacy.to_json(True))]}),
+            make_response({
+                'header': {'revision': '5'},
+                'kvs': [{'key': _encode('/commissaire/hosts/10.0.0.3')}]}),
+            make_response({'kvs': [make_kv(
+                '/commissaire/host-status/10.0.0.3',
+                json.dumps({'status': 'failed', 'last_check': ''}))]}),
+        ]
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {'status': ['failed']}, ('address', 'status'),
+            limit=1)
+        self.assertEquals(['10.0.0.2'], [x.address for x in hosts.hosts])
+        self.assertEquals('10.0.0.2', cursor)
+        _, body = self.sent(0)
+        self.assertTrue(body['keys_only'])
+        self.assertEquals(2, body['limit'])
+        _, body = self.sent(3)
+        self.assertEquals(
+            '/commissaire/hosts/10.0.0.2\0', _decode(body['key']))
+        self.assertEquals(5, body['revision'])
+
+    def test__list_page_selected_hosts(self):
+        """
+        Verify cluster listings read only the member hosts.
+        """
+        host = make_new(HOST)
+        host.address = '10.0.0.1'
+        self.instance._store.post.return_value = make_response({
+            'responses': [
+                {'response_range': {'kvs': [make_kv(
+                    '/commissaire/hosts/10.0.0.1', host.to_json(True))]}},
+                {'response_range': {}},
+                {'response_range': {}},
+                {'response_range': {}},
+            ]})
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {'address': ['10.0.0.2', '10.0.0.1']})
+        self.assertEquals(['10.0.0.1'], [x.address for x in hosts.hosts])
+        self.assertEquals(None, cursor)
+        self.assertEquals(1, self.instance._store.post.call_count)
+
+    def test__list_changes(self):
+        """
+        Verify listings since a revision hold only changed models.
+        """
+        network = Network.new(name='b', type='flannel_etcd', options={})
+        self.instance._store.post.side_effect = [
+            # Keys stored now
+            make_response({
+                'header': {'revision': '9'},
+                'kvs': [{'key': _encode('/commissaire/networks/b')}]}),
+            # Keys stored at the revision
+            make_response({
+                'header': {'revision': '9'},
+                'kvs': [{'key': _encode('/commissaire/networks/a')},
+                        {'key': _encode('/commissaire/networks/b')}]}),
+            # Keys modified after the revision
+            make_response({
+                'header': {'revision': '9'},
+                'kvs': [{'key': _encode('/commissaire/networks/b')}]}),
+            make_response({
+                'kvs': [make_kv('/commissaire/networks/b',
+                                network.to_json(secure=True))]}),
+        ]
+        revision, networks, deleted = self.instance._list_changes(
+            Networks.new(), 5)
+        self.assertEquals(9, revision)
+        self.assertEquals(['b'], [x.name for x in networks.networks])
+        self.assertEquals(['a'], deleted)
+        _, body = self.sent(2)
+        self.assertEquals(6, body['min_mod_revision'])
+        self.assertEquals(9, body['revision'])
+        self.assertTrue(body['keys_only'])
+
+    def test__list_changes_after_compaction(self):
+        """
+        Verify every model is listed once the revision is compacted.
+        """
+        compacted = mock.MagicMock()
+        compacted.raise_for_status.side_effect = (
+            requests.exceptions.HTTPError)
+        self.instance._store.post.side_effect = [
+            make_response({'header': {'revision': '9'}}),
+            compacted,
+            make_response({'header': {'revision': '9'}}),
+            make_response({'header': {'revision': '9'}}),
+        ]
+        revision, networks, deleted = self.instance._list_changes(
+            Networks.new(), 5)
+        self.assertEquals(9, revision)
+        self.assertEquals(None, deleted)
+
+    def test__acquire_lease(self):
+        """
+        Verify leases are taken when free and renewed by their holder.
+        """
+        self.instance._store.post.side_effect = [
+            make_response({}),
+            make_response({'ID': '7'}),
+            make_response({'succeeded': True}),
+        ]
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        url, body = self.sent(1)
+        self.assertTrue(url.endswith('/lease/grant'))
+        self.assertEquals(30, body['TTL'])
+        url, body = self.sent(2)
+        self.assertEquals('CREATE', body['compare'][0]['target'])
+        put = body['success'][0]['request_put']
+        self.assertEquals(
+            '/commissaire-leases/leader', _decode(put['key']))
+        self.assertEquals('7', put['lease'])
+
+        # Renewals keep the same etcd lease alive
+        held = make_kv('/commissaire-leases/leader', 'a')
+        held['lease'] = '7'
+        self.instance._store.post.reset_mock()
+        self.instance._store.post.side_effect = [
+            make_response({'kvs': [held]}),
+            make_response({'result': {'ID': '7', 'TTL': '30'}}),
+        ]
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        url, body = self.sent(1)
+        self.assertTrue(url.endswith('/lease/keepalive'))
+        self.assertEquals('7', body['ID'])
+
+        # Held by someone else
+        self.instance._store.post.reset_mock()
+        self.instance._store.post.side_effect = [
+            make_response({'kvs': [held]}),
+        ]
+        self.assertFalse(self.instance._acquire_lease('leader', 'b', 30))
+
+        # Taken by someone else in between, the new lease is revoked
+        self.instance._store.post.reset_mock()
+        self.instance._store.post.side_effect = [
+            make_response({}),
+            make_response({'ID': '8'}),
+            make_response({'succeeded': False}),
+            make_response({}),
+        ]
+        self.assertFalse(self.instance._acquire_lease('other', 'b', 30))
+        url, body = self.sent(3)
+        self.assertTrue(url.endswith('/lease/revoke'))
+        self.assertEquals('8', body['ID'])
+
+    def test__release_lease(self):
+        """
+        Verify releasing a lease revokes the etcd lease.
+        """
+        self.instance._leases['leader'] = '7'
+        self.instance._store.post.return_value = make_response({})
+        self.instance._release_lease('leader', 'a')
+        url, body = self.sent(1)
+        self.assertTrue(url.endswith('/lease/revoke'))
+        self.assertEquals({}, self.instance._leases)
@@ -16,10 +16,30 @@
 Test cases for the commissaire.store.etcdstorehandler.EtcdStoreHandler class.
 """
 
+import json
+
+import etcd
+import mock
+
 from . test_store_handler_base_class import _Test_StoreHandler
+from .constants import HOST, make_new
+
+from commissaire.handlers.models import (
+    Cluster, Clusters, Host, Hosts, Networks, Status)
+from commissaire.store import ConfigurationError
+from commissaire.store.etcdstorehandler import (
+    EtcdMirror, EtcdStoreHandler, READ_LINEARIZABLE, READ_SERIALIZABLE,
+    _iter_read)
+
 
-from commissaire.handlers.models import Status, Host
-from commissaire.store.etcdstorehandler import EtcdStoreHandler
+def make_result(action, key, value=None, index=1, etcd_index=None, **node):
+    """
+    Creates an etcd.EtcdResult as returned by reads, writes and watches.
+    """
+    node.update({'key': key, 'value': value, 'modifiedIndex': index})
+    result = etcd.EtcdResult(action, node)
+    result.etcd_index = etcd_index or index
+    return result
 
 
 class Test_StoreHandlerBaseClass(_Test_StoreHandler):
@@ -49,3 +69,541 @@ class Test_StoreHandlerBaseClass(_Test_StoreHandler):
                     address='10.0.0.1', status='', os='', cpus=2,
                     memory=1024, space=1000, last_check='',
                     ssh_priv_key='', remote_user='')))
+
+    def test_check_config_with_invalid_read_consistency(self):
+        """
+        Verify unknown read consistency levels are rejected.
+        """
+        self.assertRaises(
+            ConfigurationError,
+            EtcdStoreHandler.check_config,
+            {'read-consistency': {'Host': 'eventually'}})
+        self.assertRaises(
+            ConfigurationError,
+            EtcdStoreHandler.check_config,
+            {'read-consistency': 'eventually'})
+
+    def test__read_with_default_consistency(self):
+        """
+        Verify status reads are serializable and membership reads are not.
+        """
+        self.instance._store = mock.MagicMock()
+        self.instance._read_store_cycle = iter([self.instance._store])
+        self.instance._read('/commissaire/hosts/10.0.0.1', Host.new())
+        self.instance._store.read.assert_called_once_with(
+            '/commissaire/hosts/10.0.0.1', quorum=False)
+
+        self.instance._store.reset_mock()
+        self.instance._read('/commissaire/clusters/test', Cluster.new())
+        self.instance._store.read.assert_called_once_with(
+            '/commissaire/clusters/test', quorum=True)
+
+    def test__read_with_configured_consistency(self):
+        """
+        Verify configured and per call read consistency is honored.
+        """
+        instance = self.cls({'read-consistency': READ_LINEARIZABLE})
+        self.assertEquals(
+            READ_LINEARIZABLE,
+            instance._get_read_consistency(Host.new()))
+        self.assertEquals(
+            READ_SERIALIZABLE,
+            instance._get_read_consistency(Host.new(), READ_SERIALIZABLE))
+
+        instance = self.cls({'read-consistency': {'Cluster': 'serializable'}})
+        self.assertEquals(
+            READ_SERIALIZABLE,
+            instance._get_read_consistency(Cluster.new()))
+
+    def test__read_spreads_serializable_reads(self):
+        """
+        Verify serializable reads rotate through the configured members.
+        """
+        instance = self.cls({
+            'read-server-urls': ['http://127.0.0.2:2379']})
+        self.assertEquals(2, len(instance._read_stores))
+        for store in instance._read_stores:
+            store.read = mock.MagicMock()
+        instance._read('/commissaire/status', Status.new())
+        instance._read('/commissaire/status', Status.new())
+        for store in instance._read_stores:
+            store.read.assert_called_once_with(
+                '/commissaire/status', quorum=False)
+
+    def test_mirror_load_and_apply(self):
+        """
+        Verify EtcdMirror loads the tree and applies events in order.
+        """
+        client = mock.MagicMock()
+        client.read.return_value = make_result(
+            'get', '/commissaire', dir=True, etcd_index=10, nodes=[
+                {'key': '/commissaire/hosts', 'dir': True, 'nodes': [
+                    {'key': '/commissaire/hosts/a', 'value': '1',
+                     'modifiedIndex': 5}]},
+                {'key': '/commissaire/networks', 'dir': True}])
+        mirror = EtcdMirror(client, '/commissaire')
+        mirror.load()
+        self.assertEquals(10, mirror._index)
+        self.assertEquals('1', mirror.get('/commissaire/hosts/a'))
+        self.assertEquals(
+            [('/commissaire/hosts/a', '1')],
+            mirror.list('/commissaire/hosts'))
+        self.assertEquals([], mirror.list('/commissaire/networks/'))
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, mirror.list, '/commissaire/clusters')
+
+        # Older events do not replace newer values
+        mirror.apply(make_result('set', '/commissaire/hosts/a', '2', 4))
+        self.assertEquals('1', mirror.get('/commissaire/hosts/a'))
+        mirror.apply(make_result('delete', '/commissaire/hosts/a', None, 6))
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, mirror.get, '/commissaire/hosts/a')
+        self.assertEquals([], mirror.list('/commissaire/hosts'))
+        mirror.apply(make_result('set', '/commissaire/hosts/a', '2', 5))
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, mirror.get, '/commissaire/hosts/a')
+
+    def test_mirror_forgets_old_removals(self):
+        """
+        Verify EtcdMirror drops old tombstones and no longer reports
+        removals from before them.
+        """
+        client = mock.MagicMock()
+        client.read.return_value = make_result(
+            'get', '/commissaire', dir=True, etcd_index=10, nodes=[
+                {'key': '/commissaire/hosts', 'dir': True, 'nodes': [
+                    {'key': '/commissaire/hosts/a', 'value': '1',
+                     'modifiedIndex': 5},
+                    {'key': '/commissaire/hosts/b', 'value': '1',
+                     'modifiedIndex': 5}]}])
+        mirror = EtcdMirror(client, '/commissaire')
+        mirror.removals_kept = 5
+        mirror.load()
+        client.watch.side_effect = [
+            make_result('delete', '/commissaire/hosts/a', None, 11),
+            make_result('set', '/commissaire/hosts/b', '2', 17)]
+        mirror.follow_once()
+        self.assertEquals(
+            [('/commissaire/hosts/a', None)],
+            mirror.changes('/commissaire/hosts', 10))
+        mirror.follow_once()
+        self.assertEquals(
+            ['/commissaire/hosts/b'], mirror._keys)
+        self.assertEquals(None, mirror.changes('/commissaire/hosts', 10))
+        self.assertEquals(
+            [('/commissaire/hosts/b', '2')],
+            mirror.changes('/commissaire/hosts', 12))
+
+        # Late events for forgotten keys do not revive them
+        mirror.apply(make_result('set', '/commissaire/hosts/a', '0', 9))
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, mirror.get, '/commissaire/hosts/a')
+
+    def test_mirror_follow_once(self):
+        """
+        Verify EtcdMirror follows the watch and resyncs when behind.
+        """
+        client = mock.MagicMock()
+        mirror = EtcdMirror(client, '/commissaire', max_lag=100)
+        mirror.load = mock.MagicMock()
+        mirror._index = 10
+
+        client.watch.return_value = make_result(
+            'set', '/commissaire/hosts/a', '1', 11)
+        mirror.follow_once()
+        client.watch.assert_called_once_with(
+            '/commissaire', index=11, recursive=True)
+        self.assertEquals(11, mirror._index)
+        self.assertEquals('1', mirror.get('/commissaire/hosts/a'))
+        self.assertEquals(0, mirror.load.call_count)
+
+        client.watch.return_value = make_result(
+            'set', '/commissaire/hosts/a', '2', 12, etcd_index=500)
+        mirror.follow_once()
+        self.assertEquals(1, mirror.load.call_count)
+
+        client.watch.side_effect = etcd.EtcdEventIndexCleared()
+        mirror.follow_once()
+        self.assertEquals(2, mirror.load.call_count)
+
+    def test_local_mirror_serves_reads(self):
+        """
+        Verify reads are served by the local mirror when configured.
+        """
+        instance = self.cls({'local-mirror': True})
+        instance._mirror._thread = mock.MagicMock()
+        instance._store = mock.MagicMock()
+        instance._store.write.return_value = make_result(
+            'set', '/commissaire/clusters/test',
+            Cluster.new(name='test').to_json(secure=True), 3)
+        instance._store.read.side_effect = etcd.EtcdKeyNotFound
+        instance._save(Cluster.new(name='test'))
+        # Checking for a stored cluster always reads from etcd
+        instance._store.read.reset_mock()
+        instance._store.read.side_effect = None
+        self.assertEquals(
+            'test', instance._get(Cluster.new(name='test')).name)
+        self.assertEquals(
+            ['test'],
+            [x.name for x in instance._list(Clusters.new()).clusters])
+        self.assertEquals(0, instance._store.read.call_count)
+
+        # An explicit consistency goes to etcd
+        instance._store.read.return_value = make_result(
+            'get', '/commissaire/clusters/test',
+            Cluster.new(name='test').to_json(secure=True), 3)
+        instance._get(Cluster.new(name='test'), READ_LINEARIZABLE)
+        # One read for the cluster and one for its hostset members
+        self.assertEquals(2, instance._store.read.call_count)
+
+    def test__list_changes_from_local_mirror(self):
+        """
+        Verify the local mirror lists models changed since an index.
+        """
+        instance = self.cls({'local-mirror': True})
+        instance._mirror._thread = mock.MagicMock()
+        mirror = instance._mirror
+        cluster = json.dumps({
+            'name': 'a', 'status': 'ok', 'type': 'kubernetes',
+            'network': 'default'})
+        mirror._nodes = {
+            '/commissaire/clusters/a': (cluster, 3),
+            '/commissaire/clusters/b': (None, 6),
+            '/commissaire/clusters/c': (cluster.replace('"a"', '"c"'), 1),
+            '/commissaire/cluster-hosts/c/10.0.0.1': ('10.0.0.1', 5),
+        }
+        mirror._dirs = set([
+            '/commissaire', '/commissaire/clusters',
+            '/commissaire/cluster-hosts', '/commissaire/cluster-hosts/c'])
+        mirror._index = 6
+        mirror._loaded_index = 2
+        mirror._keys = sorted(mirror._nodes)
+
+        revision, clusters, deleted = instance._list_changes(
+            Clusters.new(), 2)
+        self.assertEquals(6, revision)
+        self.assertEquals(['a', 'c'], [x.name for x in clusters.clusters])
+        self.assertEquals(['10.0.0.1'], clusters.clusters[1].hostset)
+        self.assertEquals(['b'], deleted)
+
+        revision, clusters, deleted = instance._list_changes(
+            Clusters.new(), 4)
+        self.assertEquals(['c'], [x.name for x in clusters.clusters])
+
+        # Removals before the mirror was loaded are not known
+        revision, clusters, deleted = instance._list_changes(
+            Clusters.new(), 1)
+        self.assertEquals(None, deleted)
+        self.assertEquals(
+            ['a', 'c'], [x.name for x in clusters.clusters])
+
+    def test_split_host_layout(self):
+        """
+        Verify host status is stored apart from host facts.
+        """
+        host = Host.new(
+            address='10.0.0.1', status='active', os='fedora', cpus=2,
+            memory=1024, space=1000, last_check='then',
+            ssh_priv_key='secret', remote_user='root')
+        self.instance._store = mock.MagicMock()
+        self.instance._save(host)
+        written = dict(
+            x[0] for x in self.instance._store.write.call_args_list)
+        self.assertEquals(
+            {'status': 'active', 'last_check': 'then'},
+            json.loads(written['/commissaire/host-status/10.0.0.1']))
+        self.assertNotIn(
+            'status', json.loads(written['/commissaire/hosts/10.0.0.1']))
+
+        # Both parts are written again since another process may have
+        # changed or deleted either of them
+        self.instance._store.reset_mock()
+        host.status = 'failed'
+        self.instance._save(host)
+        written = dict(
+            x[0] for x in self.instance._store.write.call_args_list)
+        self.assertEquals(
+            {'status': 'failed', 'last_check': 'then'},
+            json.loads(written['/commissaire/host-status/10.0.0.1']))
+        self.assertIn('/commissaire/hosts/10.0.0.1', written)
+
+    def test_cluster_member_layout(self):
+        """
+        Verify cluster hostset members are stored under their own keys.
+        """
+        self.instance._store = mock.MagicMock()
+        # New clusters are stored with their members
+        self.instance._store.read.side_effect = etcd.EtcdKeyNotFound
+        self.instance._save(Cluster.new(
+            name='test', status='ok', hostset=['10.0.0.2']))
+        written = dict(
+            x[0] for x in self.instance._store.write.call_args_list)
+        self.assertNotIn(
+            'hostset', json.loads(written['/commissaire/clusters/test']))
+        self.assertEquals(
+            '10.0.0.2', written['/commissaire/cluster-hosts/test/10.0.0.2'])
+
+        # Saving an existing cluster leaves its members alone
+        self.instance._store.reset_mock()
+        self.instance._store.read.side_effect = None
+        self.instance._store.read.return_value = make_result(
+            'get', '/commissaire/clusters/test',
+            json.dumps({'name': 'test', 'status': 'ok'}))
+        self.instance._save(Cluster.new(
+            name='test', status='failed', hostset=[]))
+        self.instance._store.write.assert_called_once_with(
+            '/commissaire/clusters/test', mock.ANY)
+        self.assertFalse(self.instance._store.delete.called)
+
+        # Members stored inline are moved to their own keys
+        self.instance._store.reset_mock()
+        self.instance._store.read.return_value = make_result(
+            'get', '/commissaire/clusters/test',
+            json.dumps({'name': 'test', 'status': 'ok',
+                        'hostset': ['10.0.0.1']}))
+        self.instance._save(Cluster.new(
+            name='test', status='ok', hostset=[]))
+        written = dict(
+            x[0] for x in self.instance._store.write.call_args_list)
+        self.assertEquals(
+            '10.0.0.1', written['/commissaire/cluster-hosts/test/10.0.0.1'])
+
+    def test__hostset_operations(self):
+        """
+        Verify hostset members are changed one key at a time.
+        """
+        self.instance._store = mock.MagicMock()
+        self.instance._store.read.return_value = make_result(
+            'get', '/commissaire/clusters/test',
+            json.dumps({'name': 'test', 'status': 'ok'}))
+        self.instance._hostset_add(Cluster.new(name='test'), '10.0.0.1')
+        self.instance._store.write.assert_called_once_with(
+            '/commissaire/cluster-hosts/test/10.0.0.1', '10.0.0.1')
+        self.instance._hostset_remove(Cluster.new(name='test'), '10.0.0.1')
+        self.instance._store.delete.assert_called_once_with(
+            '/commissaire/cluster-hosts/test/10.0.0.1', recursive=False)
+        self.assertTrue(self.instance._hostset_contains(
+            Cluster.new(name='test'), '10.0.0.1'))
+
+        # Missing clusters raise
+        self.instance._store.read.side_effect = etcd.EtcdKeyNotFound
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, self.instance._hostset_contains,
+            Cluster.new(name='test'), '10.0.0.1')
+
+    def test__get_assembles_split_hosts(self):
+        """
+        Verify host facts and status are assembled on read.
+        """
+        values = {
+            '/commissaire/hosts/10.0.0.1': json.dumps({
+                'address': '10.0.0.1', 'os': 'fedora', 'status': 'old',
+                'last_check': 'then', 'cpus': 2, 'memory': 1024,
+                'space': 1000, 'ssh_priv_key': '', 'remote_user': 'root'}),
+            '/commissaire/host-status/10.0.0.1': json.dumps(
+                {'status': 'active', 'last_check': 'then'}),
+        }
+        self.instance._read = mock.MagicMock(
+            side_effect=lambda key, *a, **k: mock.MagicMock(
+                value=values[key]))
+        host = self.instance._get(Host.new(address='10.0.0.1'))
+        self.assertEquals('fedora', host.os)
+        self.assertEquals('active', host.status)
+
+        # Hosts stored before the split keep their status
+        del values['/commissaire/host-status/10.0.0.1']
+        self.instance._read.side_effect = lambda key, *a, **k: (
+            mock.MagicMock(value=values[key]) if key in values
+            else self.fail_not_found(key))
+        self.assertEquals(
+            'old', self.instance._get(Host.new(address='10.0.0.1')).status)
+
+    def fail_not_found(self, key):
+        """
+        Raises the error etcd raises for missing keys.
+        """
+        raise etcd.EtcdKeyNotFound(key)
+
+    def host(self, address, status='active'):
+        """
+        Returns the stored JSON of a host.
+        """
+        host = make_new(HOST)
+        host.address = address
+        host.status = status
+        return host.to_json(secure=True)
+
+    def test__list_attributes_reads_only_status(self):
+        """
+        Verify status-only host listings skip host facts once every host
+        has a status record.
+        """
+        self.instance._fetch_all = mock.MagicMock(return_value=[
+            ('/commissaire/host-status/10.0.0.1',
+             json.dumps({'status': 'active', 'last_check': 'then'}))])
+        self.instance._stream_all = mock.MagicMock(return_value=[
+            ('/commissaire/hosts/10.0.0.1', '{}')])
+        for _ in range(2):
+            hosts = self.instance._list_attributes(
+                Hosts.new(), ('address', 'status'))
+            self.assertEquals(1, len(hosts.hosts))
+            self.assertEquals('10.0.0.1', hosts.hosts[0].address)
+            self.assertEquals('active', hosts.hosts[0].status)
+        self.instance._fetch_all.assert_called_with(
+            '/commissaire/host-status', mock.ANY, None)
+        # Hosts are only checked for status records once
+        self.assertEquals(1, self.instance._stream_all.call_count)
+
+    def test__list_attributes_with_legacy_hosts(self):
+        """
+        Verify hosts stored before the status split are still listed.
+        """
+        legacy = self.host('10.0.0.2')
+        self.instance._fetch_all = mock.MagicMock(return_value=[
+            ('/commissaire/host-status/10.0.0.1',
+             json.dumps({'status': 'active', 'last_check': 'then'}))])
+        self.instance._stream_all = mock.MagicMock(return_value=[
+            ('/commissaire/hosts/10.0.0.1', self.host('10.0.0.1')),
+            ('/commissaire/hosts/10.0.0.2', legacy)])
+        hosts = self.instance._list_attributes(
+            Hosts.new(), ('address', 'status'))
+        self.assertEquals(
+            ['10.0.0.1', '10.0.0.2'], [x.address for x in hosts.hosts])
+
+    def test__list_filtered_reads_once(self):
+        """
+        Verify filtered listings read every host with one recursive read
+        and include hosts without a status record.
+        """
+        legacy = self.host('10.0.0.2', 'failed')
+        self.instance._fetch_all = mock.MagicMock(return_value=[
+            ('/commissaire/host-status/10.0.0.1',
+             json.dumps({'status': 'active', 'last_check': 'then'}))])
+        self.instance._stream_all = mock.MagicMock(return_value=[
+            ('/commissaire/hosts/10.0.0.1', self.host('10.0.0.1')),
+            ('/commissaire/hosts/10.0.0.2', legacy)])
+        self.instance._get = mock.MagicMock()
+        hosts = self.instance._list_filtered(
+            Hosts.new(), {'status': ['failed']})
+        self.assertEquals(
+            ['10.0.0.2'], [x.address for x in hosts.hosts])
+        self.assertEquals(1, self.instance._stream_all.call_count)
+        self.assertFalse(self.instance._get.called)
+
+        # Status-only listings include them too
+        hosts = self.instance._list_filtered(
+            Hosts.new(), {'status': ['failed']}, ('address', 'status'))
+        self.assertEquals(
+            ['10.0.0.2'], [x.address for x in hosts.hosts])
+
+    def test__acquire_lease(self):
+        """
+        Verify leases are created, renewed and refused with compare-and-swap.
+        """
+        self.instance._store = mock.MagicMock()
+        # Nobody holds the lease
+        self.instance._store.write.side_effect = (
+            etcd.EtcdKeyNotFound('missing'), None)
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        self.instance._store.write.assert_called_with(
+            '/commissaire-leases/leader', 'a', ttl=30, prevExist=False)
+
+        # The holder renews
+        self.instance._store.write.reset_mock()
+        self.instance._store.write.side_effect = None
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        self.instance._store.write.assert_called_once_with(
+            '/commissaire-leases/leader', 'a', ttl=30, prevValue='a')
+
+        # Someone else holds the lease
+        self.instance._store.write.side_effect = (
+            etcd.EtcdCompareFailed('held'), etcd.EtcdAlreadyExist('held'))
+        self.assertFalse(self.instance._acquire_lease('leader', 'b', 30))
+
+    def test__release_lease(self):
+        """
+        Verify only the holder removes a lease.
+        """
+        self.instance._store = mock.MagicMock()
+        self.instance._store.delete.side_effect = etcd.EtcdCompareFailed(
+            'held')
+        self.instance._release_lease('leader', 'b')
+        self.instance._store.delete.assert_called_once_with(
+            '/commissaire-leases/leader', prevValue='b')
+
+    def test__iter_read(self):
+        """
+        Verify recursive reads are decoded from arbitrary chunks.
+        """
+        body = json.dumps({'action': 'get', 'node': {
+            'key': '/commissaire/cluster-hosts', 'dir': True, 'nodes': [
+                {'key': '/commissaire/cluster-hosts/a', 'dir': True,
+                 'nodes': [{'key': '/commissaire/cluster-hosts/a/h',
+                            'value': u'h\u00e9'}]},
+                {'key': '/commissaire/cluster-hosts/b', 'dir': True},
+            ]}}).encode('utf-8')
+        expected = [
+            ('/commissaire/cluster-hosts/a/h', u'h\u00e9'),
+            ('/commissaire/cluster-hosts/b', None),
+        ]
+        for size in (1, 7, len(body)):
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            self.assertEquals(expected, list(_iter_read(chunks)))
+
+        # Directories without children and truncated responses
+        self.assertEquals([], list(_iter_read([json.dumps({'node': {
+            'key': '/commissaire/hosts', 'dir': True}})])))
+        self.assertRaises(
+            etcd.EtcdException, list,
+            _iter_read([body[:body.index(b'cluster-hosts/b')]]))
+
+    def test__list_changes_revision_of_the_listing(self):
+        """
+        Verify listings without the mirror take the index of their read.
+        """
+        response = mock.MagicMock(status=200)
+        response.getheader.return_value = '42'
+        response.stream.return_value = [json.dumps({'node': {
+            'key': '/commissaire/networks', 'dir': True, 'nodes': [
+                {'key': '/commissaire/networks/default', 'value': json.dumps(
+                    {'name': 'default', 'type': 'flannel_etcd',
+                     'options': {}})},
+            ]}})]
+        self.instance._store = mock.MagicMock()
+        self.instance._store.http.request.return_value = response
+        revision, networks, deleted = self.instance._list_changes(
+            Networks.new(), 3)
+        self.assertEquals(42, revision)
+        self.assertEquals(['default'], [x.name for x in networks.networks])
+        self.assertEquals(None, deleted)
+        response.getheader.assert_called_once_with('X-Etcd-Index', 0)
+        # No separate read for the revision
+        self.assertFalse(self.instance._store.read.called)
+
+    def test__list_streams_the_read(self):
+        """
+        Verify listings decode the etcd response while it is read.
+        """
+        response = mock.MagicMock(status=200)
+        response.stream.return_value = [json.dumps({'node': {
+            'key': '/commissaire/networks', 'dir': True, 'nodes': [
+                {'key': '/commissaire/networks/default', 'value': json.dumps(
+                    {'name': 'default', 'type': 'flannel_etcd',
+                     'options': {}})},
+            ]}})]
+        self.instance._store = mock.MagicMock()
+        self.instance._store.http.request.return_value = response
+        networks = self.instance._list(Networks.new())
+        self.assertEquals(['default'], [x.name for x in networks.networks])
+        self.assertEquals(
+            'true', self.instance._store.http.request.call_args[1][
+                'fields']['quorum'])
+        self.assertFalse(
+            self.instance._store.http.request.call_args[1]['preload_content'])
+        response.release_conn.assert_called_once_with()
+
+        # Missing directories raise as they do for reads
+        response.status = 404
+        response.data = json.dumps({'errorCode': 100, 'message': 'missing'})
+        self.assertRaises(
+            etcd.EtcdKeyNotFound, self.instance._list, Networks.new())
@@ -16,7 +16,10 @@
 Test cases for the commissaire.store.StoreHandlerBase class.
 """
 
+import mock
+
 from . import TestCase
+from commissaire.handlers.models import Host, Hosts
 from commissaire.store import StoreHandlerBase
 
 
@@ -65,3 +68,44 @@ class Test_StoreHandlerBaseClass(_Test_StoreHandler):
                 NotImplementedError,
                 getattr(self.instance, meth),
                 *tuple(range(nargs)))
+
+    def test_list_filtered(self):
+        """
+        Verify StoreHandlerBase filters listed models.
+        """
+        self.instance._list = mock.MagicMock(return_value=Hosts.new(hosts=[
+            Host.new(address='10.0.0.1', status='active', os='fedora'),
+            Host.new(address='10.0.0.2', status='failed', os='fedora'),
+            Host.new(address='10.0.0.3', status='failed', os='rhel')]))
+        hosts = self.instance._list_filtered(
+            Hosts.new(), {'status': ['failed'], 'os': ['fedora', 'atomic']})
+        self.assertEquals(['10.0.0.2'], [x.address for x in hosts.hosts])
+
+    def test_list_page(self):
+        """
+        Verify StoreHandlerBase pages listed models by primary key.
+        """
+        self.instance._list = mock.MagicMock(
+            side_effect=lambda x: Hosts.new(hosts=[
+                Host.new(address='10.0.0.3', status='failed'),
+                Host.new(address='10.0.0.1', status='failed'),
+                Host.new(address='10.0.0.2', status='active')]))
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {'status': ['failed']}, limit=1)
+        self.assertEquals(['10.0.0.1'], [x.address for x in hosts.hosts])
+        self.assertEquals('10.0.0.1', cursor)
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {'status': ['failed']}, limit=1, cursor=cursor)
+        self.assertEquals(['10.0.0.3'], [x.address for x in hosts.hosts])
+        self.assertEquals(None, cursor)
+
+        # Primary key filters only read the selected models
+        self.instance._list.reset_mock()
+        self.instance._get = mock.MagicMock(side_effect=[
+            KeyError, Host.new(address='10.0.0.2', status='active')])
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {'address': ['10.0.0.2', '10.0.0.9', '10.0.0.1']},
+            cursor='10.0.0.1')
+        self.assertEquals(['10.0.0.2'], [x.address for x in hosts.hosts])
+        self.assertEquals(2, self.instance._get.call_count)
+        self.assertFalse(self.instance._list.called)
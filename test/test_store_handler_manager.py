@@ -17,11 +17,14 @@ Test cases for the commissaire.store.StoreHandlerManager class.
 """
 
 import mock
+import pickle
 
-from . import TestCase, TestModel
+from . import MemoryStoreHandler, TestCase, TestModel
 
+from commissaire.handlers.models import Cluster, Clusters
 from commissaire.store import StoreHandlerBase
-from commissaire.store.storehandlermanager import StoreHandlerManager
+from commissaire.store.storehandlermanager import (
+    StoreHandlerManager, StoreHandlerManagerDescriptor, resolve_store_manager)
 from commissaire.containermgr import ContainerManagerBase
 
 
@@ -101,6 +104,46 @@ class Test_StoreHandlerManager(TestCase):
         # And the handlers should still be empty
         self.assertEqual({}, manager._handlers)
 
+    def test_storehandlermanager_descriptor(self):
+        """
+        Verify the StoreHandlerManager descriptor method works as expected.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(
+            PhonyStoreHandler, {'server_url': 'http://127.0.0.1'}, TestModel)
+        descriptor = manager.descriptor()
+        self.assertIsInstance(descriptor, StoreHandlerManagerDescriptor)
+        # Descriptors must survive a trip through a multiprocessing queue
+        self.assertEqual(descriptor, pickle.loads(pickle.dumps(descriptor, 2)))
+        # Equal configurations must produce equal descriptors
+        self.assertEqual(descriptor, manager.descriptor())
+
+    def test_storehandlermanager_descriptor_resolve(self):
+        """
+        Verify descriptors resolve once into a reusable StoreHandlerManager.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(
+            PhonyStoreHandler, {'server_url': 'http://127.0.0.1'}, TestModel)
+        descriptor = manager.descriptor()
+        resolved = descriptor.resolve()
+        self.assertIsInstance(resolved, StoreHandlerManager)
+        self.assertIsNot(manager, resolved)
+        self.assertEqual(manager._registry, resolved._registry)
+        # Resolving again, even from a copy, reuses the same manager
+        copied = pickle.loads(pickle.dumps(descriptor, 2))
+        self.assertIs(resolved, copied.resolve())
+
+    def test_resolve_store_manager(self):
+        """
+        Verify resolve_store_manager accepts managers and descriptors.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(PhonyStoreHandler, {}, TestModel)
+        self.assertIs(manager, resolve_store_manager(manager))
+        self.assertIsInstance(
+            resolve_store_manager(manager.descriptor()), StoreHandlerManager)
+
     @mock.patch.object(PhonyStoreHandler, 'check_config')
     def test_storehandlermanager_get(self, PhonyStoreHandler):
         """
@@ -133,8 +176,19 @@ class Test_StoreHandlerManager(TestCase):
         manager = StoreHandlerManager()
         manager.register_store_handler(PhonyStoreHandler, {}, TestModel)
         model_instance = TestModel.new()
+        PhonyStoreHandler()._save_if_changed.return_value = (
+            model_instance, True)
+        manager.save(model_instance)
+        PhonyStoreHandler()._save_if_changed.assert_called_once_with(
+            model_instance)
+        self.assertEqual(1, manager.metrics()['save'])
+
+        # Saves the store found to change nothing are counted apart
+        PhonyStoreHandler()._save_if_changed.return_value = (
+            model_instance, False)
         manager.save(model_instance)
-        PhonyStoreHandler()._save.assert_called_once_with(model_instance)
+        self.assertEqual(1, manager.metrics()['save'])
+        self.assertEqual(1, manager.metrics()['save_skipped'])
 
     @mock.patch.object(PhonyStoreHandler, 'check_config')
     def test_storehandlermanager_list(self, PhonyStoreHandler):
@@ -147,6 +201,119 @@ class Test_StoreHandlerManager(TestCase):
         manager.list(model_instance)
         PhonyStoreHandler()._list.assert_called_once_with(model_instance)
 
+    def test_storehandlermanager_save_repeated(self):
+        """
+        Verify StoreHandlerManager writes repeated saves through.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(MemoryStoreHandler, {}, TestModel)
+        handler = manager._get_handler(TestModel.new())
+        handler._save = mock.MagicMock(side_effect=handler._save)
+
+        # Another process may have changed or deleted the stored copy
+        manager.save(TestModel.new(foo='a'))
+        manager.get(TestModel.new(foo='a'))
+        manager.save(TestModel.new(foo='a'))
+        self.assertEqual(2, handler._save.call_count)
+
+        metrics = manager.metrics()
+        self.assertEqual(2, metrics['save'])
+        self.assertEqual(1, metrics['get'])
+
+    def test_storehandlermanager_hostset(self):
+        """
+        Verify StoreHandlerManager changes hostsets through the handler.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(MemoryStoreHandler, {}, Cluster)
+        manager.save(Cluster.new(name='test'))
+
+        manager.hostset_add(Cluster.new(name='test'), '10.0.0.1')
+        self.assertTrue(
+            manager.hostset_contains(Cluster.new(name='test'), '10.0.0.1'))
+        self.assertEqual(
+            ['10.0.0.1'], manager.get(Cluster.new(name='test')).hostset)
+        manager.hostset_remove(Cluster.new(name='test'), '10.0.0.1')
+        self.assertFalse(
+            manager.hostset_contains(Cluster.new(name='test'), '10.0.0.1'))
+        self.assertRaises(
+            KeyError, manager.hostset_add,
+            Cluster.new(name='missing'), '10.0.0.1')
+
+    def test_storehandlermanager_get_not_found(self):
+        """
+        Verify StoreHandlerManager raises KeyError for missing models.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(MemoryStoreHandler, {}, Cluster)
+        handler = manager._get_handler(Cluster.new())
+        handler.NOT_FOUND_ERRORS = (KeyError, IOError)
+        handler._get = mock.MagicMock(side_effect=IOError)
+        self.assertRaises(KeyError, manager.get, Cluster.new(name='test'))
+        handler._get.side_effect = ValueError
+        self.assertRaises(ValueError, manager.get, Cluster.new(name='test'))
+
+    def test_storehandlermanager_list_page(self):
+        """
+        Verify StoreHandlerManager lists pages through the handler.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(
+            MemoryStoreHandler, {}, Cluster, Clusters)
+        for name in ('a', 'b'):
+            manager.save(Cluster.new(name=name, hostset=[]))
+        clusters, cursor = manager.list_page(Clusters.new(), limit=1)
+        self.assertEquals(['a'], [x.name for x in clusters.clusters])
+        self.assertEquals('a', cursor)
+
+    def test_storehandlermanager_replace_hostset(self):
+        """
+        Verify StoreHandlerManager makes a stored hostset match a model.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(
+            MemoryStoreHandler, {}, Cluster, TestModel)
+        manager.save(Cluster.new(name='test'))
+        manager.hostset_add(Cluster.new(name='test'), '10.0.0.1')
+
+        cluster = Cluster.new(name='test', hostset=['10.0.0.2'])
+        manager.replace_hostset(cluster)
+        self.assertEqual(
+            ['10.0.0.2'], manager.get(Cluster.new(name='test')).hostset)
+        # Models without a hostset are left alone.
+        manager.replace_hostset(TestModel.new(foo='a'))
+
+    def test_storehandlermanager_lease(self):
+        """
+        Verify StoreHandlerManager routes leases to a model's handler.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(MemoryStoreHandler, {}, TestModel)
+        handler = manager._get_handler(TestModel.new())
+        # Handlers without shared leases always grant them
+        self.assertTrue(
+            manager.acquire_lease(TestModel.new(), 'leader', 'a', 30))
+        handler._acquire_lease = mock.MagicMock(return_value=False)
+        handler._release_lease = mock.MagicMock()
+        self.assertFalse(
+            manager.acquire_lease(TestModel.new(), 'leader', 'b', 30))
+        handler._acquire_lease.assert_called_once_with('leader', 'b', 30)
+        manager.release_lease(TestModel.new(), 'leader', 'b')
+        handler._release_lease.assert_called_once_with('leader', 'b')
+
+    def test_storehandlermanager_save_all(self):
+        """
+        Verify StoreHandlerManager saves models of one handler together.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(MemoryStoreHandler, {}, TestModel)
+        handler = manager._get_handler(TestModel.new())
+        handler._save_all = mock.MagicMock(side_effect=handler._save_all)
+        models = [TestModel.new(foo='a'), TestModel.new(foo='b')]
+        self.assertEquals(models, manager.save_all(*models))
+        handler._save_all.assert_called_once_with(models)
+        self.assertEqual(2, manager.metrics()['save'])
+
     def test_storehandlermanager_register_store_handler_with_one_model(self):
         """
         Verify StoreHandlerManager registers StoreHandlers properly with one model.
@@ -212,6 +379,53 @@ class Test_StoreHandlerManager(TestCase):
         mgrs = manager.list_container_managers(SILLY_CLUSTER_TYPE)
         self.assertEqual(len(mgrs), 0)
 
+    def test_storehandlermanager_mirror_handler(self):
+        """
+        Verify StoreHandlerManager dual-writes to mirror handlers.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(PhonyStoreHandler, {}, TestModel)
+        manager.register_mirror_handler(BogusStoreHandler, {}, TestModel)
+        primary = manager._get_handler(TestModel.new())
+        mirror = manager._get_mirror_handler(TestModel.new())
+        self.assertIsInstance(primary, PhonyStoreHandler)
+        self.assertIsInstance(mirror, BogusStoreHandler)
+
+        primary._save = mock.MagicMock(side_effect=lambda x: x)
+        primary._delete = mock.MagicMock()
+        mirror._save = mock.MagicMock()
+        mirror._delete = mock.MagicMock()
+        model_instance = TestModel.new()
+        manager.save(model_instance)
+        manager.delete(model_instance)
+        mirror._save.assert_called_once_with(model_instance)
+        mirror._delete.assert_called_once_with(model_instance)
+
+        # Mirrors must survive the trip to worker processes
+        descriptor = manager.descriptor()
+        self.assertEqual(1, len(descriptor.mirrors))
+
+    def test_storehandlermanager_cutover(self):
+        """
+        Verify StoreHandlerManager cutover swaps primary and mirror handlers.
+        """
+        manager = StoreHandlerManager()
+        manager.register_store_handler(
+            PhonyStoreHandler, {}, TestModelA, TestModelB)
+        self.assertRaises(KeyError, manager.cutover, TestModelA)
+        manager.register_mirror_handler(BogusStoreHandler, {}, TestModelA)
+        manager.cutover(TestModelA)
+        self.assertIsInstance(
+            manager._get_handler(TestModelA.new()), BogusStoreHandler)
+        self.assertIsInstance(
+            manager._get_mirror_handler(TestModelA.new()), PhonyStoreHandler)
+        # Models which were not cut over are untouched
+        self.assertIsInstance(
+            manager._get_handler(TestModelB.new()), PhonyStoreHandler)
+        self.assertIsNone(manager._get_mirror_handler(TestModelB.new()))
+        # Both handlers are still listed
+        self.assertEqual(2, len(manager.list_store_handlers()))
+
     def test_storehandlermanager__get_handler(self):
         """
         Verify StoreHandlerManager._get_handler returns handlers properly.
@@ -0,0 +1,114 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.store.hostcounters module.
+"""
+
+import mock
+
+from . import TestCase
+
+from commissaire.handlers.models import Cluster, Host, Hosts
+from commissaire.store.hostcounters import HostCounters
+from commissaire.store.storehandlermanager import StoreHandlerManager
+
+
+def make_hosts(**statuses):
+    """
+    Creates a Hosts list with the given address=status pairs.
+    """
+    return Hosts.new(hosts=[
+        Host.new(address=k, status=v) for k, v in sorted(statuses.items())])
+
+
+class Test_HostCounters(TestCase):
+    """
+    Tests for the HostCounters class.
+    """
+
+    def before(self):
+        """
+        Sets up a fresh instance of the class before each run.
+        """
+        self.instance = HostCounters()
+        self.store_manager = mock.MagicMock(StoreHandlerManager)
+
+    def count(self, hostset):
+        """
+        Returns the counters of a cluster with the given members.
+        """
+        cluster = Cluster.new(name='test', hostset=hostset)
+        self.instance.count(self.store_manager, cluster)
+        return cluster.hosts
+
+    def test_count_from_changes(self):
+        """
+        Verify only changed hosts are read once the revision is known.
+        """
+        self.store_manager.revision.return_value = 1
+        self.store_manager.can_list_changes.return_value = True
+        self.store_manager.list.return_value = make_hosts(
+            a='active', b='failed', c='active')
+        self.assertEquals(
+            {'total': 2, 'available': 1, 'unavailable': 1},
+            self.count(['a', 'b', 'x']))
+        self.store_manager.list.assert_called_once_with(
+            mock.ANY, attributes=('address', 'status'))
+
+        # Nothing changed, nothing is read
+        self.count(['a', 'b', 'x'])
+        self.assertFalse(self.store_manager.list_changes.called)
+
+        self.store_manager.revision.return_value = 3
+        self.store_manager.list_changes.return_value = (
+            3, make_hosts(b='active', x='active'), ['a'])
+        self.assertEquals(
+            {'total': 2, 'available': 2, 'unavailable': 0},
+            self.count(['a', 'b', 'x']))
+        self.assertEquals(
+            1, self.store_manager.list_changes.call_args[0][1])
+        self.assertEquals(1, self.store_manager.list.call_count)
+
+        # Hosts joining and leaving the cluster
+        self.assertEquals(
+            {'total': 2, 'available': 2, 'unavailable': 0},
+            self.count(['c', 'x']))
+
+    def test_count_without_revisions(self):
+        """
+        Verify every host is listed when the store has no revisions.
+        """
+        self.store_manager.revision.return_value = None
+        self.store_manager.list.side_effect = (
+            make_hosts(a='active'), make_hosts(a='failed'))
+        self.assertEquals(1, self.count(['a'])['available'])
+        self.assertEquals(1, self.count(['a'])['unavailable'])
+        self.assertEquals(2, self.store_manager.list.call_count)
+
+    def test_count_without_changes(self):
+        """
+        Verify only statuses are listed when the store can not list changes.
+        """
+        self.store_manager.revision.side_effect = (1, 1, 2)
+        self.store_manager.can_list_changes.return_value = False
+        self.store_manager.list.side_effect = (
+            make_hosts(a='active'), make_hosts(a='failed'))
+        self.assertEquals(1, self.count(['a'])['available'])
+        self.assertEquals(1, self.count(['a'])['available'])
+        self.assertEquals(1, self.count(['a'])['unavailable'])
+        self.assertFalse(self.store_manager.list_changes.called)
+        self.assertEquals(
+            [mock.call(mock.ANY, attributes=('address', 'status'))] * 2,
+            self.store_manager.list.call_args_list)
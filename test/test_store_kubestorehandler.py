@@ -20,10 +20,14 @@ import json
 import mock
 import requests
 
+from . import TestCase
 from . test_store_handler_base_class import _Test_StoreHandler
 
-from commissaire.handlers.models import Cluster, Host
-from commissaire.store.kubestorehandler import KubernetesStoreHandler
+from commissaire.handlers.models import (
+    Cluster, ClusterUpgrade, Clusters, Host, Hosts)
+from commissaire.store import ConfigurationError
+from commissaire.store.kubestorehandler import (
+    KubeMirror, KubernetesStoreHandler, _index_annotations)
 
 
 class Test_KubernetesStoreHandlerClass(_Test_StoreHandler):
@@ -49,8 +53,113 @@ class Test_KubernetesStoreHandlerClass(_Test_StoreHandler):
             'commissaire-cluster-test-name': 'test',
             'commissaire-cluster-test-status': 'test',
         }
-        kwargs = self.instance._format_kwargs(model_instance, annotations)
-        self.assertEquals({'name': 'test', 'status': 'test'}, kwargs)
+        kwargs = self.instance._format_kwargs(
+            model_instance, _index_annotations(annotations), 'test')
+        self.assertEquals(
+            {'name': 'test', 'status': 'test', 'hostset': []}, kwargs)
+
+    def test__format_kwargs_with_members(self):
+        """
+        Verify hostset members are read from their own annotations.
+        """
+        model_instance = Cluster.new(name='test')
+        annotations = {
+            'commissaire-cluster-test-name': 'test',
+            'commissaire-clusterhost-test-10.0.0.2': '10.0.0.2',
+            'commissaire-clusterhost-test-10.0.0.1': '10.0.0.1',
+            'commissaire-clusterhost-test-other-10.0.0.3': '10.0.0.3',
+        }
+        kwargs = self.instance._format_kwargs(
+            model_instance, _index_annotations(annotations), 'test')
+        self.assertEquals(['10.0.0.1', '10.0.0.2'], kwargs['hostset'])
+
+        # Records stored before members were split out keep theirs
+        annotations = {
+            'commissaire-cluster-test-name': 'test',
+            'commissaire-cluster-test-hostset': 'json:["10.0.0.1"]',
+        }
+        kwargs = self.instance._format_kwargs(
+            model_instance, _index_annotations(annotations), 'test')
+        self.assertEquals(['10.0.0.1'], kwargs['hostset'])
+
+    def test__index_annotations(self):
+        """
+        Verify annotations are parsed into class, primary key and attribute.
+        """
+        self.assertEquals({
+            'cluster': {'test': {'name': 'test', 'cluster-type': 'k'}},
+            'clusterhost': {
+                'test': {'10.0.0.1': '10.0.0.1'},
+                'test-other': {'10.0.0.3': '10.0.0.3'}},
+        }, _index_annotations({
+            'commissaire-cluster-test-name': 'test',
+            'commissaire-cluster-test-cluster-type': 'k',
+            'commissaire-clusterhost-test-10.0.0.1': '10.0.0.1',
+            'commissaire-clusterhost-test-other-10.0.0.3': '10.0.0.3',
+            'commissaire-clusterhost-test-10.0.0.2': 'mismatch',
+            'kubernetes.io-hostname-node-a': 'a',
+        }))
+
+    def test__list_on_namespace(self):
+        """
+        Verify every model of a class is built from one namespace read.
+        """
+        annotations = {}
+        for name in ('a', 'b'):
+            annotations['commissaire-cluster-{0}-name'.format(name)] = name
+            annotations['commissaire-clusterhost-{0}-10.0.0.1'.format(
+                name)] = '10.0.0.1'
+        annotations['commissaire-clusterupgrade-a-name'] = 'a'
+        clusters = self.instance._list_on_namespace(
+            Clusters.new(), {'metadata': {'annotations': annotations}})
+        self.assertEquals(
+            [('a', ['10.0.0.1']), ('b', ['10.0.0.1'])],
+            sorted((x.name, x.hostset) for x in clusters.clusters))
+
+    def test__hostset_add(self):
+        """
+        Verify adding a hostset member patches a single annotation.
+        """
+        response = requests.Response()
+        response._content = json.dumps({'metadata': {'annotations': {
+            'commissaire-cluster-test-name': 'test'}}})
+        response.status_code = requests.codes.OK
+        self.instance._store.patch = mock.MagicMock(return_value=response)
+        self.instance._hostset_add(Cluster.new(name='test'), '10.0.0.1')
+        self.instance._store.patch.assert_called_once_with(
+            'http://127.0.0.1:8080/api/v1/namespaces/default/',
+            json=[
+                {'op': 'test',
+                 'path': '/metadata/annotations/commissaire-cluster-test-name',
+                 'value': 'test'},
+                {'op': 'add',
+                 'path': ('/metadata/annotations/'
+                          'commissaire-clusterhost-test-10.0.0.1'),
+                 'value': '10.0.0.1'}],
+            headers={'Content-Type': 'application/json-patch+json'})
+
+        # A failed test operation means there is no such cluster
+        response.status_code = requests.codes.UNPROCESSABLE_ENTITY
+        self.assertRaises(
+            KeyError, self.instance._hostset_add,
+            Cluster.new(name='test'), '10.0.0.1')
+
+    def test__hostset_contains(self):
+        """
+        Verify membership is checked against a single annotation.
+        """
+        response = requests.Response()
+        response._content = json.dumps({'metadata': {'annotations': {
+            'commissaire-cluster-test-name': 'test',
+            'commissaire-clusterhost-test-10.0.0.1': '10.0.0.1'}}})
+        self.instance._store.get = mock.MagicMock(return_value=response)
+        self.assertTrue(self.instance._hostset_contains(
+            Cluster.new(name='test'), '10.0.0.1'))
+        self.assertFalse(self.instance._hostset_contains(
+            Cluster.new(name='test'), '10.0.0.2'))
+        self.assertRaises(
+            KeyError, self.instance._hostset_contains,
+            Cluster.new(name='other'), '10.0.0.1')
 
     def test__format_model(self):
         """
@@ -140,6 +249,7 @@ class Test_KubernetesStoreHandlerClass(_Test_StoreHandler):
                 'metadata': {
                     'name': 'test',
                     'type': 'Opaque',
+                    'labels': {'commissaire-secret': 'host'},
                 },
                 'data': {'test': 'dGVzdA==\n'},
             })
@@ -165,3 +275,516 @@ class Test_KubernetesStoreHandlerClass(_Test_StoreHandler):
         }
 
         self.instance._get_on_namespace(model_instance)
+
+    def test__list_changes_on_namespace(self):
+        """
+        Verify namespace models are only listed when the namespace changed.
+        """
+        response = requests.Response()
+        response._content = json.dumps({'metadata': {
+            'resourceVersion': '42',
+            'annotations': {
+                'commissaire-cluster-test-name': 'test',
+                'commissaire-cluster-test-status': 'ok',
+            }}})
+        self.instance._store.get = mock.MagicMock(return_value=response)
+
+        revision, clusters, deleted = self.instance._list_changes(
+            Clusters.new(), 42)
+        self.assertEquals('42', revision)
+        self.assertEquals([], clusters.clusters)
+        self.assertEquals([], deleted)
+
+        revision, clusters, deleted = self.instance._list_changes(
+            Clusters.new(), 41)
+        self.assertEquals(['test'], [x.name for x in clusters.clusters])
+        self.assertEquals(None, deleted)
+        self.instance._store.get.assert_called_with(
+            'http://127.0.0.1:8080/api/v1/namespaces/default/')
+
+    def test__revision(self):
+        """
+        Verify revisions come from the namespace or the labeled node list.
+        """
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            'metadata': {'resourceVersion': '42'}, 'items': []})
+        self.instance._store.get = mock.MagicMock(return_value=response)
+
+        self.assertEquals('42', self.instance._revision(Clusters.new()))
+        self.instance._store.get.assert_called_with(
+            'http://127.0.0.1:8080/api/v1/namespaces/default/')
+
+        self.assertEquals('42', self.instance._revision(Hosts.new()))
+        self.instance._store.get.assert_called_with(
+            'http://127.0.0.1:8080/api/v1/nodes',
+            params={'labelSelector': 'commissaire-host=true', 'limit': 1})
+
+    def test__acquire_lease(self):
+        """
+        Verify leases are created, renewed and refused while unexpired.
+        """
+        missing = requests.Response()
+        missing.status_code = 404
+        created = requests.Response()
+        created.status_code = 201
+        self.instance._store.get = mock.MagicMock(return_value=missing)
+        self.instance._store.post = mock.MagicMock(return_value=created)
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        url = self.instance._store.post.call_args[0][0]
+        body = self.instance._store.post.call_args[1]['json']
+        self.assertEquals(
+            'http://127.0.0.1:8080/api/v1/namespaces/default/configmaps/',
+            url)
+        self.assertEquals('commissaire-lease-leader', body['metadata']['name'])
+        record = json.loads(
+            body['metadata']['annotations']['commissaire-lease'])
+        self.assertEquals('a', record['holder'])
+
+        # Someone else holds an unexpired lease
+        held = requests.Response()
+        held.status_code = 200
+        held._content = json.dumps({'metadata': {
+            'resourceVersion': '3',
+            'annotations': {'commissaire-lease': json.dumps(record)}}})
+        self.instance._store.get.return_value = held
+        self.instance._store.put = mock.MagicMock()
+        self.assertFalse(self.instance._acquire_lease('leader', 'b', 30))
+        self.assertFalse(self.instance._store.put.called)
+
+        # The holder renews against the resourceVersion it read
+        renewed = requests.Response()
+        renewed.status_code = 200
+        self.instance._store.put.return_value = renewed
+        self.assertTrue(self.instance._acquire_lease('leader', 'a', 30))
+        body = self.instance._store.put.call_args[1]['json']
+        self.assertEquals('3', body['metadata']['resourceVersion'])
+
+    def test__save_on_namespace_single_patch(self):
+        """
+        Verify a save is one patch and the annotation container is cached.
+        """
+        empty = requests.Response()
+        empty.status_code = 200
+        empty._content = json.dumps({'metadata': {}})
+        saved = requests.Response()
+        saved.status_code = 200
+        saved._content = json.dumps({'metadata': {'annotations': {
+            'commissaire-clusterupgrade-test-name': 'test',
+            'commissaire-clusterupgrade-test-status': 'in_process',
+        }}})
+        self.instance._store.get = mock.MagicMock(return_value=empty)
+        self.instance._store.patch = mock.MagicMock(return_value=saved)
+
+        upgrade = ClusterUpgrade.new(name='test', status='in_process')
+        result = self.instance._save_on_namespace(upgrade)
+        self.assertEquals('in_process', result.status)
+        self.assertEquals(1, self.instance._store.patch.call_count)
+        patch = self.instance._store.patch.call_args[1]['json']
+        self.assertEquals('/metadata/annotations', patch[0]['path'])
+        self.assertEquals(
+            set(['/metadata/annotations/commissaire-clusterupgrade-test-name',
+                 '/metadata/annotations/'
+                 'commissaire-clusterupgrade-test-status',
+                 '/metadata/annotations/'
+                 'commissaire-clusterupgrade-test-upgraded',
+                 '/metadata/annotations/'
+                 'commissaire-clusterupgrade-test-in-process']),
+            set(x['path'] for x in patch[1:]))
+
+        # Progress updates are a single call once the container is known
+        self.instance._store.get.reset_mock()
+        self.instance._save_on_namespace(upgrade)
+        self.assertFalse(self.instance._store.get.called)
+        self.assertEquals(2, self.instance._store.patch.call_count)
+        patch = self.instance._store.patch.call_args[1]['json']
+        self.assertNotEquals('/metadata/annotations', patch[0]['path'])
+
+        # A failed patch forgets the container and raises
+        failed = requests.Response()
+        failed.status_code = 422
+        self.instance._store.patch.return_value = failed
+        self.assertRaises(
+            KeyError, self.instance._save_on_namespace, upgrade)
+        self.instance._store.patch.return_value = saved
+        self.instance._save_on_namespace(upgrade)
+        self.assertTrue(self.instance._store.get.called)
+
+    def test__save_on_namespace_members(self):
+        """
+        Verify members are only written for new or legacy clusters.
+        """
+        def namespace(annotations):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({'metadata': {
+                'resourceVersion': '7', 'annotations': annotations}})
+            return response
+
+        self.instance._store.patch = mock.MagicMock(
+            return_value=namespace({'commissaire-cluster-test-name': 'test'}))
+        cluster = Cluster.new(name='test', status='ok', hostset=['10.0.0.1'])
+
+        # New clusters are stored with their members
+        self.instance._store.get = mock.MagicMock(
+            return_value=namespace({'commissaire-manager': 'yes'}))
+        self.instance._save_on_namespace(cluster)
+        patch = self.instance._store.patch.call_args[1]['json']
+        self.assertEquals(
+            {'op': 'test', 'path': '/metadata/resourceVersion',
+             'value': '7'}, patch[0])
+        self.assertIn(
+            {'op': 'add', 'value': '10.0.0.1', 'path': (
+                '/metadata/annotations/commissaire-clusterhost-test-10.0.0.1')},
+            patch)
+
+        # Saving an existing cluster leaves its members alone
+        self.instance._store.get.return_value = namespace({
+            'commissaire-cluster-test-name': 'test',
+            'commissaire-clusterhost-test-10.0.0.2': '10.0.0.2'})
+        self.instance._save_on_namespace(cluster)
+        patch = self.instance._store.patch.call_args[1]['json']
+        self.assertEquals(
+            [], [x for x in patch if 'clusterhost' in x['path'] or
+                 x['op'] == 'test'])
+
+    def test__list_host_bulk_secrets(self):
+        """
+        Verify host secrets are listed once and joined to the nodes.
+        """
+        def node(name):
+            return {'metadata': {'name': name, 'annotations': {
+                'commissaire-host-{0}-address'.format(name): name,
+                'commissaire-host-{0}-status'.format(name): 'active',
+            }}}
+
+        nodes = requests.Response()
+        nodes.status_code = 200
+        nodes._content = json.dumps({'items': [node('a'), node('b')]})
+        secrets = requests.Response()
+        secrets.status_code = 200
+        secrets._content = json.dumps({'items': [{
+            'metadata': {'name': 'a'},
+            'data': {'ssh-priv-key': 'a2V5\n', 'remote-user': 'cm9vdA==\n'},
+        }]})
+        legacy = requests.Response()
+        legacy.status_code = 200
+        legacy._content = json.dumps({
+            'data': {'ssh-priv-key': 'b2xk\n', 'remote-user': 'cm9vdA==\n'}})
+        self.instance._store.get = mock.MagicMock(
+            side_effect=(secrets, nodes, legacy))
+        self.instance._store.patch = mock.MagicMock()
+        self.instance._nodes_labeled = True
+
+        hosts = self.instance._list_host(Hosts.new())
+        self.assertEquals(
+            ['key', 'old'], [x.ssh_priv_key for x in hosts.hosts])
+        self.assertEquals(
+            {'labelSelector': 'commissaire-secret=host'},
+            self.instance._store.get.call_args_list[0][1]['params'])
+        # The unlabeled secret was read on its own and labeled
+        self.assertEquals(3, self.instance._store.get.call_count)
+        self.assertTrue(
+            self.instance._store.patch.call_args[0][0].endswith('/b'))
+
+        # Listings without credentials skip secrets entirely
+        self.instance._store.get = mock.MagicMock(return_value=nodes)
+        hosts = self.instance._list_attributes(
+            Hosts.new(), ('address', 'status'))
+        self.assertEquals(['a', 'b'], [x.address for x in hosts.hosts])
+        self.instance._store.get.assert_called_once_with(
+            'http://127.0.0.1:8080/api/v1/nodes/', params={
+                'labelSelector': 'commissaire-host=true', 'limit': 500})
+
+    def test__list_host_pages(self):
+        """
+        Verify hosts are listed by label a page at a time.
+        """
+        def page(names, token=None):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({
+                'metadata': {'continue': token},
+                'items': [make_node(
+                    x, 1, **{'commissaire-host-{0}-address'.format(x): x})
+                    for x in names]})
+            return response
+
+        self.instance._nodes_labeled = True
+        self.instance._page_size = 2
+        self.instance._store.get = mock.MagicMock(
+            side_effect=(page(['a', 'b'], 'next'), page(['c'])))
+        hosts = self.instance._list_attributes(Hosts.new(), ('address',))
+        self.assertEquals(
+            ['a', 'b', 'c'], [x.address for x in hosts.hosts])
+        self.assertEquals(
+            [{'labelSelector': 'commissaire-host=true', 'limit': 2},
+             {'labelSelector': 'commissaire-host=true', 'limit': 2,
+              'continue': 'next'}],
+            [x[1]['params'] for x in self.instance._store.get.call_args_list])
+
+    def test__list_page(self):
+        """
+        Verify host pages stop once full and continue from the apiserver
+        page the next host is on.
+        """
+        def page(names, token=None):
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps({
+                'metadata': {'continue': token},
+                'items': [make_node(
+                    x, 1, **{'commissaire-host-{0}-address'.format(x): x})
+                    for x in names]})
+            return response
+
+        self.instance._nodes_labeled = True
+        self.instance._page_size = 2
+        self.instance._store.get = mock.MagicMock(
+            side_effect=(page(['a', 'b'], 'next'), page(['c', 'd'])))
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {}, ('address',), limit=2)
+        self.assertEquals(['a', 'b'], [x.address for x in hosts.hosts])
+        self.assertEquals('next b', cursor)
+
+        self.instance._store.get = mock.MagicMock(
+            side_effect=(page(['c', 'd']),))
+        hosts, cursor = self.instance._list_page(
+            Hosts.new(), {}, ('address',), limit=1, cursor=cursor)
+        self.assertEquals(['c'], [x.address for x in hosts.hosts])
+        self.assertEquals('next c', cursor)
+        self.assertEquals(
+            'next',
+            self.instance._store.get.call_args[1]['params']['continue'])
+
+    def test__label_nodes(self):
+        """
+        Verify nodes saved before hosts were labeled are labeled once.
+        """
+        labeled = make_node('a', 1, **{'commissaire-host-a-address': 'a'})
+        labeled['metadata']['labels'] = {'commissaire-host': 'true'}
+        namespace = requests.Response()
+        namespace.status_code = 200
+        namespace._content = json.dumps({'metadata': {'name': 'default'}})
+        nodes = requests.Response()
+        nodes.status_code = 200
+        nodes._content = json.dumps({'metadata': {}, 'items': [
+            labeled,
+            make_node('b', 1, **{'commissaire-host-b-address': 'b'}),
+            make_node('other', 1)]})
+        self.instance._store.get = mock.MagicMock(
+            side_effect=(namespace, nodes))
+        self.instance._store.patch = mock.MagicMock()
+
+        self.instance._label_nodes()
+        self.instance._label_nodes()
+        self.assertEquals([
+            mock.call('http://127.0.0.1:8080/api/v1/namespaces/default'),
+            mock.call('http://127.0.0.1:8080/api/v1/nodes',
+                      params={'limit': 500})],
+            self.instance._store.get.call_args_list)
+        self.assertEquals([
+            mock.call(
+                'http://127.0.0.1:8080/api/v1/nodes/b',
+                json={'metadata': {'labels': {'commissaire-host': 'true'}}},
+                headers={'Content-Type': 'application/merge-patch+json'}),
+            mock.call(
+                'http://127.0.0.1:8080/api/v1/namespaces/default',
+                json={'metadata': {'annotations': {
+                    'commissaire-nodes-labeled': 'true'}}},
+                headers={'Content-Type': 'application/merge-patch+json'})],
+            self.instance._store.patch.call_args_list)
+
+    def test__label_nodes_marked(self):
+        """
+        Verify nodes are not paged through once the store is marked.
+        """
+        namespace = requests.Response()
+        namespace.status_code = 200
+        namespace._content = json.dumps({'metadata': {
+            'name': 'default',
+            'annotations': {'commissaire-nodes-labeled': 'true'}}})
+        self.instance._store.get = mock.MagicMock(return_value=namespace)
+        self.instance._store.patch = mock.MagicMock()
+
+        self.instance._label_nodes()
+        self.instance._label_nodes()
+        self.instance._store.get.assert_called_once_with(
+            'http://127.0.0.1:8080/api/v1/namespaces/default')
+        self.assertFalse(self.instance._store.patch.called)
+
+
+    def test__configmap_storage(self):
+        """
+        Verify namespace models can be stored as ConfigMaps of their own.
+        """
+        self.assertRaises(
+            ConfigurationError, self.cls.check_config,
+            {'model-storage': 'crd'})
+        instance = self.cls({'model-storage': 'configmaps'})
+        cluster = Cluster.new(
+            name='test', status='ok', hostset=['10.0.0.2', '10.0.0.1'])
+        config_map = {'metadata': {'name': 'commissaire-cluster-test'},
+                      'data': {'name': 'test', 'status': 'ok',
+                               'hostset.10.0.0.1': '10.0.0.1',
+                               'hostset.10.0.0.2': '10.0.0.2'}}
+
+        missing = requests.Response()
+        missing.status_code = 404
+        created = requests.Response()
+        created.status_code = 201
+        created._content = json.dumps(config_map)
+        instance._store.post = mock.MagicMock(return_value=created)
+        saved = instance._save(cluster)
+        self.assertEquals(['10.0.0.1', '10.0.0.2'], saved.hostset)
+        body = instance._store.post.call_args[1]['json']
+        self.assertEquals(
+            {'commissaire-model': 'cluster'}, body['metadata']['labels'])
+        self.assertEquals(
+            dict(config_map['data'], network='default', type='kubernetes'),
+            body['data'])
+
+        # Saving an existing cluster leaves its members alone
+        conflict = requests.Response()
+        conflict.status_code = 409
+        instance._store.post.return_value = conflict
+        created.status_code = 200
+        instance._store.patch = mock.MagicMock(return_value=created)
+        instance._save(Cluster.new(name='test', status='failed'))
+        self.assertTrue(instance._store.patch.call_args[0][0].endswith(
+            '/namespaces/default/configmaps/commissaire-cluster-test'))
+        self.assertEquals(
+            {'name': 'test', 'status': 'failed', 'network': 'default',
+             'type': 'kubernetes'},
+            instance._store.patch.call_args[1]['json']['data'])
+
+        listed = requests.Response()
+        listed.status_code = 200
+        listed._content = json.dumps(
+            {'metadata': {}, 'items': [config_map]})
+        instance._store.get = mock.MagicMock(return_value=listed)
+        clusters = instance._list(Clusters.new())
+        self.assertEquals(['test'], [x.name for x in clusters.clusters])
+        self.assertEquals(
+            {'labelSelector': 'commissaire-model=cluster', 'limit': 500},
+            instance._store.get.call_args[1]['params'])
+
+        # Members are patched as single keys of the ConfigMap
+        patched = requests.Response()
+        patched.status_code = 200
+        instance._store.patch = mock.MagicMock(return_value=patched)
+        instance._hostset_add(Cluster.new(name='test'), '10.0.0.3')
+        self.assertEquals([
+            {'op': 'test', 'path': '/data/name', 'value': 'test'},
+            {'op': 'add', 'path': '/data/hostset.10.0.0.3',
+             'value': '10.0.0.3'}],
+            instance._store.patch.call_args[1]['json'])
+        patched.status_code = 422
+        self.assertRaises(
+            KeyError, instance._hostset_remove,
+            Cluster.new(name='other'), '10.0.0.1')
+
+        found = requests.Response()
+        found.status_code = 200
+        found._content = json.dumps(config_map)
+        instance._store.get = mock.MagicMock(return_value=found)
+        self.assertTrue(instance._hostset_contains(
+            Cluster.new(name='test'), '10.0.0.1'))
+        self.assertEquals('ok', instance._get(Cluster.new(name='test')).status)
+
+
+def make_node(name, version, **annotations):
+    """
+    Creates a Kubernetes node with annotations.
+    """
+    return {'metadata': {
+        'name': name, 'resourceVersion': str(version),
+        'annotations': annotations}}
+
+
+class Test_KubeMirror(TestCase):
+    """
+    Tests for the KubeMirror class.
+    """
+
+    def before(self):
+        """
+        Sets up a mirror with a fake session before each run.
+        """
+        self.session = mock.MagicMock()
+        self.mirror = KubeMirror(self.session, 'http://k/api/v1/nodes')
+
+    def respond(self, body=None, lines=None):
+        """
+        Creates a fake list or watch response.
+        """
+        response = mock.MagicMock()
+        response.json.return_value = body
+        response.iter_lines.return_value = [json.dumps(x) for x in lines or []]
+        return response
+
+    def test_kube_mirror_load_and_follow(self):
+        """
+        Verify the mirror lists once and then applies watch events.
+        """
+        self.session.get.side_effect = [
+            self.respond({'metadata': {'resourceVersion': '10'}, 'items': [
+                make_node('a', 5), make_node('b', 6)]}),
+            self.respond(lines=[
+                {'type': 'MODIFIED', 'object': make_node('a', 11, x='1')},
+                {'type': 'DELETED', 'object': make_node('b', 12)},
+            ]),
+        ]
+        self.mirror.load()
+        self.assertEquals(['a', 'b'], [
+            x['metadata']['name'] for x in self.mirror.list()])
+        self.mirror.follow_once()
+        self.assertEquals('1', self.mirror.get('a')['metadata'][
+            'annotations']['x'])
+        self.assertRaises(KeyError, self.mirror.get, 'b')
+        self.assertEquals('12', self.mirror.resource_version)
+        params = self.session.get.call_args[1]['params']
+        self.assertEquals('10', params['resourceVersion'])
+        self.assertEquals('true', params['watch'])
+
+        # Older results are ignored and deleted objects stay deleted
+        self.mirror.apply('MODIFIED', make_node('a', 7))
+        self.mirror.apply('MODIFIED', make_node('b', 8))
+        self.assertEquals('11', self.mirror.get('a')['metadata'][
+            'resourceVersion'])
+        self.assertRaises(KeyError, self.mirror.get, 'b')
+
+    def test_kube_mirror_relists_on_expired_watch(self):
+        """
+        Verify the mirror lists again when the watch has expired.
+        """
+        self.session.get.side_effect = [
+            self.respond(lines=[{'type': 'ERROR', 'object': {
+                'kind': 'Status', 'code': 410}}]),
+            self.respond({'metadata': {'resourceVersion': '20'}, 'items': [
+                make_node('c', 19)]}),
+        ]
+        self.mirror._resource_version = '1'
+        self.mirror.follow_once()
+        self.assertEquals('20', self.mirror.resource_version)
+        self.assertEquals('c', self.mirror.get('c')['metadata']['name'])
+
+    def test_kube_mirror_serves_handler_reads(self):
+        """
+        Verify handler reads are answered by the mirror.
+        """
+        handler = KubernetesStoreHandler({'local-mirror': True})
+        handler._store = mock.MagicMock()
+        mirror = handler._mirrors['/namespaces/default/']
+        mirror._thread = True
+        mirror.apply('ADDED', {'metadata': {
+            'name': 'default', 'resourceVersion': '3', 'annotations': {
+                'commissaire-cluster-test-name': 'test',
+                'commissaire-cluster-test-status': 'ok'}}})
+        cluster = handler._get(Cluster.new(name='test'))
+        self.assertEquals('ok', cluster.status)
+        self.assertEquals(
+            ['test'], [x.name for x in handler._list(
+                Clusters.new()).clusters])
+        self.assertFalse(handler._store.get.called)
@@ -0,0 +1,166 @@
+# Copyright (C) 2016  Red Hat, Inc
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Test cases for the commissaire.store.migration module.
+"""
+
+import mock
+
+from . import TestCase, MemoryStoreHandler
+from .constants import CLUSTER, HOST, make_new
+
+from commissaire.handlers.models import (
+    Cluster, ClusterRestart, Clusters, Host, Hosts)
+from commissaire.store.migration import (
+    MigrationError, StoreMigration, model_fingerprint)
+from commissaire.store.storehandlermanager import StoreHandlerManager
+
+
+class DestinationStoreHandler(MemoryStoreHandler):
+    """
+    Second in memory handler type to migrate to.
+    """
+    pass
+
+
+class Test_StoreMigration(TestCase):
+    """
+    Tests for the StoreMigration class.
+    """
+
+    def before(self):
+        """
+        Sets up a populated store manager before each run.
+        """
+        self.manager = StoreHandlerManager()
+        self.manager.register_store_handler(
+            MemoryStoreHandler, {},
+            Host, Hosts, Cluster, Clusters, ClusterRestart)
+        for x in range(0, 5):
+            host = make_new(HOST)
+            host.address = '10.2.0.{0}'.format(x)
+            self.manager.save(host)
+        self.manager.save(make_new(CLUSTER))
+        self.manager.save(ClusterRestart.new(
+            name=CLUSTER.name, status='finished'))
+
+        self.migration = StoreMigration(
+            self.manager, DestinationStoreHandler, {},
+            (Host, Cluster, ClusterRestart), batch_size=2)
+        self.migration.start()
+        self.source = self.manager._get_handler(Host.new())
+        self.destination = self.manager._get_mirror_handler(Host.new())
+
+    def test_migration_includes_list_models(self):
+        """
+        Verify list models are migrated along with their list class.
+        """
+        self.assertIn(Hosts, self.migration.model_types)
+        self.assertIn(Clusters, self.migration.model_types)
+
+    def test_migration_dual_writes(self):
+        """
+        Verify writes after start() reach both handlers.
+        """
+        host = make_new(HOST)
+        host.address = '10.2.0.100'
+        self.manager.save(host)
+        self.assertEquals(
+            model_fingerprint(host),
+            model_fingerprint(self.destination._get(host)))
+
+    def test_migration_copy_and_verify(self):
+        """
+        Verify copy() streams every model and verify() agrees.
+        """
+        self.assertEquals(7, self.migration.copy())
+        report, mismatched = self.migration.verify()
+        self.assertEquals([], mismatched)
+        self.assertEquals(5, report['Host']['destination_count'])
+        self.assertEquals(
+            report['Host']['source_checksum'],
+            report['Host']['destination_checksum'])
+
+    def test_migration_verify_detects_differences(self):
+        """
+        Verify mismatches are reported and repaired.
+        """
+        self.migration.copy()
+        host = self.source._get(Host.new(address='10.2.0.1'))
+        host.status = 'failed'
+        self.source._save(host)
+        _, mismatched = self.migration.verify()
+        self.assertEquals([('Host', '10.2.0.1')], mismatched)
+        self.migration.repair(mismatched)
+        self.assertEquals([], self.migration.verify()[1])
+
+    def test_migration_verify_finds_stale_operations(self):
+        """
+        Verify operations left on the destination for clusters deleted
+        on the source are reported and repaired.
+        """
+        self.migration.copy()
+        self.source._delete(Cluster.new(name=CLUSTER.name))
+        self.source._delete(ClusterRestart.new(name=CLUSTER.name))
+        _, mismatched = self.migration.verify()
+        self.assertEquals(
+            [('Cluster', CLUSTER.name), ('ClusterRestart', CLUSTER.name)],
+            sorted(mismatched))
+        self.migration.repair(mismatched)
+        self.assertEquals([], self.migration.verify()[1])
+
+    def test_migration_run(self):
+        """
+        Verify run() cuts reads over to the new handler.
+        """
+        self.migration.run()
+        self.assertIs(
+            self.destination, self.manager._get_handler(Host.new()))
+        self.assertEquals(5, len(self.manager.list(Hosts.new()).hosts))
+        self.assertEquals(
+            'finished',
+            self.manager.get(ClusterRestart.new(name=CLUSTER.name)).status)
+
+    def test_migration_run_without_verification(self):
+        """
+        Verify run() does not cut over when verification keeps failing.
+        """
+        self.migration.repair = lambda mismatched: None
+        self.migration.copy = lambda: self.destination._store.clear()
+        self.assertRaises(MigrationError, self.migration.run)
+        self.assertIs(self.source, self.manager._get_handler(Host.new()))
+
+    def test_migration_copy_fails_on_read_errors(self):
+        """
+        Verify copy() fails instead of finishing partially.
+        """
+        with mock.patch.object(
+                self.source, '_iter_list', side_effect=IOError):
+            self.assertRaises(IOError, self.migration.copy)
+
+    def test_migration_repair_deletes_only_missing_models(self):
+        """
+        Verify repair() only deletes models which are no longer stored.
+        """
+        self.migration.copy()
+        with mock.patch.object(self.source, '_get', side_effect=IOError):
+            self.assertRaises(
+                IOError, self.migration.repair, [('Host', '10.2.0.1')])
+        self.destination._get(Host.new(address='10.2.0.1'))
+
+        self.source._delete(Host.new(address='10.2.0.1'))
+        self.migration.repair([('Host', '10.2.0.1')])
+        self.assertRaises(
+            KeyError, self.destination._get, Host.new(address='10.2.0.1'))